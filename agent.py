@@ -2,11 +2,15 @@
 LangChain Agent for FinAIssistant
 Handles natural language queries and orchestrates expense management
 """
+import asyncio
 import json
 import os
 import re
+import time
+from collections import deque
+from contextlib import asynccontextmanager
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional, Type, Union
+from typing import Any, Callable, Dict, List, Optional, Type, Union
 
 from langchain.tools import BaseTool
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
@@ -16,6 +20,21 @@ from pydantic import BaseModel, Field
 
 # Import Vanna for improved SQL generation
 from vanna_trainer import VannaTrainer
+from router import TemplateRouter, DEFAULT_MIN_CONFIDENCE
+from answer_cache import AnswerCache, template_window
+from memory import ConversationMemory
+from context_builder import ContextBuilder
+from direct_pipeline import DirectPipeline, looks_like_question, MAX_EXPENSE_AMOUNT
+from instrumentation import metrics, timed
+from structured_logging import preview
+from sql_validator import SqlValidator
+from sql_cache import SqlCache
+
+# Agent runs (ReAct LLM loops) allowed at once across all chats
+DEFAULT_AGENT_MAX_CONCURRENCY = 4
+
+# Share of SqlQueryTool runs that log a (bounded) preview of the SQL and rows at DEBUG
+DEFAULT_SQL_LOG_SAMPLE_RATE = 0.1
 
 class ParseExpenseInput(BaseModel):
     text: str = Field(description="Text to parse for expense information")
@@ -53,51 +72,30 @@ class ParseExpenseTool(BaseTool):
         super().__init__(**kwargs)
         object.__setattr__(self, 'parser', parser)
     
-    def _run(self, text: str) -> str:
-        # Enhanced logic to avoid parsing questions as expenses
-        text_lower = text.lower().strip()
-
-        # Check if this looks like a question rather than an expense
-        # IMPORTANT: Only reject if it's CLEARLY a question, not just mentioning spending
-        # Removed 'spent', 'expenses' from indicators as they're commonly used in expense entries
-        question_indicators = [
-            'give me', 'show me', 'tell me', 'what is', 'what are', 'what was', 'what were',
-            'how much', 'how many', 'when did', 'where did', 'why did',
-            'total', 'breakdown', 'analysis', 'compare', 'comparison', 'summary', 'report',
-            'list all', 'list my', 'list the', 'show all', 'show my', 'show the'
-        ]
-
-        # Only reject if it matches a clear question pattern
-        # Check for question words at the start or combined with specific patterns
-        is_question = False
-        for indicator in question_indicators:
-            if indicator in text_lower:
-                # Additional check: make sure it's not just "spent" with amount
-                # e.g., "spent 155" is an expense, but "what did I spend" is a question
-                if indicator in ['give me', 'show me', 'tell me', 'what', 'how', 'list', 'breakdown']:
-                    is_question = True
-                    break
-
-        if is_question:
+    def _looks_like_question(self, text: str) -> bool:
+        return looks_like_question(text)
+    
+    def _to_json(self, result: Optional[Dict]) -> str:
+        # Additional validation - if parsed amount is suspiciously high (like a year), reject
+        if result and result.get('amount', 0) > MAX_EXPENSE_AMOUNT:  # Expenses over $5000 are suspicious
             return json.dumps(None)
-
-        # Check for year patterns that suggest analysis (like "july 2025")
-        if re.search(r'\\b(20\\d{2})\\b', text_lower):
+            
+        return json.dumps(result)
+    
+    @timed('tool.parse_expense')
+    async def _arun(self, text: str) -> str:
+        if self._looks_like_question(text):
             return json.dumps(None)
 
-        # Check for month names followed by years (common in questions)
-        month_year_pattern = r'\\b(january|february|march|april|may|june|july|august|september|october|november|december)\\s+(20\\d{2})\\b'
-        if re.search(month_year_pattern, text_lower):
+        # Only parse if it really looks like an expense entry (AI fallback doesn't block the loop)
+        return self._to_json(await self.parser.parse_expense_text_async(text))
+    
+    def _run(self, text: str) -> str:
+        if self._looks_like_question(text):
             return json.dumps(None)
 
         # Only parse if it really looks like an expense entry
-        result = self.parser.parse_expense_text(text)
-        
-        # Additional validation - if parsed amount is suspiciously high (like a year), reject
-        if result and result.get('amount', 0) > 5000:  # Expenses over $5000 are suspicious
-            return json.dumps(None)
-            
-        return json.dumps(result)
+        return self._to_json(self.parser.parse_expense_text(text))
 
 class ClassifyExpenseTool(BaseTool):
     name: str = "classify_expense"
@@ -113,6 +111,7 @@ class ClassifyExpenseTool(BaseTool):
         object.__setattr__(self, 'db_client', db_client)
         object.__setattr__(self, 'classifier', classifier)
 
+    @timed('tool.classify_expense')
     async def _arun(self, merchant: str, explicit_category: Optional[str] = None) -> str:
         categories = await self.db_client.get_categories()
         result = await self.classifier.classify_expense(merchant, categories, explicit_category)
@@ -149,35 +148,29 @@ class InsertExpenseTool(BaseTool):
         super().__init__(**kwargs)
         object.__setattr__(self, 'db_client', db_client)
     
+    @timed('tool.insert_expense')
     async def _arun(self, user_id: int, category_id: Union[str, int], merchant: str, amount: float, currency: str = "MXN") -> str:
         try:
-            # Convert Telegram user_id to internal UUID user_id
-            user_data = await self.db_client.get_user_by_telegram_id(int(user_id))
-            if not user_data:
-                raise Exception(f"User not found for Telegram ID: {user_id}")
-            
-            internal_user_id = user_data['id']  # This is the UUID
-            
-            # Get all categories to find the UUID for the given category_id
-            categories = await self.db_client.get_categories()
-            if not categories:
-                raise Exception("No categories found in database")
-
             # Handle different category_id formats
             category_uuid = None
-            if isinstance(category_id, int) and 0 <= category_id < len(categories):
-                # LangChain agent passed category index as integer
-                category_uuid = categories[category_id]['id']  # This is the UUID
+            if isinstance(category_id, int):
+                # LangChain agent passed category index as integer (served from the category catalog)
+                categories = await self.db_client.get_categories()
+                if not categories:
+                    raise Exception("No categories found in database")
+                if 0 <= category_id < len(categories):
+                    category_uuid = categories[category_id]['id']  # This is the UUID
             elif category_id and isinstance(category_id, str):
                 # category_id is already a UUID string from classifier
                 category_uuid = category_id
-            else:
+            if not category_uuid:
                 # category_id is None or invalid - cannot proceed
                 raise Exception(f"Invalid category_id: {category_id}. Classification may have failed.")
 
-            await self.db_client.insert_expense(
-                user_id=internal_user_id,
-                category_id=category_uuid,
+            # User lookup, paid_by, FX rate and insert happen in one database round trip
+            await self.db_client.insert_expense_for_telegram_user(
+                telegram_id=int(user_id),
+                category=category_uuid,
                 merchant=merchant,
                 amount=amount,
                 currency=currency
@@ -205,6 +198,7 @@ class CurrencyConvertTool(BaseTool):
         super().__init__(**kwargs)
         object.__setattr__(self, 'db_client', db_client)
     
+    @timed('tool.convert_currency')
     async def _arun(self, amount: float, from_currency: str, to_currency: str) -> str:
         from_curr = (from_currency or 'MXN').upper()
         to_curr = (to_currency or 'MXN').upper()
@@ -265,10 +259,18 @@ Use 'dynamic_sql' for questions that don't match predefined templates. The syste
     db_client: Any = None
     templates: Any = None
     vanna_trainer: Any = None
+    router: Any = None
+    answer_cache: Any = None
+    validator: Any = None
+    sql_cache: Any = None
+    log_sample_rate: float = DEFAULT_SQL_LOG_SAMPLE_RATE
     
     def __init__(self, db_client, **kwargs):
         super().__init__(**kwargs)
         object.__setattr__(self, 'db_client', db_client)
+        object.__setattr__(self, 'log_sample_rate', float(os.getenv('SQL_LOG_SAMPLE_RATE', DEFAULT_SQL_LOG_SAMPLE_RATE)))
+        object.__setattr__(self, 'validator', SqlValidator())
+        object.__setattr__(self, 'sql_cache', SqlCache())
         
         # Initialize Vanna AI for improved SQL generation
         import logging
@@ -278,10 +280,16 @@ Use 'dynamic_sql' for questions that don't match predefined templates. The syste
                 api_key=os.getenv('OPENAI_API_KEY')
                 # Uses default model: gpt-4o-mini
             )
-            # Train Vanna on database schema and examples
-            vanna.train_all()
+            # Train Vanna on database schema and examples (only new/changed items are embedded).
+            # In the background by default: templates are served right away and
+            # _generate_sql switches to Vanna once training has finished
+            if os.getenv('VANNA_BACKGROUND_TRAINING', '1') != '0':
+                vanna.start_background_training()
+                logger.info("✅ Vanna AI integrated, training in background")
+            else:
+                vanna.train_all()
+                logger.info("✅ Vanna AI integrated and trained")
             object.__setattr__(self, 'vanna_trainer', vanna)
-            logger.info("✅ Vanna AI integrated and trained")
         except Exception as e:
             logger.warning(f"⚠️ Vanna initialization failed, falling back to GPT-4: {e}")
             object.__setattr__(self, 'vanna_trainer', None)
@@ -386,7 +394,19 @@ Use 'dynamic_sql' for questions that don't match predefined templates. The syste
             """
         }
         object.__setattr__(self, 'templates', templates)
+        
+        # Local intent router: answers common phrasings without the LLM consultant
+        object.__setattr__(self, 'router', TemplateRouter(
+            templates.keys(),
+            min_confidence=float(os.getenv('ROUTER_MIN_CONFIDENCE', DEFAULT_MIN_CONFIDENCE))
+        ))
+        
+        # Formatted answers, invalidated by the expense dates every write touches
+        object.__setattr__(self, 'answer_cache', AnswerCache())
+        if hasattr(db_client, 'add_expense_listener'):
+            db_client.add_expense_listener(self.answer_cache.invalidate_dates)
     
+    @timed('sql.generate_sql')
     async def _generate_sql(self, question: str) -> str:
         """
         Generate SQL query using Vanna AI (RAG-based) or fallback to GPT-4
@@ -395,11 +415,20 @@ Use 'dynamic_sql' for questions that don't match predefined templates. The syste
         import logging
         logger = logging.getLogger(__name__)
         
-        # Try Vanna first (preferred method)
-        if self.vanna_trainer:
+        # Same question (up to wording of case, accents and relative dates) answered before
+        cached = self.sql_cache.get(question)
+        if cached is not None:
+            logger.info(f"SQL cache hit ({cached['generator']}) for question: {question}")
+            return cached['sql']
+        
+        # Try Vanna first (preferred method) once its training has finished
+        if self.vanna_trainer and not self.vanna_trainer.is_trained():
+            logger.info("⏳ Vanna still training, using direct GPT-4 SQL generation")
+        elif self.vanna_trainer:
             try:
                 logger.info(f"🤖 Using Vanna AI for SQL generation: {question}")
-                sql = self.vanna_trainer.generate_sql(question)
+                with metrics.timer('vanna.generate_sql'):
+                    sql = self.vanna_trainer.generate_sql(question)
                 
                 # Clean up the SQL
                 sql = sql.strip()
@@ -411,6 +440,7 @@ Use 'dynamic_sql' for questions that don't match predefined templates. The syste
                     sql = sql[:-3]
                 sql = sql.rstrip(';').strip()
                 
+                self.sql_cache.put(question, sql, 'vanna')
                 return sql
             except Exception as e:
                 logger.warning(f"⚠️ Vanna generation failed, falling back to GPT-4: {e}")
@@ -459,12 +489,14 @@ Question: {question}
 
 SQL Query:"""
 
-        response = await client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.1,
-            max_tokens=300
-        )
+        with metrics.timer('openai.generate_sql'):
+            response = await client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.1,
+                max_tokens=300
+            )
+        metrics.add_tokens('openai.generate_sql', response.usage)
         
         raw_sql = response.choices[0].message.content.strip()
         
@@ -478,8 +510,10 @@ SQL Query:"""
             sql = sql[:-3]
         sql = sql.rstrip(';').strip()
         
+        self.sql_cache.put(question, sql, 'openai')
         return sql
 
+    @timed('sql.consult_library')
     async def _consult_sql_library(self, question: str) -> Dict[str, Any]:
         """Consult the SQL Library Agent to find matching templates"""
         from openai import AsyncOpenAI
@@ -539,12 +573,14 @@ Examples:
 - "top 5 expenses this year" → {{"has_template": false, "template_name": null, "reasoning": "Requires custom SQL for top N with yearly filter and individual records"}}
 """
 
-        response = await client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": consultant_prompt}],
-            temperature=0.1,
-            max_tokens=200
-        )
+        with metrics.timer('openai.consult_library'):
+            response = await client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=[{"role": "user", "content": consultant_prompt}],
+                temperature=0.1,
+                max_tokens=200
+            )
+        metrics.add_tokens('openai.consult_library', response.usage)
         
         try:
             import json
@@ -554,6 +590,7 @@ Examples:
             # Fallback if JSON parsing fails
             return {"has_template": False, "template_name": None, "reasoning": "JSON parsing failed"}
     
+    @timed('tool.sql_query')
     async def _arun(self, question: str, query_type: Optional[str] = None, custom_sql: Optional[str] = None, month: Optional[str] = None, year: Optional[int] = None) -> str:
         import logging
         logger = logging.getLogger(__name__)
@@ -561,11 +598,29 @@ Examples:
         try:
             logger.info(f"SqlQueryTool._arun called with: query_type={query_type}, question={question}")
             
+            # Repeated question: answer without routing, OpenAI or Supabase
+            if question and not query_type and not custom_sql:
+                cached = self.answer_cache.get_for_question(question)
+                if cached is not None:
+                    logger.info(f"Answer cache hit for question: {question} ({self.answer_cache.stats()})")
+                    return cached
+            
+            # Step 0: Deterministic router for common phrasings (no LLM round trip)
+            route = self.router.route(question) if question and not query_type else None
+            if route:
+                query_type = route['template_name']
+                logger.info(
+                    f"Router matched template {query_type} "
+                    f"({route['method']}, confidence={route['confidence']}, stats={self.router.stats()})"
+                )
+            
             # NEW: Multi-agent consultation system
             if question and not query_type:
                 # Step 1: Consult SQL Library Agent
                 logger.info(f"Consulting SQL Library Agent for question: {question}")
+                consult_started = time.perf_counter()
                 consultation = await self._consult_sql_library(question)
+                self.router.record_consultation(time.perf_counter() - consult_started)
                 
                 logger.info(f"SQL Library consultation result: {consultation}")
                 
@@ -578,61 +633,49 @@ Examples:
                     query_type = "dynamic_sql"
                     logger.info(f"No template found, using dynamic SQL. Reason: {consultation.get('reasoning')}")
             
+            # Same template and date window already answered (e.g. asked with other wording)
+            cache_key = self.answer_cache.make_key(query_type, question, month, year)
+            cached = self.answer_cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"Answer cache hit for {query_type} ({self.answer_cache.stats()})")
+                self.answer_cache.alias(question, cache_key)
+                return cached
+            generation = self.answer_cache.generation
+            query_started = time.perf_counter()
+            
             if query_type == 'dynamic_sql' and question:
                 logger.info(f"Generating dynamic SQL for question: {question}")
                 # Generate SQL automatically for questions not covered by predefined templates
                 sql = await self._generate_sql(question)
-                logger.info(f"Generated SQL: {sql}")
+                logger.debug("Generated SQL: %s", preview(sql))
                 
                 # Apply safety checks to generated SQL
                 if not sql.strip():
                     logger.error("Empty SQL generated")
                     raise Exception("Failed to generate SQL")
                 
-                # More precise safety checks - block SQL injection patterns but allow legitimate SQL
-                dangerous_patterns = [
-                    r';\s*\w',  # Multiple statements (semicolon followed by more SQL)
-                    r'--\s',  # SQL comments with space after
-                    r'/\*.*\*/',  # Block comments
-                    r'\bdrop\b',  # DROP statements
-                    r'\bdelete\b',  # DELETE statements
-                    r'\bupdate\b',  # UPDATE statements
-                    r'\binsert\b',  # INSERT statements
-                    r'\balter\b',  # ALTER statements
-                    r'\bcreate\b',  # CREATE statements
-                ]
-                
-                # Check each pattern individually for better debugging
-                for pattern in dangerous_patterns:
-                    if re.search(pattern, sql, re.IGNORECASE):
-                        logger.error(f"SQL rejected by pattern '{pattern}': {sql}")
-                        raise Exception(f"Generated SQL rejected by guardrails: pattern '{pattern}' matched")
-                
-                if not re.match(r'^\s*select', sql, re.IGNORECASE):
-                    logger.error(f"SQL rejected - not a SELECT statement: {sql}")
-                    raise Exception("Generated SQL rejected by guardrails: not a SELECT statement")
+                # Parser-based guardrail: one read-only SELECT over allow-listed tables/columns
+                verdict = self.validator.validate(sql)
+                if not verdict['allowed']:
+                    logger.error("SQL rejected (%s): %s", verdict['reason'], preview(sql))
+                    self.sql_cache.discard(question)
+                    raise Exception(f"Generated SQL rejected by guardrails: {verdict['reason']}")
+                sql = verdict['sql']
                 
                 logger.info(f"SQL passed safety checks, executing...")
-                result = await self.db_client.execute_raw_sql(sql, [], "dynamic_sql", question)
+                try:
+                    result = await self.db_client.execute_raw_sql(sql, [], "dynamic_sql", question)
+                except Exception:
+                    # Don't keep serving SQL the database refused
+                    self.sql_cache.discard(question)
+                    raise
             elif query_type == 'custom' and custom_sql:
-                # Safety checks for custom SQL
-                if not custom_sql.strip():
-                    raise Exception("Empty query")
-                # Apply same safety checks as dynamic SQL
-                dangerous_patterns = [
-                    r';',  # Multiple statements
-                    r'--\s',  # SQL comments with space after
-                    r'/\*.*\*/',  # Block comments
-                    r'\bdrop\b',  # DROP statements
-                    r'\bdelete\b',  # DELETE statements
-                    r'\bupdate\b',  # UPDATE statements
-                    r'\binsert\b',  # INSERT statements
-                    r'\balter\b',  # ALTER statements
-                    r'\bcreate\b',  # CREATE statements
-                ]
-                if any(re.search(pattern, custom_sql, re.IGNORECASE) for pattern in dangerous_patterns) or not re.match(r'^\s*select', custom_sql, re.IGNORECASE):
-                    raise Exception("Query rejected by guardrails")
-                sql = custom_sql
+                # Same validator as dynamic SQL
+                verdict = self.validator.validate(custom_sql)
+                if not verdict['allowed']:
+                    raise Exception(f"Query rejected by guardrails: {verdict['reason']}")
+                sql = verdict['sql']
+                result = await self.db_client.execute_raw_sql(sql, [], "dynamic_sql", question)
             elif query_type == 'custom_month_category':
                 # Handle specific month/year category breakdown
                 if not month or not year:
@@ -657,182 +700,186 @@ Examples:
             else:
                 raise Exception(f"Unknown query type: {query_type}")
             
-            # Debug: log the SQL being executed (for non-custom queries)
-            if query_type not in ['custom_month_category', 'custom_month_budget', 'dynamic_sql']:
-                print(f"DEBUG: Executing SQL for {query_type}:")
-                print(f"SQL: {sql}")
-            elif query_type == 'dynamic_sql':
-                print(f"DEBUG: Generated SQL for question '{question}':")
-                print(f"SQL: {sql}")
-            print(f"DEBUG: Query result: {result}")
-            print(f"DEBUG: Result type: {type(result)}, Length: {len(result) if result else 'None'}")
+            # Constant-size summary; SQL and rows only as a sampled, bounded preview
+            elapsed_ms = (time.perf_counter() - query_started) * 1000
+            logger.info("SQL %s returned %d rows in %.0f ms", query_type, len(result or []), elapsed_ms)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("SQL %s: %s -> %s", query_type, preview(sql), preview(result),
+                             extra={'sample_rate': self.log_sample_rate, 'query_type': query_type,
+                                    'rows': len(result or []), 'elapsed_ms': round(elapsed_ms, 1)})
             
             # Format results nicely
-            if query_type in ['week_total', 'month_total', 'today_total', 'yesterday_total', 'total_budget']:
-                total = result[0].get('total', 0) if result else 0
-                
-                if query_type == 'total_budget':
-                    return f"💰 Total budget for this month: ${total:.2f} MXN"
+            answer = self._format_result(query_type, result, month, year)
+            self.answer_cache.put(cache_key, answer, template_window(query_type, month, year), question, generation)
+            return answer
                 
-                period_map = {
-                    'week_total': 'this week',
-                    'month_total': 'this month', 
-                    'today_total': 'today',
-                    'yesterday_total': 'yesterday'
-                }
-                period = period_map.get(query_type, 'this period')
-                return f"💰 Total spending {period}: ${total:.2f} MXN"
+        except Exception as e:
+            return f"❌ Query error: {str(e)}"
+    
+    def _format_result(self, query_type: str, result: List[Dict], month: Optional[str] = None, year: Optional[int] = None) -> str:
+        """Turn query rows into the chat reply for a template"""
+        if query_type in ['week_total', 'month_total', 'today_total', 'yesterday_total', 'total_budget']:
+            total = result[0].get('total', 0) if result else 0
             
-            elif query_type in ['month_by_category', 'custom_month_category', 'today_by_category', 'yesterday_by_category']:
-                # Determine period label
-                period_labels = {
-                    'month_by_category': 'This Month',
-                    'today_by_category': 'Today',
-                    'yesterday_by_category': 'Yesterday'
-                }
-                
-                if query_type == 'custom_month_category':
-                    period_label = f"{month.title()} {year}" if month and year else "Period"
-                    period_text = f"{month.title()} {year}".lower() if month and year else "that period"
-                else:
-                    period_label = period_labels.get(query_type, "Period")
-                    period_text = period_label.lower()
-                
-                if not result:
-                    return f"✨ No expenses found for {period_text}."
-                
-                response = f"📊 {period_label}'s Spending by Category:\n\n"
-                total_all = sum(float(r.get('total', 0)) for r in result)
-                response += f"💵 Grand Total: ${total_all:.2f} MXN\n\n"
-                
-                for i, r in enumerate(result, 1):  # Show ALL categories, not just top 5
-                    name = r.get('category', 'Unknown')
-                    amount = float(r.get('total', 0))
-                    count = int(r.get('count', 0))
-                    percentage = (amount / total_all * 100) if total_all > 0 else 0
-                    response += f"{i}. {name}: ${amount:.2f} ({percentage:.1f}%) - {count}x\n"
-                
-                return response
+            if query_type == 'total_budget':
+                return f"💰 Total budget for this month: ${total:.2f} MXN"
             
-            elif query_type in ['budget_vs_spending', 'custom_month_budget']:
-                if not result:
-                    return "📊 **Budget Analysis**\n\n✨ No budget data found. Set up budgets to track your spending progress!"
-                
-                # Calculate totals
-                total_budget = sum(float(r.get('budget', 0)) for r in result)
-                total_spent = sum(float(r.get('spent', 0)) for r in result)
-                total_remaining = total_budget - total_spent
-                overall_percent = (total_spent / total_budget * 100) if total_budget > 0 else 0
-                
-                # Conversational response as requested
-                period_text = f"{month.title()} {year}" if query_type == 'custom_month_budget' and month and year else "this month"
-                response = f"💰 **Here's how you're doing against your budget for {period_text}:**\n\n"
-                response += f"You spent **${total_spent:.2f} MXN** in {period_text}, "
-                
-                if overall_percent > 100:
-                    response += f"which is **{overall_percent:.1f}%** of your budget. 🚨\n"
-                    response += f"⚠️ You're **${abs(total_remaining):.2f} MXN over budget!**\n\n"
-                elif overall_percent > 80:
-                    response += f"which is **{overall_percent:.1f}%** of your budget. ⚠️\n"
-                    response += f"💡 You have **${total_remaining:.2f} MXN** left - watch your spending!\n\n"
-                else:
-                    response += f"which is **{overall_percent:.1f}%** of your budget. ✅\n"
-                    response += f"🎉 You have **${total_remaining:.2f} MXN** remaining. You're on track!\n\n"
-                
-                response += f"📊 **Budget: ${total_budget:.2f} MXN** | **Spent: ${total_spent:.2f} MXN** | **Progress: {overall_percent:.1f}%**\n\n"
-                
-                # Category breakdown
-                response += "📋 **By Category:**\n\n"
-                for i, r in enumerate(result[:8], 1):  # Show top 8 categories
-                    category = r.get('category_name', 'Unknown')
-                    budget = float(r.get('budget', 0))
-                    spent = float(r.get('spent', 0))
-                    remaining = float(r.get('remaining', 0))
-                    percent = float(r.get('percent_used', 0))
-                    
-                    status_emoji = "🚨" if percent > 100 else "⚠️" if percent > 80 else "✅"
-                    
-                    response += f"{status_emoji} **{category}**: ${spent:.2f} / ${budget:.2f} ({percent:.1f}%)\n"
-                    if remaining > 0:
-                        response += f"   💰 ${remaining:.2f} remaining\n"
-                    elif remaining < 0:
-                        response += f"   🚨 ${abs(remaining):.2f} over budget\n"
-                    response += "\n"
-                
-                return response
+            period_map = {
+                'week_total': 'this week',
+                'month_total': 'this month', 
+                'today_total': 'today',
+                'yesterday_total': 'yesterday'
+            }
+            period = period_map.get(query_type, 'this period')
+            return f"💰 Total spending {period}: ${total:.2f} MXN"
+        
+        elif query_type in ['month_by_category', 'custom_month_category', 'today_by_category', 'yesterday_by_category']:
+            # Determine period label
+            period_labels = {
+                'month_by_category': 'This Month',
+                'today_by_category': 'Today',
+                'yesterday_by_category': 'Yesterday'
+            }
+            
+            if query_type == 'custom_month_category':
+                period_label = f"{month.title()} {year}" if month and year else "Period"
+                period_text = f"{month.title()} {year}".lower() if month and year else "that period"
+            else:
+                period_label = period_labels.get(query_type, "Period")
+                period_text = period_label.lower()
             
-            elif query_type == 'recent_expenses':
-                if not result:
-                    return "✨ No recent expenses found."
+            if not result:
+                return f"✨ No expenses found for {period_text}."
+            
+            response = f"📊 {period_label}'s Spending by Category:\n\n"
+            total_all = sum(float(r.get('total', 0)) for r in result)
+            response += f"💵 Grand Total: ${total_all:.2f} MXN\n\n"
+            
+            for i, r in enumerate(result, 1):  # Show ALL categories, not just top 5
+                name = r.get('category', 'Unknown')
+                amount = float(r.get('total', 0))
+                count = int(r.get('count', 0))
+                percentage = (amount / total_all * 100) if total_all > 0 else 0
+                response += f"{i}. {name}: ${amount:.2f} ({percentage:.1f}%) - {count}x\n"
+            
+            return response
+        
+        elif query_type in ['budget_vs_spending', 'custom_month_budget']:
+            if not result:
+                return "📊 **Budget Analysis**\n\n✨ No budget data found. Set up budgets to track your spending progress!"
+            
+            # Calculate totals
+            total_budget = sum(float(r.get('budget', 0)) for r in result)
+            total_spent = sum(float(r.get('spent', 0)) for r in result)
+            total_remaining = total_budget - total_spent
+            overall_percent = (total_spent / total_budget * 100) if total_budget > 0 else 0
+            
+            # Conversational response as requested
+            period_text = f"{month.title()} {year}" if query_type == 'custom_month_budget' and month and year else "this month"
+            response = f"💰 **Here's how you're doing against your budget for {period_text}:**\n\n"
+            response += f"You spent **${total_spent:.2f} MXN** in {period_text}, "
+            
+            if overall_percent > 100:
+                response += f"which is **{overall_percent:.1f}%** of your budget. 🚨\n"
+                response += f"⚠️ You're **${abs(total_remaining):.2f} MXN over budget!**\n\n"
+            elif overall_percent > 80:
+                response += f"which is **{overall_percent:.1f}%** of your budget. ⚠️\n"
+                response += f"💡 You have **${total_remaining:.2f} MXN** left - watch your spending!\n\n"
+            else:
+                response += f"which is **{overall_percent:.1f}%** of your budget. ✅\n"
+                response += f"🎉 You have **${total_remaining:.2f} MXN** remaining. You're on track!\n\n"
+            
+            response += f"📊 **Budget: ${total_budget:.2f} MXN** | **Spent: ${total_spent:.2f} MXN** | **Progress: {overall_percent:.1f}%**\n\n"
+            
+            # Category breakdown
+            response += "📋 **By Category:**\n\n"
+            for i, r in enumerate(result[:8], 1):  # Show top 8 categories
+                category = r.get('category_name', 'Unknown')
+                budget = float(r.get('budget', 0))
+                spent = float(r.get('spent', 0))
+                remaining = float(r.get('remaining', 0))
+                percent = float(r.get('percent_used', 0))
                 
-                response = "📝 Recent Expenses:\n\n"
-                for i, r in enumerate(result, 1):
-                    detail = r.get('expense_detail', 'Unknown')
-                    amount = float(r.get('amount', 0))
-                    category = r.get('category', 'Unknown')
-                    date = r.get('expense_date', 'Unknown')
-                    user_name = r.get('user_name', 'Unknown')
-                    response += f"{i}. {detail} - ${amount:.2f}\n   🏷️ {category} • 📅 {date} • 👤 {user_name}\n\n"
+                status_emoji = "🚨" if percent > 100 else "⚠️" if percent > 80 else "✅"
                 
-                total_shown = sum(float(r.get('amount', 0)) for r in result)
-                response += f"💰 Total shown: ${total_shown:.2f} MXN"
-                return response
+                response += f"{status_emoji} **{category}**: ${spent:.2f} / ${budget:.2f} ({percent:.1f}%)\n"
+                if remaining > 0:
+                    response += f"   💰 ${remaining:.2f} remaining\n"
+                elif remaining < 0:
+                    response += f"   🚨 ${abs(remaining):.2f} over budget\n"
+                response += "\n"
+            
+            return response
+        
+        elif query_type == 'recent_expenses':
+            if not result:
+                return "✨ No recent expenses found."
+            
+            response = "📝 Recent Expenses:\n\n"
+            for i, r in enumerate(result, 1):
+                detail = r.get('expense_detail', 'Unknown')
+                amount = float(r.get('amount', 0))
+                category = r.get('category', 'Unknown')
+                date = r.get('expense_date', 'Unknown')
+                user_name = r.get('user_name', 'Unknown')
+                response += f"{i}. {detail} - ${amount:.2f}\n   🏷️ {category} • 📅 {date} • 👤 {user_name}\n\n"
             
-            elif query_type == 'dynamic_sql':
-                # Format dynamic SQL results intelligently
-                if not result:
-                    return "✨ No results found for your query."
+            total_shown = sum(float(r.get('amount', 0)) for r in result)
+            response += f"💰 Total shown: ${total_shown:.2f} MXN"
+            return response
+        
+        elif query_type == 'dynamic_sql':
+            # Format dynamic SQL results intelligently
+            if not result:
+                return "✨ No results found for your query."
+            
+            # Special handling for budget by category queries
+            if result and len(result) > 0 and isinstance(result[0], dict):
+                first_row = result[0]
+                has_category = 'category_name' in first_row or 'category' in first_row
+                has_budget = 'budgeted' in first_row or 'amount' in first_row or 'total' in first_row
                 
-                # Special handling for budget by category queries
-                if result and len(result) > 0 and isinstance(result[0], dict):
-                    first_row = result[0]
-                    has_category = 'category_name' in first_row or 'category' in first_row
-                    has_budget = 'budgeted' in first_row or 'amount' in first_row or 'total' in first_row
+                if has_category and has_budget:
+                    # This is a budget by category query
+                    total = sum(float(r.get('budgeted', r.get('amount', r.get('total', 0)))) for r in result)
                     
-                    if has_category and has_budget:
-                        # This is a budget by category query
-                        total = sum(float(r.get('budgeted', r.get('amount', r.get('total', 0)))) for r in result)
-                        
-                        response = f"💰 **Budget by Category** (Total: ${total:,.2f} MXN)\n\n"
-                        
-                        for i, r in enumerate(result, 1):
-                            category_name = r.get('category_name', r.get('category', f'Category {i}'))
-                            amount = float(r.get('budgeted', r.get('amount', r.get('total', 0))))
-                            percentage = (amount / total * 100) if total > 0 else 0
-                            
-                            response += f"{i}. **{category_name}**: ${amount:,.2f} MXN ({percentage:.1f}%)\n"
+                    response = f"💰 **Budget by Category** (Total: ${total:,.2f} MXN)\n\n"
+                    
+                    for i, r in enumerate(result, 1):
+                        category_name = r.get('category_name', r.get('category', f'Category {i}'))
+                        amount = float(r.get('budgeted', r.get('amount', r.get('total', 0))))
+                        percentage = (amount / total * 100) if total > 0 else 0
                         
-                        return response
-                
-                # Default formatting
-                response = f"📊 **Results:**\n\n"
-                
-                # Try to format results smartly based on content
-                if len(result) == 1 and 'total' in str(result[0]).lower():
-                    # Single total result
-                    total_val = next(iter(result[0].values()))
-                    response += f"💰 **Total: ${float(total_val):,.2f} MXN**"
-                else:
-                    # Multiple results - create table format
-                    for i, row in enumerate(result[:20], 1):  # Limit to 20 rows
-                        row_text = ""
-                        for key, value in row.items():
-                            if isinstance(value, (int, float)) and 'amount' in key.lower():
-                                row_text += f"${float(value):,.2f} "
-                            else:
-                                row_text += f"{value} "
-                        response += f"{i}. {row_text.strip()}\n"
+                        response += f"{i}. **{category_name}**: ${amount:,.2f} MXN ({percentage:.1f}%)\n"
                     
-                    if len(result) > 20:
-                        response += f"\n... and {len(result) - 20} more rows"
-                
-                return response
+                    return response
             
+            # Default formatting
+            response = f"📊 **Results:**\n\n"
+            
+            # Try to format results smartly based on content
+            if len(result) == 1 and 'total' in str(result[0]).lower():
+                # Single total result
+                total_val = next(iter(result[0].values()))
+                response += f"💰 **Total: ${float(total_val):,.2f} MXN**"
             else:
-                return json.dumps(result)
+                # Multiple results - create table format
+                for i, row in enumerate(result[:20], 1):  # Limit to 20 rows
+                    row_text = ""
+                    for key, value in row.items():
+                        if isinstance(value, (int, float)) and 'amount' in key.lower():
+                            row_text += f"${float(value):,.2f} "
+                        else:
+                            row_text += f"{value} "
+                    response += f"{i}. {row_text.strip()}\n"
                 
-        except Exception as e:
-            return f"❌ Query error: {str(e)}"
+                if len(result) > 20:
+                    response += f"\n... and {len(result) - 20} more rows"
+            
+            return response
+        
+        else:
+            return json.dumps(result)
     
     def _run(self, question: str, query_type: Optional[str] = None, custom_sql: Optional[str] = None, month: Optional[str] = None, year: Optional[int] = None) -> str:
         import asyncio
@@ -844,7 +891,7 @@ Examples:
         return loop.run_until_complete(self._arun(question, query_type, custom_sql, month, year))
 
 class FinAIAgent:
-    def __init__(self, db_client, classifier, parser):
+    def __init__(self, db_client, classifier, parser, memory: Optional[ConversationMemory] = None):
         self.db_client = db_client
         self.classifier = classifier
         self.parser = parser
@@ -852,13 +899,32 @@ class FinAIAgent:
         # Initialize OpenAI LLM - Using GPT-4o-mini for cost-effective decision making
         self.llm = ChatOpenAI(
             model="gpt-4o-mini",
-            temperature=0
+            temperature=0,
+            stream_usage=True  # token usage on streamed replies too (process_message on_progress)
         )
         
-        # Conversation memory storage: {chat_id: [(user_msg, assistant_msg), ...]}
-        # Keep last 5 message pairs (10 messages total) for context
-        self.conversation_history = {}
-        self.max_history = 5
+        # Conversation memory: last message pairs per chat (CONVERSATION_MAX_TURNS, default 5)
+        # in a bounded LRU with idle expiry, written behind to conversation_state
+        # (shared with the bot, which uses it before the agent has loaded)
+        self.memory = memory or ConversationMemory(db_client)
+        
+        # Direct pipeline: confident expense entries are parsed, classified and inserted
+        # in-process with no LLM call; everything else goes through the ReAct agent
+        self.direct = DirectPipeline(db_client, classifier, parser)
+        self.direct_pipeline = self.direct.enabled
+        
+        # Per-path latency/token metrics: {path: {'count', 'tokens', 'latencies'}}
+        self.path_stats: Dict[str, Dict[str, Any]] = {}
+        
+        # Global cap on concurrent agent (LLM) runs across all chats; chats over the cap
+        # wait here instead of piling requests onto OpenAI
+        self.max_llm_concurrency = int(os.getenv('AGENT_MAX_CONCURRENCY', DEFAULT_AGENT_MAX_CONCURRENCY))
+        self._llm_slots = asyncio.Semaphore(self.max_llm_concurrency)
+        self.llm_in_flight = 0
+        self.llm_waiting = 0
+        self.llm_wait_seconds = 0.0
+        self.llm_max_wait_seconds = 0.0
+        self.llm_runs = 0
         
         # Create tools
         self.tools = [
@@ -1082,41 +1148,153 @@ Remember: You're an intelligent assistant with reasoning capabilities. Think abo
         # Extract system message from prompt template
         from langchain_core.messages import SystemMessage
         system_message_content = prompt.messages[0].prompt.template
+        # The system prompt is static and always sent first, so provider prompt caching
+        # reuses it across requests; history and earlier tool outputs are fitted to
+        # AGENT_CONTEXT_BUDGET tokens around it
+        self.context_builder = ContextBuilder(system_message_content)
         self.agent_executor = create_react_agent(
             self.llm,
             self.tools,
-            prompt=SystemMessage(content=system_message_content)
+            prompt=SystemMessage(content=system_message_content),
+            pre_model_hook=self.context_builder.pre_model_hook
         )
     
-    async def process_message(self, message: str, user_id: Optional[int] = None, chat_id: Optional[int] = None) -> str:
-        """Process a user message and return response with conversation memory"""
+    def _record_path(self, path: str, seconds: float, tokens: int = 0):
+        stats = self.path_stats.setdefault(path, {'count': 0, 'tokens': 0, 'latencies': deque(maxlen=500)})
+        stats['count'] += 1
+        stats['tokens'] += tokens
+        stats['latencies'].append(seconds)
+        metrics.observe(f"agent.path.{path}", seconds)
+    
+    @asynccontextmanager
+    async def _llm_slot(self):
+        """Hold one of the AGENT_MAX_CONCURRENCY agent slots, recording the wait"""
+        queued_at = time.perf_counter()
+        self.llm_waiting += 1
+        try:
+            await self._llm_slots.acquire()
+        finally:
+            self.llm_waiting -= 1
+        waited = time.perf_counter() - queued_at
+        metrics.observe('agent.llm_slot_wait', waited)
+        self.llm_wait_seconds += waited
+        self.llm_max_wait_seconds = max(self.llm_max_wait_seconds, waited)
+        self.llm_in_flight += 1
+        try:
+            yield
+        finally:
+            self.llm_in_flight -= 1
+            self.llm_runs += 1
+            self._llm_slots.release()
+    
+    def llm_metrics(self) -> Dict[str, Any]:
+        """Agent concurrency: runs in flight / waiting for a slot and time spent waiting"""
+        return {
+            'max_concurrency': self.max_llm_concurrency,
+            'in_flight': self.llm_in_flight,
+            'waiting': self.llm_waiting,
+            'runs': self.llm_runs,
+            'avg_wait_ms': self.llm_wait_seconds / self.llm_runs * 1000 if self.llm_runs else 0.0,
+            'max_wait_ms': self.llm_max_wait_seconds * 1000
+        }
+    
+    def path_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Messages, latency percentiles (recent window) and LLM tokens per processing path"""
+        report = {}
+        for path, stats in self.path_stats.items():
+            latencies = sorted(stats['latencies'])
+            report[path] = {
+                'count': stats['count'],
+                'p50_ms': latencies[len(latencies) // 2] * 1000 if latencies else 0.0,
+                'p95_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000 if latencies else 0.0,
+                'tokens': stats['tokens'],
+                'tokens_per_message': stats['tokens'] / stats['count'] if stats['count'] else 0.0
+            }
+        return report
+    
+    async def _process_direct(self, message: str, user_id: Optional[int], history: List) -> Optional[str]:
+        """Plain expense entry without the agent (see direct_pipeline.DirectPipeline)"""
+        return await self.direct.process(message, user_id, history)
+    
+    async def _stream_agent(self, messages: List, on_progress: Callable[[str, Any], None]) -> Dict:
+        """
+        Run the agent through astream_events, reporting progress as it happens:
+        ('start', None), ('model_start', None), ('token', text), ('tool_start', name)
+        and ('tool_end', name). Returns the final graph state like ainvoke
+        """
+        on_progress('start', None)
+        result: Dict = {}
+        async for event in self.agent_executor.astream_events({"messages": messages}, version="v2"):
+            kind = event['event']
+            if kind == 'on_chat_model_start':
+                on_progress('model_start', None)
+            elif kind == 'on_chat_model_stream':
+                content = event['data']['chunk'].content
+                if isinstance(content, list):
+                    content = ''.join(block.get('text', '') for block in content if isinstance(block, dict))
+                if content:
+                    on_progress('token', content)
+            elif kind == 'on_tool_start':
+                on_progress('tool_start', event['name'])
+            elif kind == 'on_tool_end':
+                on_progress('tool_end', event['name'])
+            elif kind == 'on_chain_end' and not event.get('parent_ids'):
+                output = event['data'].get('output')
+                if isinstance(output, dict):
+                    result = output
+        return result
+    
+    @timed('agent.process_message')
+    async def process_message(
+        self,
+        message: str,
+        user_id: Optional[int] = None,
+        chat_id: Optional[int] = None,
+        on_progress: Optional[Callable[[str, Any], None]] = None
+    ) -> str:
+        """
+        Process a user message and return response with conversation memory
+        on_progress, when given, streams the agent run (see _stream_agent); it is
+        never called for messages the direct pipeline answers
+        """
+        started = time.perf_counter()
         try:
             from langchain_core.messages import HumanMessage, AIMessage
             
             # Get conversation history for this chat
             chat_key = chat_id or user_id  # Use chat_id if available, fallback to user_id
-            if chat_key not in self.conversation_history:
-                self.conversation_history[chat_key] = []
+            history = await self.memory.get(chat_key)
             
-            history = self.conversation_history[chat_key]
+            if self.direct_pipeline:
+                response = await self._process_direct(message, user_id, history)
+                if response:
+                    await self.memory.append(chat_key, message, response)
+                    self._record_path('direct', time.perf_counter() - started)
+                    return response
             
-            # Build chat_history for the agent (list of alternating Human/AI messages)
+            # Process current message
+            # Inject user_id into the message so the agent knows it when calling tools
+            formatted_message = f"[SYSTEM: user_id={user_id}]\n{message}"
+            
+            # Build chat_history for the agent (list of alternating Human/AI messages),
+            # with older replies compacted to fit the token budget
+            history, context = self.context_builder.build(history, formatted_message)
             chat_history_messages = []
             for user_msg, assistant_msg in history:
                 chat_history_messages.append(HumanMessage(content=user_msg))
                 chat_history_messages.append(AIMessage(content=assistant_msg))
             
-            # Process current message
-            # Inject user_id into the message so the agent knows it when calling tools
-            formatted_message = f"[SYSTEM: user_id={user_id}]\n{message}"
-            
             # langgraph agents use 'messages' key instead of 'input'
             # Include chat history IN the messages array (history first, then current message)
             all_messages = chat_history_messages + [HumanMessage(content=formatted_message)]
             
-            result = await self.agent_executor.ainvoke({
-                "messages": all_messages
-            })
+            async with self._llm_slot():
+                if on_progress is None:
+                    result = await self.agent_executor.ainvoke({
+                        "messages": all_messages
+                    })
+                else:
+                    result = await self._stream_agent(all_messages, on_progress)
             
             # Extract the last message from the agent
             response = None
@@ -1132,11 +1310,23 @@ Remember: You're an intelligent assistant with reasoning capabilities. Think abo
             if not response:
                 response = "I couldn't process that request."
             
-            # Update conversation history (keep last N pairs)
+            # Update conversation history (keeps the last N pairs)
             # Store the original message (without SYSTEM prefix) for cleaner history
-            history.append((message, response))
-            if len(history) > self.max_history:
-                history.pop(0)  # Remove oldest message pair
+            await self.memory.append(chat_key, message, response)
+            
+            tokens = 0
+            if isinstance(result, dict):
+                for msg in result.get("messages", [])[len(all_messages):]:
+                    usage = getattr(msg, 'usage_metadata', None) or {}
+                    tokens += usage.get('total_tokens', 0)
+                    metrics.add_tokens('agent.react', usage)
+            self._record_path('agent', time.perf_counter() - started, tokens)
+            import logging
+            logging.getLogger(__name__).info(
+                f"Agent path: {tokens} tokens; context {context['tokens_before']} -> {context['tokens_after']} "
+                f"tokens/request ({context['compacted']} replies compacted, {context['dropped']} turns dropped), "
+                f"{self.path_metrics()}"
+            )
             
             return response
             
@@ -0,0 +1,165 @@
+"""
+Answer cache for SqlQueryTool
+Keeps formatted analytics answers keyed by resolved template + date window (or by
+normalized question for dynamic SQL) and drops the entries whose window covers an
+expense date as soon as SupabaseClient writes to the expenses table
+"""
+import calendar
+import os
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+from router import normalize_question
+
+# Seconds an answer is served before it is recomputed even without writes
+DEFAULT_ANSWER_CACHE_TTL = 600
+
+# Maximum number of cached answers (least recently used are evicted first)
+DEFAULT_ANSWER_CACHE_SIZE = 256
+
+# Window for answers that don't read the expenses table (never invalidated by expense writes)
+NO_EXPENSES = ()
+
+Window = Optional[Tuple[Optional[date], Optional[date]]]
+
+def template_window(query_type: str, month: Optional[str] = None, year: Optional[int] = None,
+                    today: Optional[date] = None) -> Window:
+    """
+    Inclusive expense_date range read by a template, mirroring execute_raw_sql
+    Returns None when any expense write may change the answer
+    """
+    today = today or date.today()
+    if query_type in ('today_total', 'today_by_category'):
+        return today, today
+    if query_type in ('yesterday_total', 'yesterday_by_category'):
+        yesterday = today - timedelta(days=1)
+        return yesterday, yesterday
+    if query_type == 'week_total':
+        return today - timedelta(days=7), today
+    if query_type in ('month_total', 'month_by_category', 'budget_vs_spending'):
+        return today.replace(day=1), today
+    if query_type == 'total_budget':
+        return NO_EXPENSES
+    if query_type in ('custom_month_category', 'custom_month_budget') and month and year:
+        month_names = [m.lower() for m in calendar.month_name]
+        if month.lower() in month_names:
+            month_num = month_names.index(month.lower())
+            last_day = calendar.monthrange(int(year), month_num)[1]
+            return date(int(year), month_num, 1), date(int(year), month_num, last_day)
+    # recent_expenses, dynamic_sql and anything unrecognised
+    return None
+
+class AnswerCache:
+    """
+    LRU + TTL cache of formatted SqlQueryTool answers
+    Question aliases let a repeated question skip the router/LLM consultation too
+    """
+    def __init__(self, ttl: Optional[float] = None, max_entries: Optional[int] = None):
+        self.ttl = float(os.getenv('ANSWER_CACHE_TTL', DEFAULT_ANSWER_CACHE_TTL)) if ttl is None else ttl
+        self.max_entries = int(os.getenv('ANSWER_CACHE_SIZE', DEFAULT_ANSWER_CACHE_SIZE)) if max_entries is None else max_entries
+        self.enabled = self.ttl > 0 and self.max_entries > 0
+        # key -> (answer, window, expires_at)
+        self._entries: "OrderedDict[Tuple, Tuple[str, Window, float]]" = OrderedDict()
+        # (normalized question, day) -> key
+        self._questions: Dict[Tuple[str, str], Tuple] = {}
+        # Bumped by every invalidation so answers computed across a write aren't stored
+        self.generation = 0
+
+        # Stats
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def make_key(self, query_type: str, question: Optional[str] = None, month: Optional[str] = None,
+                 year: Optional[int] = None) -> Optional[Tuple]:
+        """Cache key for a resolved query; None when the query must not be cached"""
+        if not self.enabled or not query_type or query_type == 'custom':
+            return None
+        day = date.today().isoformat()
+        if query_type == 'dynamic_sql':
+            if not question:
+                return None
+            return query_type, normalize_question(question), day
+        return query_type, (month or '').lower(), year, day
+
+    def _question_key(self, question: str) -> Tuple[str, str]:
+        return normalize_question(question), date.today().isoformat()
+
+    def get(self, key: Optional[Tuple]) -> Optional[str]:
+        if key is None:
+            return None
+        entry = self._entries.get(key)
+        if entry is None or entry[2] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def get_for_question(self, question: Optional[str]) -> Optional[str]:
+        """Answer previously given to the same (normalized) question today"""
+        if not self.enabled or not question:
+            return None
+        key = self._questions.get(self._question_key(question))
+        if key is None or key not in self._entries:
+            return None
+        return self.get(key)
+
+    def put(self, key: Optional[Tuple], answer: str, window: Window, question: Optional[str] = None,
+            generation: Optional[int] = None):
+        """
+        Store an answer; skipped when an invalidation happened since `generation`
+        was read (the answer may predate the write)
+        """
+        if key is None or (generation is not None and generation != self.generation):
+            return
+        self._entries[key] = (answer, window, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        self.alias(question, key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        if len(self._questions) > self.max_entries * 4:
+            self._questions = {q: k for q, k in self._questions.items() if k in self._entries}
+
+    def alias(self, question: Optional[str], key: Optional[Tuple]):
+        """Point a question at an existing answer so its next ask skips routing"""
+        if question and key is not None:
+            self._questions[self._question_key(question)] = key
+
+    def invalidate_dates(self, dates: Optional[Iterable] = None):
+        """
+        Drop answers whose window contains any of `dates` (date or 'YYYY-MM-DD');
+        None means the affected dates are unknown and every expense-backed answer goes
+        """
+        self.generation += 1
+        self.invalidations += 1
+        parsed = None
+        if dates is not None:
+            parsed = [d if isinstance(d, date) else date.fromisoformat(str(d)[:10]) for d in dates if d]
+
+        for key, (_, window, _) in list(self._entries.items()):
+            if window == NO_EXPENSES:
+                continue
+            if window is None or parsed is None or any(
+                (window[0] is None or d >= window[0]) and (window[1] is None or d <= window[1]) for d in parsed
+            ):
+                del self._entries[key]
+
+    def clear(self):
+        self.generation += 1
+        self._entries.clear()
+        self._questions.clear()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'invalidations': self.invalidations
+        }
@@ -0,0 +1,119 @@
+"""
+Aggregation push-down benchmark for SupabaseClient.execute_raw_sql
+Compares payload bytes and latency of the Python aggregation fallback
+(download every row, sum in Python) against the server-side RPC path at
+several ledger sizes. The stand-in computes RPC results in-process, the way
+Postgres would, and only ships the aggregated rows.
+
+Usage: python benchmarks/bench_aggregation_pushdown.py [--rows 10000 100000 1000000]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from fake_postgrest import FakePostgrest  # noqa: E402
+
+CATEGORIES = ['Groceries', 'Restaurants', 'Transportation', 'Gas', 'Oxxo', 'Rent', 'Others']
+TEMPLATES = ['month_total', 'month_by_category', 'budget_vs_spending']
+
+
+def build_tables(rows: int):
+    today = date.today()
+    categories = [{'id': f'c{i}', 'name': name} for i, name in enumerate(CATEGORIES)]
+    expenses = []
+    for i in range(rows):
+        category = categories[i % len(categories)]
+        expenses.append({
+            'id': f'e{i}',
+            'category_id': category['id'],
+            'categories': {'name': category['name']},
+            'amount': round(random.uniform(10, 2000), 2),
+            'expense_date': str(today.replace(day=1 + i % today.day)),
+        })
+    budgets = [{'category_id': c['id'], 'categories': {'name': c['name']}, 'amount': 5000.0,
+                'month': today.month, 'year': today.year} for c in categories]
+    return {'categories': categories, 'expenses': expenses, 'budgets': budgets}
+
+
+def build_rpc(tables):
+    names = {c['id']: c['name'] for c in tables['categories']}
+
+    def in_range(expense, args):
+        start, end = args.get('p_start_date'), args.get('p_end_date')
+        return (not start or expense['expense_date'] >= start) and (not end or expense['expense_date'] <= end)
+
+    def expense_total(args):
+        amounts = [e['amount'] for e in tables['expenses'] if in_range(e, args)]
+        return [{'total': sum(amounts), 'count': len(amounts)}]
+
+    def by_category_id(args):
+        totals = defaultdict(lambda: [0.0, 0])
+        for e in tables['expenses']:
+            if in_range(e, args):
+                totals[e['category_id']][0] += e['amount']
+                totals[e['category_id']][1] += 1
+        return totals
+
+    def expense_totals_by_category(args):
+        totals = by_category_id(args)
+        rows = [{'category': names[cid], 'total': t, 'count': n} for cid, (t, n) in totals.items()]
+        rows.sort(key=lambda r: r['total'], reverse=True)
+        return rows[:args['p_limit']] if args.get('p_limit') else rows
+
+    def budget_vs_spending(args):
+        totals = by_category_id(args)
+        rows = []
+        for b in tables['budgets']:
+            spent = totals[b['category_id']][0]
+            rows.append({'category_name': names[b['category_id']], 'budget': b['amount'], 'spent': spent,
+                         'remaining': b['amount'] - spent, 'percent_used': spent / b['amount'] * 100})
+        return sorted(rows, key=lambda r: r['percent_used'], reverse=True)
+
+    return {
+        'expense_total': expense_total,
+        'expense_totals_by_category': expense_totals_by_category,
+        'budget_vs_spending': budget_vs_spending,
+    }
+
+
+async def measure(db, server, template: str):
+    server.reset_counters()
+    started = time.perf_counter()
+    await db.execute_raw_sql('', [], template, None)
+    return time.perf_counter() - started, server.bytes_sent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--latency', type=float, default=0.005, help='simulated seconds per PostgREST request')
+    args = parser.parse_args()
+
+    from database import SupabaseClient
+
+    print(f"{'rows':>9} {'template':<20}{'python KB':>12}{'rpc KB':>10}{'python ms':>11}{'rpc ms':>9}")
+    for rows in args.rows:
+        tables = build_tables(rows)
+        with FakePostgrest(tables, latency=args.latency, rpc=build_rpc(tables)) as server:
+            os.environ['SUPABASE_URL'] = server.url
+            os.environ['SUPABASE_SERVICE_ROLE_KEY'] = 'bench.bench.bench'
+            db = SupabaseClient()
+            for template in TEMPLATES:
+                db.use_aggregate_rpc = False
+                py_time, py_bytes = asyncio.run(measure(db, server, template))
+                db.use_aggregate_rpc = True
+                rpc_time, rpc_bytes = asyncio.run(measure(db, server, template))
+                print(f"{rows:>9} {template:<20}{py_bytes / 1024:>12.1f}{rpc_bytes / 1024:>10.2f}"
+                      f"{py_time * 1000:>11.1f}{rpc_time * 1000:>9.1f}")
+            db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Bulk import benchmark for importer.BulkImporter
+Writes a synthetic card statement (CSV, mixed MXN/CAD/USD rows, refunds, a few broken
+lines) and streams it through the importer into a local PostgREST stand-in,
+reporting rows/s, insert requests and per-row errors.
+
+Usage: python benchmarks/bench_bulk_import.py [--rows 100000] [--chunk-size 500]
+"""
+import argparse
+import asyncio
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from fake_postgrest import FakePostgrest  # noqa: E402
+
+MERCHANTS = ['COSTCO WHOLESALE #123', 'UBER *TRIP', 'OXXO SUC 45', 'STARBUCKS 0042', 'NETFLIX.COM', 'PEMEX GAS',
+             'AMAZON MKTPLACE', 'WALMART SUPERCENTER', 'SPOTIFY', 'TELUS MOBILITY', 'RESTAURANTE EL GORDO', 'ZARA']
+
+
+def write_statement(path: str, rows: int):
+    start = date.today() - timedelta(days=365)
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Transaction Date', 'Description', 'Amount', 'Currency'])
+        for i in range(rows):
+            if i % 10_000 == 9_999:
+                writer.writerow(['not a date', 'BROKEN ROW', 'abc', ''])
+                continue
+            writer.writerow([
+                str(start + timedelta(days=i % 365)),
+                random.choice(MERCHANTS),
+                # Charges are money out; every 20th row is a refund, which the importer skips
+                f"{random.uniform(20, 2500) * (1 if i % 20 == 19 else -1):,.2f}",
+                random.choice(['MXN', 'MXN', 'MXN', 'CAD', 'USD']),
+            ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--chunk-size', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.005, help='simulated seconds per PostgREST request')
+    args = parser.parse_args()
+
+    from classifier import ExpenseClassifier
+    from database import SupabaseClient
+    from importer import BulkImporter, open_statement
+
+    classifier = ExpenseClassifier(db_client=None)
+    tables = {
+        'users': [{'id': 'u1', 'name': 'Ana', 'telegram_id': '1001'}],
+        'categories': [{'id': f'c{i}', 'name': name} for i, name in enumerate(classifier.category_rules)],
+        'currency_rates': [{'base_currency': 'CAD', 'target_currency': 'MXN', 'rate': 13.3},
+                           {'base_currency': 'MXN', 'target_currency': 'USD', 'rate': 0.055}],
+        'expenses': [],
+    }
+
+    with tempfile.TemporaryDirectory() as tmp, FakePostgrest(tables, latency=args.latency) as server:
+        path = os.path.join(tmp, 'statement.csv')
+        write_statement(path, args.rows)
+        os.environ['SUPABASE_URL'] = server.url
+        os.environ['SUPABASE_SERVICE_ROLE_KEY'] = 'bench.bench.bench'
+        db = SupabaseClient()
+        importer = BulkImporter(db, classifier, chunk_size=args.chunk_size)
+        rows, stream = open_statement(path)
+        started = time.perf_counter()
+        try:
+            report = asyncio.run(importer.run(rows, 1001, source='statement.csv'))
+        finally:
+            stream.close()
+            db.close()
+        wall = time.perf_counter() - started
+
+    print(report.summary())
+    print(f"wall {wall:.1f}s, {server.requests} PostgREST requests, {len(tables['expenses'])} rows stored")
+
+
+if __name__ == '__main__':
+    main()
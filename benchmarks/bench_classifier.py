@@ -0,0 +1,93 @@
+"""
+Classification micro-benchmark for ExpenseClassifier
+Replays a realistic merchant corpus through the per-phrase scan the classifier
+used before the compiled index (normalize + score every phrase, twice for
+low-confidence merchants) and through classify_expense, checks that both agree,
+and reports classifications per second.
+
+Usage: python benchmarks/bench_classifier.py [--rounds 20]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from classifier import ExpenseClassifier  # noqa: E402
+
+MERCHANTS = [
+    'Costco', 'costco wholesale', 'Walmart Supercenter', 'T&T Supermarket', 'No Frills', 'Real Canadian Superstore',
+    'Oxxo', 'oxxo gas', '7-Eleven', 'Uber', 'Uber Eats', 'Lyft ride', 'Compass card', 'Evo car share', 'taxi aeropuerto',
+    'Pemex', 'Shell', 'gasolina', 'Netflix', 'Spotify premium', 'iCloud storage', 'YouTube Premium', 'Duolingo',
+    'Telus mobile', 'internet casa', 'celular recarga', 'Starbucks coffee', 'tacos el gordo', 'sushi night',
+    'cena con amigos', 'desayuno', 'ice cream', 'pan y te', 'kebab house', 'Zara', 'Uniqlo', 'H&M', 'ropa bebe',
+    'Air Canada flight', 'hotel cancun', 'vuelo mexico', 'cinema', 'concierto', 'clase de baile', 'iPhone case',
+    'macbook charger', 'vacuum cleaner', 'pet hair remover', 'jabon carita', 'shampoo', 'salon de belleza',
+    'farmacia guadalajara', 'pharmacy', 'vet kenzo', 'dog food', 'rent october', 'renta depa', 'gym membership',
+    'clase latina online gym', 'seguro auto', 'bank fee', 'ICBC insurance', 'pgwp application', 'licencia manejo',
+    'stuff i bought', 'regalo cumple', 'misc', 'Marissa', 'pelotas padel', 'amazon order',
+]
+
+
+def legacy_scores(classifier, normalized_merchant, categories):
+    """The pre-index scan: normalize and score every phrase of every category"""
+    scores = []
+    for cat in categories:
+        name_score = classifier._score_match(normalized_merchant, cat['name'])
+        rule_score = 0.0
+        for phrase in classifier.category_rules.get(cat['name'], []):
+            rule_score = max(rule_score, classifier._score_match(normalized_merchant, phrase))
+        scores.append((name_score, rule_score))
+    return scores
+
+
+def legacy_classify(classifier, merchant, categories):
+    normalized = classifier.normalize_text(merchant)
+    scores = legacy_scores(classifier, normalized, categories)
+    best = max(scores, key=lambda s: s[0] if s[0] >= 1.0 else max(s[0], s[1] * 0.9))
+    best_score = best[0] if best[0] >= 1.0 else max(best[0], best[1] * 0.9)
+    if best_score < 0.7:
+        legacy_scores(classifier, normalized, categories)  # suggestions re-scan
+    return scores
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    classifier = ExpenseClassifier(db_client=None)
+    categories = [{'id': f'c{i}', 'name': name} for i, name in enumerate(classifier.category_rules)]
+    phrases = sum(len(p) for p in classifier.category_rules.values())
+
+    # Both paths must produce identical per-category scores
+    index = classifier._get_index(categories)
+    for merchant in MERCHANTS:
+        normalized = classifier.normalize_text(merchant)
+        assert index.category_scores(normalized) == legacy_scores(classifier, normalized, categories), merchant
+
+    total = len(MERCHANTS) * args.rounds
+    started = time.perf_counter()
+    for _ in range(args.rounds):
+        for merchant in MERCHANTS:
+            legacy_classify(classifier, merchant, categories)
+    legacy = total / (time.perf_counter() - started)
+
+    async def indexed():
+        for _ in range(args.rounds):
+            for merchant in MERCHANTS:
+                await classifier.classify_expense(merchant, categories)
+
+    started = time.perf_counter()
+    asyncio.run(indexed())
+    compiled = total / (time.perf_counter() - started)
+
+    print(f"{len(MERCHANTS)} merchants x {args.rounds} rounds, {len(categories)} categories, {phrases} rule phrases")
+    print(f"per-phrase scan:  {legacy:>10.0f} classifications/s")
+    print(f"compiled index:   {compiled:>10.0f} classifications/s  ({compiled / legacy:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Agent context budget benchmark for FinAIAgent
+Replays a chat mixing expense entries and analytics questions (long category
+breakdowns in the replies) and reports, per turn, the prompt tokens the agent
+sent before (system prompt + last five raw message pairs) and after
+ContextBuilder, plus a ReAct step whose earlier tool outputs get compacted.
+
+Usage: python benchmarks/bench_context.py [--budget 4000] [--turns 12]
+"""
+import argparse
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from context_builder import ContextBuilder, MESSAGE_OVERHEAD, count_tokens  # noqa: E402
+
+BREAKDOWN = "📊 Spending by category for October 2026:\n\n" + "\n".join(
+    f"• {name}: ${amount:,.2f} MXN ({share}%)"
+    for name, amount, share in [
+        ('Groceries', 8450.5, 28), ('Restaurants', 5230.0, 17), ('Gas', 3120.75, 10), ('Home', 2890.0, 9),
+        ('Subscriptions', 1540.0, 5), ('Health', 1320.3, 4), ('Clothing', 1200.0, 4), ('Entertainment', 990.0, 3),
+        ('Transport', 870.0, 3), ('Gifts', 650.0, 2), ('Pets', 540.0, 2), ('Education', 500.0, 2),
+        ('Beauty', 421.0, 1), ('Others', 380.0, 1), ('Utilities', 2950.0, 9),
+    ]
+) + "\n\n💰 Total spent: $30,852.55 MXN\n📈 Budget remaining: $9,147.45 MXN"
+
+CONVERSATION = [
+    ("how much did we spend by category this month?", BREAKDOWN),
+    ("Costco 120", "✅ Expense saved!\n\n💳 Costco — $120.00 MXN\n🏷 Category: Groceries"),
+    ("and budget vs spending?", BREAKDOWN.replace('Spending by category', 'Budget vs spending')),
+    ("Uber 45,50", "✅ Expense saved!\n\n💳 Uber — $45.50 MXN\n🏷 Category: Transport"),
+    ("show me september by category", BREAKDOWN.replace('October', 'September')),
+    ("what's the total this week?", "💰 You've spent $4,210.00 MXN this week across 23 expenses."),
+]
+
+
+def system_prompt() -> str:
+    """The agent's static system prompt, read from agent.py"""
+    with open(os.path.join(os.path.dirname(__file__), '..', 'agent.py'), encoding='utf-8') as f:
+        source = f.read()
+    return re.search(r'"""(You are FinAIssistant.*?)"""', source, re.DOTALL).group(1)
+
+
+def legacy_tokens(prompt: str, history, message: str, max_history: int = 5) -> int:
+    sent = [prompt, message] + [text for pair in history[-max_history:] for text in pair]
+    return sum(count_tokens(text) + MESSAGE_OVERHEAD for text in sent)
+
+
+def react_step(builder: ContextBuilder):
+    """Tokens of a third ReAct step after two large tool outputs, which together exceed the budget"""
+    from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+    call = lambda i: AIMessage(content='', tool_calls=[{'name': 'sql_query', 'args': {}, 'id': f'c{i}'}])  # noqa: E731
+    messages = [
+        HumanMessage(content='[SYSTEM: user_id=1]\ncompare september and october by category'),
+        call(1), ToolMessage(content=BREAKDOWN.replace('October', 'September') * 16, tool_call_id='c1'),
+        call(2), ToolMessage(content=BREAKDOWN * 16, tool_call_id='c2'),
+    ]
+    count = lambda msgs: builder.system_tokens + sum(count_tokens(m.content) + MESSAGE_OVERHEAD for m in msgs)  # noqa: E731
+    trimmed = builder.pre_model_hook({'messages': messages})['llm_input_messages']
+    return count(messages), count(trimmed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--budget', type=int, default=None, help='AGENT_CONTEXT_BUDGET (default 4000)')
+    parser.add_argument('--turns', type=int, default=12)
+    args = parser.parse_args()
+
+    prompt = system_prompt()
+    builder = ContextBuilder(prompt, budget=args.budget)
+    print(f"system prompt: {builder.system_tokens} tokens (static prefix), history budget {builder.budget}")
+    print(f"{'turn':>4}  {'before':>7}{'after':>7}{'kept':>6}{'compacted':>11}")
+
+    history = []
+    for turn in range(args.turns):
+        message, reply = CONVERSATION[turn % len(CONVERSATION)]
+        formatted = f"[SYSTEM: user_id=1]\n{message}"
+        before = legacy_tokens(prompt, history, formatted)
+        kept, report = builder.build(history[-5:], formatted)
+        print(f"{turn + 1:>4}  {before:>7}{report['tokens_after']:>7}{report['history_turns']:>6}{report['compacted']:>11}")
+        history.append((message, reply))
+
+    stats = builder.stats()
+    print(f"tokens/turn: {stats['tokens_per_turn_before']:.0f} -> {stats['tokens_per_turn_after']:.0f} ({stats['saved']:.0%} saved)")
+    print(f"compacted breakdown reply:\n{kept[0][1] if kept else ''}")
+    step_before, step_after = react_step(builder)
+    print(f"ReAct step with two earlier tool outputs: {step_before} -> {step_after} tokens")
+    sys.exit(0 if stats['tokens_per_turn_after'] <= builder.system_tokens + builder.budget and step_after < step_before else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Currency conversion benchmark for CurrencyConverter
+Converts a column of mixed-currency amounts to MXN three ways against a local
+PostgREST stand-in: the old per-conversion currency_rates selects (direct, then
+reverse), convert_amount over the cached rate matrix, and one convert_many call.
+Also checks a triangulated cross rate (CAD->EUR via MXN) resolves and that a
+scheduled refresh lands in one upsert and is served without re-reading rates.
+
+Usage: python benchmarks/bench_currency.py [--rows 100000] [--legacy-rows 200]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from fake_postgrest import FakePostgrest  # noqa: E402
+
+RATES = [
+    {'base_currency': 'CAD', 'target_currency': 'MXN', 'rate': 13.3, 'updated_at': '2026-10-18T00:00:00Z'},
+    {'base_currency': 'USD', 'target_currency': 'MXN', 'rate': 18.2, 'updated_at': '2026-10-18T00:00:00Z'},
+    {'base_currency': 'MXN', 'target_currency': 'EUR', 'rate': 0.05, 'updated_at': '2026-10-18T00:00:00Z'},
+    {'base_currency': 'MXN', 'target_currency': 'GBP', 'rate': 0.043, 'updated_at': '2026-10-18T00:00:00Z'},
+]
+
+
+async def legacy_rate(db, from_currency: str, to_currency: str):
+    """SupabaseClient.get_currency_rate before the rate matrix"""
+    for base, target, direct in ((from_currency, to_currency, True), (to_currency, from_currency, False)):
+        try:
+            result = await db._execute(db.client.table('currency_rates').select('rate').eq(
+                'base_currency', base
+            ).eq('target_currency', target).single())
+        except Exception:
+            # .single() raises on zero rows
+            return None
+        if result.data:
+            return {'rate': result.data['rate'], 'direct': direct}
+    return None
+
+
+async def legacy(db, amounts, currencies):
+    converted = []
+    for amount, currency in zip(amounts, currencies):
+        rate_data = None if currency == 'MXN' else await legacy_rate(db, currency, 'MXN')
+        if rate_data is None:
+            converted.append(amount)
+        else:
+            rate = rate_data['rate']
+            converted.append(amount * rate if rate_data['direct'] else amount / rate)
+    return converted
+
+
+async def cached(converter, amounts, currencies):
+    return [(await converter.convert_amount(amount, currency, 'MXN'))['converted_amount']
+            for amount, currency in zip(amounts, currencies)]
+
+
+async def timed(server, coro):
+    server.reset_counters()
+    started = time.perf_counter()
+    result = await coro
+    return result, time.perf_counter() - started, server.requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--legacy-rows', type=int, default=200, help='rows for the per-conversion select path')
+    parser.add_argument('--latency', type=float, default=0.01, help='simulated seconds per PostgREST request')
+    args = parser.parse_args()
+
+    from currency import CurrencyConverter, RateRefreshJob, StaticRateProvider
+    from database import SupabaseClient
+
+    amounts = [round(random.uniform(20, 2500), 2) for _ in range(args.rows)]
+    currencies = [random.choice(['MXN', 'MXN', 'CAD', 'USD', 'EUR']) for _ in range(args.rows)]
+    n = args.legacy_rows
+
+    with FakePostgrest({'currency_rates': RATES}, latency=args.latency) as server:
+        os.environ['SUPABASE_URL'] = server.url
+        os.environ['SUPABASE_SERVICE_ROLE_KEY'] = 'bench.bench.bench'
+        db = SupabaseClient()
+        converter = CurrencyConverter(db)
+
+        async def run():
+            results = {}
+            results['per-row selects'] = await timed(server, legacy(db, amounts[:n], currencies[:n]))
+            results['convert_amount'] = await timed(server, cached(converter, amounts[:n], currencies[:n]))
+            results['convert_many'] = await timed(server, converter.convert_many(amounts, currencies, 'MXN'))
+            cross = await converter.convert_amount(100, 'CAD', 'EUR')
+
+            # 1 MXN = 0.08 CAD, newer than the stored CAD->MXN row
+            job = RateRefreshJob(converter, StaticRateProvider({'CAD': 0.08, 'USD': 0.055}), interval=0)
+            server.reset_counters()
+            written = [await job.run_once(), await job.run_once()]
+            refreshed = await converter.convert_amount(100, 'CAD')
+            refresh = (written, server.requests, refreshed['converted_amount'])
+            return results, cross, refresh
+
+        results, cross, refresh = asyncio.run(run())
+        db.close()
+
+    print(f"{'path':<18}{'rows':>10}{'requests':>10}{'ms':>10}{'µs/row':>10}")
+    for name, (converted, seconds, requests) in results.items():
+        print(f"{name:<18}{len(converted):>10}{requests:>10}{seconds * 1000:>10.1f}{seconds / len(converted) * 1e6:>10.2f}")
+
+    # The old path lost reverse-only pairs (EUR) to .single() raising on the direct miss
+    legacy_rows, cached_rows = results['per-row selects'][0], results['convert_amount'][0]
+    compared = [(a, b) for a, b, currency in zip(legacy_rows, cached_rows, currencies) if currency != 'EUR']
+    mismatches = sum(abs(a - b) > 0.01 for a, b in compared)
+    print(f"CAD->EUR via MXN: 100 CAD = {cross['converted_amount']} EUR (success={cross['success']})")
+    print(f"legacy/matrix mismatches on direct pairs: {mismatches}/{len(compared)}")
+    written, requests, refreshed = refresh
+    print(f"refresh: feeds written {written}, {requests} request(s), 100 CAD = {refreshed} MXN after refresh")
+    refresh_ok = written == [1, 0] and requests == 1 and refreshed == 1250.0
+    sys.exit(1 if mismatches or not cross['success'] or not refresh_ok else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Concurrency benchmark for SupabaseClient
+Replays N simultaneous chats (lookup user -> fetch categories -> insert expense)
+against a local PostgREST stand-in and reports p50/p99 latency with requests
+run inline on the event loop (before) and offloaded to the worker pool (after).
+
+Usage: python benchmarks/bench_db_concurrency.py [--chats 50] [--latency 0.02]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from fake_postgrest import FakePostgrest  # noqa: E402
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def replay_chat(db, telegram_id: int, arrived: float) -> float:
+    """Latency is measured from the moment all updates arrive, so queueing counts"""
+    user = await db.get_user_by_telegram_id(telegram_id)
+    categories = await db.get_categories()
+    await db.insert_expense(
+        user_id=user['id'],
+        category_id=categories[0]['id'],
+        merchant='Costco',
+        amount=120.0,
+    )
+    return time.perf_counter() - arrived
+
+
+async def run(max_workers: int, chats: int):
+    from database import SupabaseClient
+
+    db = SupabaseClient(max_workers=max_workers)
+    try:
+        started = time.perf_counter()
+        latencies = await asyncio.gather(*(replay_chat(db, 1000 + i % 4, started) for i in range(chats)))
+        wall = time.perf_counter() - started
+    finally:
+        db.close()
+    return latencies, wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--chats', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.02, help='simulated seconds per PostgREST request')
+    parser.add_argument('--workers', type=int, default=16)
+    args = parser.parse_args()
+
+    tables = {
+        'users': [{'id': f'u{i}', 'name': f'User {i}', 'telegram_id': str(1000 + i)} for i in range(4)],
+        'categories': [{'id': f'c{i}', 'name': name, 'description': None}
+                       for i, name in enumerate(['Groceries', 'Restaurants', 'Others'])],
+        'expenses': [],
+    }
+
+    with FakePostgrest(tables, latency=args.latency) as server:
+        os.environ['SUPABASE_URL'] = server.url
+        os.environ['SUPABASE_SERVICE_ROLE_KEY'] = 'bench.bench.bench'
+
+        print(f"{args.chats} concurrent chats, {args.latency * 1000:.0f} ms per request")
+        print(f"{'mode':<22}{'p50 (ms)':>10}{'p99 (ms)':>10}{'wall (s)':>10}")
+        for label, workers in (('inline (before)', 0), (f'offload x{args.workers} (after)', args.workers)):
+            latencies, wall = asyncio.run(run(workers, args.chats))
+            print(f"{label:<22}{percentile(latencies, 50) * 1000:>10.1f}"
+                  f"{percentile(latencies, 99) * 1000:>10.1f}{wall:>10.2f}")
+        print(f"mean requests per chat: {server.requests / (2 * args.chats):.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+Generated-SQL execution benchmark for SupabaseClient
+Runs Vanna-style SELECTs through execute_raw_sql('dynamic_sql') twice: with the
+Python interpretation the client used before (regex-scraped date range and
+category, every expense in range downloaded, aggregates emulated) and with the
+run_readonly_sql RPC. The stand-in executes the RPC's SQL in SQLite loaded with
+the same rows, the way Postgres would, and that result is the reference each
+mode is checked against. Reports latency, bytes transferred and correctness per
+query; fails if the RPC path returns a wrong result.
+
+Usage: python benchmarks/bench_dynamic_sql.py [--expenses 5000] [--latency 0.01]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from fake_postgrest import FakePostgrest  # noqa: E402
+
+CATEGORIES = ['Groceries', 'Restaurants', 'Transport', 'Home', 'Others']
+
+QUERIES = [
+    ("highest expense in July 2025",
+     "SELECT expenses.expense_detail, expenses.amount FROM expenses "
+     "WHERE expenses.expense_date >= '2025-07-01' AND expenses.expense_date < '2025-08-01' "
+     "ORDER BY expenses.amount DESC LIMIT 1"),
+    ("groceries total in July 2025",
+     "SELECT SUM(expenses.amount) AS total FROM expenses JOIN categories ON categories.id = expenses.category_id "
+     "WHERE categories.name = 'Groceries' AND expenses.expense_date >= '2025-07-01' "
+     "AND expenses.expense_date < '2025-08-01'"),
+    ("spending per category in 2025",
+     "SELECT categories.name AS category, SUM(expenses.amount) AS total FROM expenses "
+     "JOIN categories ON categories.id = expenses.category_id WHERE expenses.expense_date >= '2025-01-01' "
+     "GROUP BY categories.name ORDER BY total DESC"),
+    ("average restaurant expense",
+     "SELECT AVG(expenses.amount) AS average FROM expenses JOIN categories ON categories.id = expenses.category_id "
+     "WHERE categories.name = 'Restaurants'"),
+]
+
+
+def build_tables(expenses: int):
+    rng = random.Random(7)
+    categories = [{'id': f"c{i}", 'name': name} for i, name in enumerate(CATEGORIES)]
+    rows = []
+    for i in range(expenses):
+        category = rng.choice(categories)
+        rows.append({
+            'id': f"e{i}", 'category_id': category['id'], 'expense_detail': f"merchant {i}",
+            'amount': round(rng.uniform(20, 3000), 2), 'currency': 'MXN', 'paid_by': 'Ana',
+            'expense_date': str(date(2025, 1, 1) + timedelta(days=rng.randrange(365))),
+            'categories': {'name': category['name']}
+        })
+    return {'categories': categories, 'expenses': rows, 'users': [], 'budgets': []}
+
+
+class SqliteReference:
+    """The stand-in's 'Postgres': the same rows in SQLite"""
+    def __init__(self, tables):
+        self.connection = sqlite3.connect(':memory:', check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.lock = threading.Lock()
+        self.connection.execute('create table categories (id text, name text)')
+        self.connection.execute('create table expenses (id text, category_id text, expense_detail text, '
+                                'amount real, currency text, paid_by text, expense_date text)')
+        self.connection.executemany('insert into categories values (:id, :name)', tables['categories'])
+        self.connection.executemany('insert into expenses values (:id, :category_id, :expense_detail, :amount, '
+                                    ':currency, :paid_by, :expense_date)', tables['expenses'])
+
+    def query(self, sql: str, max_rows: int = 1000):
+        with self.lock:
+            cursor = self.connection.execute(f"select * from ({sql}\n) limit {int(max_rows)}")
+            return [dict(row) for row in cursor.fetchall()]
+
+    def rpc(self):
+        return {'run_readonly_sql': lambda args: self.query(args['p_sql'], args.get('p_max_rows', 1000))}
+
+
+def matches(rows, reference) -> bool:
+    """Same row count and every reference value present in the corresponding row"""
+    if len(rows) != len(reference):
+        return False
+    for row, expected in zip(rows, reference):
+        values = {round(v, 2) if isinstance(v, float) else v for v in row.values()}
+        for value in expected.values():
+            if (round(value, 2) if isinstance(value, float) else value) not in values:
+                return False
+    return True
+
+
+async def run_mode(server, use_rpc: bool, reference: SqliteReference):
+    from database import SupabaseClient
+
+    os.environ['SUPABASE_SQL_RPC'] = '1' if use_rpc else '0'
+    db = SupabaseClient()
+    results = []
+    for question, sql in QUERIES:
+        server.reset_counters()
+        started = time.perf_counter()
+        rows = await db.execute_raw_sql(sql, [], 'dynamic_sql', question)
+        elapsed = time.perf_counter() - started
+        results.append((question, elapsed * 1000, server.bytes_sent, matches(rows, reference.query(sql))))
+    db.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--expenses', type=int, default=5000)
+    parser.add_argument('--latency', type=float, default=0.01)
+    args = parser.parse_args()
+
+    tables = build_tables(args.expenses)
+    reference = SqliteReference(tables)
+    with FakePostgrest(tables, latency=args.latency, rpc=reference.rpc()) as server:
+        os.environ['SUPABASE_URL'] = server.url
+        os.environ['SUPABASE_SERVICE_ROLE_KEY'] = 'bench.bench.bench'
+        legacy = asyncio.run(run_mode(server, False, reference))
+        rpc = asyncio.run(run_mode(server, True, reference))
+
+    print(f"{'query':<32}{'python ms':>10}{'bytes':>10}{'ok':>4}{'rpc ms':>10}{'bytes':>8}{'ok':>4}")
+    for (question, legacy_ms, legacy_bytes, legacy_ok), (_, rpc_ms, rpc_bytes, rpc_ok) in zip(legacy, rpc):
+        print(f"{question:<32}{legacy_ms:>10.1f}{legacy_bytes:>10}{'y' if legacy_ok else 'n':>4}"
+              f"{rpc_ms:>10.1f}{rpc_bytes:>8}{'y' if rpc_ok else 'n':>4}")
+    print(f"\ncorrect: python {sum(r[3] for r in legacy)}/{len(QUERIES)}, rpc {sum(r[3] for r in rpc)}/{len(QUERIES)}")
+    sys.exit(0 if all(r[3] for r in rpc) else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+Insert latency benchmark for SupabaseClient
+Compares the request chain the insert_expense tool used to make (user lookup,
+category list, paid_by select, up to two currency_rates selects, insert) with
+insert_expense_for_telegram_user, which converts with the cached rate matrix
+and does everything else in one RPC. The stand-in resolves the RPC in-process,
+the way the Postgres function would. Fails if the chain and the RPC store
+different MXN amounts.
+
+Usage: python benchmarks/bench_insert_rpc.py [--inserts 50] [--latency 0.02]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from fake_postgrest import FakePostgrest  # noqa: E402
+
+
+def build_tables():
+    return {
+        'users': [{'id': 'u1', 'name': 'Ana', 'telegram_id': '1001'}],
+        'categories': [{'id': f'c{i}', 'name': name} for i, name in enumerate(['Groceries', 'Restaurants', 'Others'])],
+        # USD -> MXN is only reachable through CAD (a cross rate)
+        'currency_rates': [{'base_currency': 'CAD', 'target_currency': 'MXN', 'rate': 13.3},
+                           {'base_currency': 'USD', 'target_currency': 'CAD', 'rate': 1.37}],
+        'expenses': [],
+    }
+
+
+def build_rpc(tables):
+    def insert_expense_for_telegram(args):
+        # p_telegram_id is a bigint in Postgres
+        user = next(u for u in tables['users'] if int(u['telegram_id']) == args['p_telegram_id'])
+        category = next(c for c in tables['categories']
+                        if c['id'] == args['p_category'] or c['name'].lower() == args['p_category'].lower())
+        amount, currency = args['p_amount'], 'MXN'
+        if args['p_currency'].upper() != 'MXN':
+            if args.get('p_amount_mxn') is not None:
+                amount = args['p_amount_mxn']
+            else:
+                currency = args['p_currency']
+        row = {
+            'id': str(uuid.uuid4()), 'user_id': user['id'], 'category_id': category['id'],
+            'expense_detail': args['p_expense_detail'], 'amount': amount, 'original_amount': args['p_amount'],
+            'original_currency': args['p_currency'], 'currency': currency, 'expense_date': args['p_expense_date'],
+            'paid_by': user['name'], 'timestamp': datetime.now().isoformat(), 'notes': args.get('p_notes'),
+        }
+        tables['expenses'].append(row)
+        return [row]
+
+    return {'insert_expense_for_telegram': insert_expense_for_telegram}
+
+
+async def legacy_insert(db, currency: str):
+    """The InsertExpenseTool chain before the RPC"""
+    user = await db.get_user_by_telegram_id(1001)
+    db.invalidate_categories()  # the chain predates the category catalog...
+    db.invalidate_rates()  # ...and the rate matrix
+    categories = await db.get_categories()
+    await db.insert_expense(user_id=user['id'], category_id=categories[0]['id'], merchant='Costco',
+                            amount=120.0, currency=currency)
+
+
+async def rpc_insert(db, currency: str):
+    await db.insert_expense_for_telegram_user(telegram_id=1001, category='c0', merchant='Costco',
+                                              amount=120.0, currency=currency)
+
+
+async def measure(db, server, insert, currency: str, inserts: int):
+    server.reset_counters()
+    latencies = []
+    for _ in range(inserts):
+        started = time.perf_counter()
+        await insert(db, currency)
+        latencies.append(time.perf_counter() - started)
+    return statistics.median(latencies), server.requests / inserts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--inserts', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.02, help='simulated seconds per PostgREST request')
+    args = parser.parse_args()
+
+    from database import SupabaseClient
+
+    tables = build_tables()
+    with FakePostgrest(tables, latency=args.latency, rpc=build_rpc(tables)) as server:
+        os.environ['SUPABASE_URL'] = server.url
+        os.environ['SUPABASE_SERVICE_ROLE_KEY'] = 'bench.bench.bench'
+        db = SupabaseClient()
+        print(f"{'currency':<10}{'path':<10}{'requests':>10}{'p50 ms':>10}{'stored MXN':>12}")
+        mismatches = 0
+        for currency in ('MXN', 'CAD', 'USD'):
+            stored = {}
+            for name, insert in (('chain', legacy_insert), ('rpc', rpc_insert)):
+                p50, requests = asyncio.run(measure(db, server, insert, currency, args.inserts))
+                last = tables['expenses'][-1]
+                stored[name] = (round(float(last['amount']), 2), last['currency'])
+                print(f"{currency:<10}{name:<10}{requests:>10.1f}{p50 * 1000:>10.1f}{stored[name][0]:>12.2f}")
+            mismatches += stored['chain'] != stored['rpc']
+        db.close()
+
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
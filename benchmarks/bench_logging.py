@@ -0,0 +1,117 @@
+"""
+Logging benchmark for SqlQueryTool
+Runs SqlQueryTool against a stub database returning result sets of growing size
+(reply formatting stubbed out) and measures the log bytes and per-request time logging adds: once with the
+former DEBUG prints (full SQL and result on every query) and once with
+structured_logging at DEBUG (one constant-size INFO line plus a sampled,
+bounded preview). Fails if the structured log volume per request grows with
+the result size by more than --max-growth.
+
+Usage: python benchmarks/bench_logging.py [--rows 10,1000,10000] [--requests 1000]
+"""
+import argparse
+import asyncio
+import gc
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from structured_logging import configure_logging, shutdown_logging  # noqa: E402
+
+
+class CountingStream:
+    """Write target that only counts what it receives"""
+    def __init__(self):
+        self.bytes = 0
+
+    def write(self, text):
+        self.bytes += len(text)
+
+    def flush(self):
+        pass
+
+
+class StubDatabase:
+    def __init__(self, rows: int):
+        self.rows = [
+            {'expense_detail': f"merchant {i}", 'amount': 100.0 + i, 'category': 'Groceries',
+             'expense_date': '2025-07-01', 'user_name': 'bench'}
+            for i in range(rows)
+        ]
+
+    async def execute_raw_sql(self, sql, params, template_name, question):
+        return self.rows
+
+
+def legacy_prints(stream, query_type, sql, result):
+    """The DEBUG output SqlQueryTool used to print for every query"""
+    print(f"DEBUG: Executing SQL for {query_type}:", file=stream)
+    print(f"SQL: {sql}", file=stream)
+    print(f"DEBUG: Query result: {result}", file=stream)
+    print(f"DEBUG: Result type: {type(result)}, Length: {len(result) if result else 'None'}", file=stream)
+
+
+async def run(tool, requests: int, after=None) -> float:
+    gc.collect()
+    started = time.perf_counter()
+    for _ in range(requests):
+        tool.answer_cache.clear()
+        await tool._arun(question=None, query_type='recent_expenses')
+        if after:
+            after()
+    return (time.perf_counter() - started) / requests
+
+
+async def measure(rows: int, requests: int):
+    from agent import SqlQueryTool
+
+    tool = SqlQueryTool(StubDatabase(rows))
+    # Reply formatting is linear in the rows too; keep it out so only logging differs
+    object.__setattr__(tool, '_format_result', lambda *args: 'ok')
+    sql = tool.templates['recent_expenses']
+    results = {}
+
+    # Baseline: nothing logged, so the difference is what logging costs
+    configure_logging(level='WARNING', stream=CountingStream())
+    baseline = await run(tool, requests)
+
+    stream = CountingStream()
+    legacy = await run(tool, requests, lambda: legacy_prints(stream, 'recent_expenses', sql, tool.db_client.rows))
+    results['prints'] = (stream.bytes / requests, (legacy - baseline) * 1e6)
+
+    stream = CountingStream()
+    configure_logging(level='DEBUG', stream=stream)
+    structured = await run(tool, requests)
+    shutdown_logging()
+    results['structured'] = (stream.bytes / requests, (structured - baseline) * 1e6)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', default='10,1000,10000', help='comma-separated result sizes')
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--max-growth', type=float, default=1.5,
+                        help='fail if structured bytes/request at the largest size exceed this multiple of the smallest')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.rows.split(',')]
+    print(f"{'rows':>7}  {'mode':<11}{'bytes/req':>12}{'µs/req':>10}")
+    structured_bytes = []
+    for rows in sizes:
+        for mode, (size, overhead_us) in asyncio.run(measure(rows, args.requests)).items():
+            print(f"{rows:>7}  {mode:<11}{size:>12.0f}{overhead_us:>10.0f}")
+            if mode == 'structured':
+                structured_bytes.append(size)
+    logging.getLogger().handlers.clear()
+
+    growth = structured_bytes[-1] / structured_bytes[0] if structured_bytes[0] else 0.0
+    print(f"\nstructured log volume growth {sizes[0]} -> {sizes[-1]} rows: {growth:.2f}x")
+    sys.exit(0 if growth <= args.max_growth else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Conversation memory benchmark for FinAIAgent
+Feeds turns from many distinct chats (long analytics-style replies included)
+into the old unbounded per-chat dict and into memory.ConversationMemory, and
+reports traced Python heap, chats held and per-turn cost for both.
+
+Usage: python benchmarks/bench_memory.py [--chats 50000] [--turns 3]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from memory import ConversationMemory  # noqa: E402
+
+REPLIES = [
+    "✅ Expense saved!\n\n💳 Costco — $120.00 MXN\n🏷 Category: Groceries",
+    "📊 Spending by category this month:\n" + "\n".join(f"• Category {i}: ${i * 137.5:,.2f}" for i in range(18)),
+    "Which category should I use for that expense?",
+]
+
+
+def turns(chats: int, per_chat: int):
+    for i in range(chats * per_chat):
+        yield i % chats, f"message {i} costco {random.randint(10, 999)}", random.choice(REPLIES)
+
+
+def legacy(chats: int, per_chat: int, max_history: int = 5):
+    history = {}
+    for chat, message, reply in turns(chats, per_chat):
+        pairs = history.setdefault(chat, [])
+        pairs.append((message, reply))
+        if len(pairs) > max_history:
+            pairs.pop(0)
+    return history, len(history)
+
+
+def bounded(chats: int, per_chat: int):
+    memory = ConversationMemory(persist=False)
+
+    async def run():
+        for chat, message, reply in turns(chats, per_chat):
+            await memory.get(chat)
+            await memory.append(chat, message, reply)
+
+    asyncio.run(run())
+    return memory, len(memory)
+
+
+def measure(build, chats: int, per_chat: int):
+    tracemalloc.start()
+    started = time.perf_counter()
+    store, held = build(chats, per_chat)
+    seconds = time.perf_counter() - started
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del store
+    return current, held, seconds / (chats * per_chat)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--chats', type=int, default=50_000)
+    parser.add_argument('--turns', type=int, default=3, help='turns per chat')
+    parser.add_argument('--max-chats', type=int, default=2000)
+    args = parser.parse_args()
+
+    os.environ['CONVERSATION_MAX_CHATS'] = str(args.max_chats)
+    print(f"{'store':<22}{'chats held':>12}{'heap MB':>10}{'µs/turn':>10}")
+    for name, build in (('unbounded dict', legacy), ('ConversationMemory', bounded)):
+        heap, held, per_turn = measure(build, args.chats, args.turns)
+        print(f"{name:<22}{held:>12}{heap / 1e6:>10.1f}{per_turn * 1e6:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
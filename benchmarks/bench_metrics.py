@@ -0,0 +1,112 @@
+"""
+Instrumentation benchmark for FinAIssistant
+Measures the per-call overhead of instrumentation.timed on a no-op coroutine,
+then runs classifications and inserts through the instrumented ExpenseClassifier
+and SupabaseClient against the PostgREST stand-in. It prints the per-site
+summary that /stats shows and checks that the /metrics output is valid Prometheus
+text (every histogram's +Inf bucket matches its count). Fails on a format error
+or when the overhead exceeds --max-overhead-us.
+
+Usage: python benchmarks/bench_metrics.py [--calls 100000] [--inserts 50]
+"""
+import argparse
+import asyncio
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bench_insert_rpc import build_rpc, build_tables  # noqa: E402
+from fake_postgrest import FakePostgrest  # noqa: E402
+from instrumentation import Metrics, metrics  # noqa: E402
+
+SAMPLE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{[a-z_]+="[^"]*"(,[a-z_]+="[^"]*")*\})? -?[0-9.e+]+$')
+
+
+async def overhead(calls: int) -> float:
+    """Extra microseconds per call added by a timed() wrapper"""
+    registry = Metrics()
+
+    async def noop():
+        return None
+
+    wrapped = registry.timed('bench.noop')(noop)
+    results = []
+    for func in (noop, wrapped):
+        started = time.perf_counter()
+        for _ in range(calls):
+            await func()
+        results.append(time.perf_counter() - started)
+    return (results[1] - results[0]) / calls * 1e6
+
+
+async def workload(inserts: int, latency: float):
+    from classifier import ExpenseClassifier
+    from database import SupabaseClient
+
+    tables = build_tables()
+    with FakePostgrest(tables, latency=latency, rpc=build_rpc(tables)) as server:
+        os.environ['SUPABASE_URL'] = server.url
+        os.environ['SUPABASE_SERVICE_ROLE_KEY'] = 'bench.bench.bench'
+        db = SupabaseClient()
+        classifier = ExpenseClassifier(db)
+        for i in range(inserts):
+            categories = await db.get_categories()
+            classification = await classifier.classify_expense('costco', categories)
+            await db.insert_expense_for_telegram_user(
+                telegram_id=1001, category=classification.get('category_id') or 'Others',
+                merchant=f"costco {i}", amount=100.0 + i, currency='CAD' if i % 2 else 'MXN'
+            )
+        db.close()
+
+
+def validate(text: str) -> list:
+    """Problems found in a Prometheus exposition (empty when valid)"""
+    problems, counts, infinity = [], {}, {}
+    for line in text.splitlines():
+        if not line or line.startswith('#'):
+            continue
+        if not SAMPLE.match(line):
+            problems.append(f"bad sample line: {line}")
+            continue
+        name, value = line.rsplit(' ', 1)
+        if '_count{' in name:
+            counts[name.split('{', 1)[1]] = float(value)
+        elif '_bucket{' in name and 'le="+Inf"' in name:
+            infinity[name.split('{', 1)[1].replace(',le="+Inf"', '')] = float(value)
+    for labels, count in counts.items():
+        if infinity.get(labels) != count:
+            problems.append(f"+Inf bucket != count for {labels}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--calls', type=int, default=100000)
+    parser.add_argument('--inserts', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.005)
+    parser.add_argument('--max-overhead-us', type=float, default=20.0)
+    args = parser.parse_args()
+
+    extra_us = asyncio.run(overhead(args.calls))
+    print(f"timed() overhead: {extra_us:.2f} µs/call over {args.calls} calls")
+
+    metrics.reset()
+    asyncio.run(workload(args.inserts, args.latency))
+    print()
+    print(metrics.summary())
+
+    started = time.perf_counter()
+    exposition = metrics.render_prometheus()
+    render_ms = (time.perf_counter() - started) * 1000
+    problems = validate(exposition)
+    print(f"\n/metrics: {len(exposition.splitlines())} lines, {len(exposition)} bytes, rendered in {render_ms:.2f} ms")
+    for problem in problems:
+        print(problem)
+    sys.exit(1 if problems or extra_us > args.max_overhead_us else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Local expense parser benchmark for ExpenseParser
+Replays a corpus of real-world expense messages (the _parse_with_ai prompt
+examples plus common variants) through the local grammar, checks every parse
+the grammar accepts against the expected fields, checks that ambiguous input is
+left to the LLM, and reports the LLM-avoidance rate and local parse latency.
+Exits non-zero on any mismatch.
+
+Usage: python benchmarks/bench_parser.py [--rounds 200]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from parser import ExpenseParser  # noqa: E402
+
+
+def expense(merchant, amount, currency='MXN', detail=None, category=None):
+    parsed = {'merchant': merchant, 'detail': detail, 'amount': amount, 'currency': currency}
+    if category:
+        parsed['category'] = category
+    return parsed
+
+
+def simple(merchant, amount):
+    return {'merchant': merchant, 'amount': amount, 'currency': 'MXN'}
+
+
+# (text, expected local parse) - None means the text must go to the LLM
+CORPUS = [
+    # Prompt examples with an explicit category
+    ('Spent 155 under restaurants, description is Marissa', expense('restaurants', 155.0, detail='Marissa', category='restaurants')),
+    ('And Marissa 155 under restaurants', expense('restaurants', 155.0, detail='Marissa', category='restaurants')),
+    ('i spent on other 150 concept pelotas pádel', expense('others', 150.0, detail='pelotas pádel', category='others')),
+    ('i spent on category others 150 concept pelotas pádel', expense('others', 150.0, detail='pelotas pádel', category='others')),
+    ('i spent on category others 150 descriptible pelotas pádel', expense('others', 150.0, detail='pelotas pádel', category='others')),
+    ('add 971 in gas categories', expense('gas', 971.0, category='gas')),
+    ('Pan de muerto marisa 60 restaurants', expense('restaurants', 60.0, detail='Pan de muerto marisa', category='restaurants')),
+    ('Costco 120 groceries', expense('groceries', 120.0, detail='Costco', category='groceries')),
+    ('211 jabón carita under belleza', expense('belleza', 211.0, detail='jabón carita', category='belleza')),
+    # Prompt examples without a category
+    ('Costco 120', simple('Costco', 120.0)),
+    ('Marissa 155', simple('Marissa', 155.0)),
+    ('compré café por 45 pesos', expense('café', 45.0)),
+    # Keyword, quote, currency and decimal variants
+    ('Uber 45,50', expense('Uber', 45.5)),
+    ('uber eats 1,250', expense('uber eats', 1250.0)),
+    ('Starbucks 89.90', simple('Starbucks', 89.9)),
+    ('$20 tim hortons', expense('tim hortons', 20.0, currency='CAD')),
+    ('Zara 35 €', expense('Zara', 35.0, currency='EUR')),
+    ('Netflix 15 usd', expense('Netflix', 15.0, currency='USD')),
+    ('walmart 300 mxn en despensa', expense('despensa', 300.0, detail='walmart', category='despensa')),
+    ('350 en restaurantes concepto cena con amigos', expense('restaurantes', 350.0, detail='cena con amigos', category='restaurantes')),
+    ('gasté 80 en oxxo', expense('oxxo', 80.0, category='oxxo')),
+    ('120 under home appliances "vacuum filter"', expense('home appliances', 120.0, detail='vacuum filter', category='home appliances')),
+    ('"clase latina" 200 category gym', expense('gym', 200.0, detail='clase latina', category='gym')),
+    ('paid 60 for parking', expense('parking', 60.0)),
+    ('T&T 85', expense('T&T', 85.0)),
+    ('Spotify 129 subscriptions', expense('subscriptions', 129.0, detail='Spotify', category='subscriptions')),
+    ('pemex 900 gasolina', expense('gasolina', 900.0, detail='pemex', category='gasolina')),
+    ('detalle regalo cumple 450 en otros', expense('otros', 450.0, detail='regalo cumple', category='otros')),
+    ('costco 120 for groceries', expense('costco', 120.0, detail='groceries')),
+    ('oxxo 45 para botanas', expense('oxxo', 45.0, detail='botanas')),
+    ('costco for groceries 120', expense('costco', 120.0, detail='groceries')),
+    # Ambiguous: left to the LLM
+    ('I paid 50 bucks for lunch today', None),
+    ('155 for lunch yesterday', None),
+    ("what's my total spending?", None),
+    ('how much did we spend this month', None),
+    ('yes please', None),
+    ('Others', None),
+    ('2 tacos 30', None),
+    ('dinner 300 under fancy stuff', None),
+    ('20 dollars amazon', None),
+    ('split 400 dinner with marissa', None),
+    ('uber 80 under transportation for airport', None),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rounds', type=int, default=200)
+    args = parser.parse_args()
+
+    expense_parser = ExpenseParser()
+    failures = []
+    local = 0
+    for text, expected in CORPUS:
+        got = expense_parser._parse_local(text)
+        local += got is not None
+        if got != expected:
+            failures.append((text, expected, got))
+
+    for text, expected, got in failures:
+        print(f"MISMATCH {text!r}\n  expected {expected}\n  got      {got}")
+
+    started = time.perf_counter()
+    for _ in range(args.rounds):
+        for text, _ in CORPUS:
+            expense_parser._parse_local(text)
+    per_parse = (time.perf_counter() - started) / (args.rounds * len(CORPUS))
+
+    print(f"{len(CORPUS)} messages, {len(CORPUS) - len(failures)} as expected")
+    print(f"LLM avoided:      {local}/{len(CORPUS)} ({local / len(CORPUS):.0%})")
+    print(f"local parse:      {per_parse * 1e6:>8.1f} µs/message (vs ~500-2000 ms per OpenAI parse)")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Generated-SQL cache benchmark for SqlQueryTool
+Asks dynamic questions, each in several wordings (case, accents, punctuation,
+English/Spanish relative dates), through SqlQueryTool._generate_sql with a Vanna
+stand-in that sleeps for the similarity search + completion. Reports generator
+calls and latency without and with the SQLite cache. It then reopens the cache
+file as a restarted bot would and asks every question again. Fails if a
+repeated question reaches the generator after the restart.
+
+Usage: python benchmarks/bench_sql_cache.py [--rounds 5] [--generator-latency 0.3]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+# Wordings of the same dynamic question
+QUESTIONS = [
+    ["What was my highest expense last month?", "what was my HIGHEST expense last month", "What was my highest expense, LAST MONTH?!"],
+    ["¿Cuánto gasté en Uber el mes pasado?", "cuanto gaste en uber el mes pasado", "Cuánto gasté en uber  el mes pasado"],
+    ["Average restaurant expense this year", "average restaurant expense this year?", "AVERAGE restaurant expense THIS YEAR"],
+    ["Top 5 expenses this month", "top 5 expenses this month!", "Top 5 expenses  current month"],
+    ["Spending per person in July 2025", "spending per person in july 2025", "Spending per person in July, 2025"],
+]
+
+
+class StubVanna:
+    """Vanna stand-in: similarity search + completion as one sleep"""
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+
+    def is_trained(self) -> bool:
+        return True
+
+    def generate_sql(self, question: str) -> str:
+        self.calls += 1
+        time.sleep(self.latency)
+        return f"SELECT SUM(amount) AS total FROM expenses -- {question}"
+
+
+async def ask_all(tool, rounds: int):
+    latencies = []
+    for _ in range(rounds):
+        for wordings in QUESTIONS:
+            for question in wordings:
+                started = time.perf_counter()
+                await tool._generate_sql(question)
+                latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def run(path: str, enabled: bool, rounds: int, latency: float):
+    from agent import SqlQueryTool
+    from sql_cache import SqlCache
+
+    tool = SqlQueryTool(db_client=None)
+    stub = StubVanna(latency)
+    object.__setattr__(tool, 'vanna_trainer', stub)
+    object.__setattr__(tool, 'sql_cache', SqlCache(path=path, enabled=enabled))
+    latencies = asyncio.run(ask_all(tool, rounds))
+    stats = tool.sql_cache.stats()
+    tool.sql_cache.close()
+    return stub.calls, latencies, stats
+
+
+def report(label: str, calls: int, latencies, stats=None):
+    ordered = sorted(latencies)
+    print(f"{label:<24}{len(latencies):>6}{calls:>7}{statistics.median(ordered) * 1000:>9.1f}"
+          f"{ordered[int(len(ordered) * 0.95) - 1] * 1000:>9.1f}{sum(latencies):>9.2f}"
+          f"{'  ' + str(stats) if stats else ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--generator-latency', type=float, default=0.3)
+    args = parser.parse_args()
+
+    # The stand-in replaces Vanna; its background training has no credentials here
+    logging.getLogger('vanna_trainer').disabled = True
+    with tempfile.TemporaryDirectory() as store:
+        path = os.path.join(store, 'sql_cache.sqlite3')
+        print(f"{'run':<24}{'asks':>6}{'calls':>7}{'p50 ms':>9}{'p95 ms':>9}{'total s':>9}")
+        report('no cache', *run(path, False, args.rounds, args.generator_latency)[:2])
+        calls, latencies, stats = run(path, True, args.rounds, args.generator_latency)
+        report('cache', calls, latencies, stats)
+        restart_calls, latencies, stats = run(path, True, 1, args.generator_latency)
+        report('cache after restart', restart_calls, latencies, stats)
+
+    print(f"\ngenerator calls: {calls} for {len(QUESTIONS)} distinct questions, {restart_calls} after restart")
+    sys.exit(0 if calls == len(QUESTIONS) and restart_calls == 0 else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+SQL guardrail benchmark for SqlQueryTool
+Runs a corpus of legitimate analytics queries and of write / exfiltration /
+resource attacks through the regex guardrails SqlQueryTool used before and
+through sql_validator.SqlValidator. It reports false rejections, missed attacks
+and the per-check cost, with the validator timed both parsing (cold) and
+answering from its verdict cache (repeated SQL). Fails if the validator accepts
+an attack or rejects a legitimate query.
+
+Usage: python benchmarks/bench_sql_validator.py [--rounds 200]
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sql_validator import SqlValidator  # noqa: E402
+
+# The patterns SqlQueryTool._arun applied to generated SQL, one re.search each
+LEGACY_PATTERNS = [r';\s*\w', r'--\s', r'/\*.*\*/', r'\bdrop\b', r'\bdelete\b', r'\bupdate\b',
+                   r'\binsert\b', r'\balter\b', r'\bcreate\b']
+
+LEGITIMATE = [
+    "SELECT SUM(amount) AS total FROM expenses WHERE expense_date >= '2025-07-01' AND expense_date < '2025-08-01'",
+    "SELECT c.name AS category, SUM(e.amount) AS total FROM expenses e JOIN categories c ON c.id = e.category_id "
+    "WHERE e.expense_date >= DATE '2025-01-01' GROUP BY c.name ORDER BY total DESC",
+    "SELECT expense_detail, amount, expense_date FROM expenses ORDER BY amount DESC LIMIT 5",
+    "SELECT AVG(e.amount) AS average FROM expenses e JOIN categories c ON c.id = e.category_id WHERE c.name = 'Restaurants'",
+    "SELECT base_currency, rate, updated_at FROM currency_rates ORDER BY updated_at DESC",
+    "SELECT c.name, b.amount, b.created_at FROM budgets b JOIN categories c ON c.id = b.category_id "
+    "WHERE b.month = EXTRACT(MONTH FROM CURRENT_DATE) AND b.year = EXTRACT(YEAR FROM CURRENT_DATE)",
+    "SELECT u.name, SUM(e.amount) AS total FROM expenses e JOIN users u ON u.id = e.user_id GROUP BY u.name",
+    "WITH monthly AS (SELECT DATE_TRUNC('month', expense_date) AS month, SUM(amount) AS total FROM expenses "
+    "GROUP BY 1) SELECT month, total FROM monthly ORDER BY month",
+    "SELECT expense_detail, notes FROM expenses WHERE notes ILIKE '%created for the trip%'",
+    "SELECT COUNT(*) AS count FROM expenses WHERE expense_detail ILIKE '%update%'",
+]
+
+ATTACKS = [
+    "DELETE FROM expenses",
+    "SELECT 1; DROP TABLE expenses",
+    "WITH gone AS (DELETE FROM expenses RETURNING *) SELECT count(*) FROM gone",
+    "SELECT email FROM users",
+    "SELECT email AS email FROM users",
+    "WITH t(email) AS (SELECT email FROM users) SELECT email FROM t",
+    "SELECT * FROM users",
+    "SELECT rolname, rolpassword FROM pg_authid",
+    "SELECT * FROM pg_catalog.pg_roles",
+    "SELECT pg_sleep(30)",
+    "SELECT pg_read_file('/etc/passwd')",
+    "SELECT set_config('statement_timeout', '0', false)",
+    "SELECT * INTO expenses_copy FROM expenses",
+    "SELECT * FROM expenses FOR UPDATE",
+    "SELECT * FROM expenses a, expenses b, expenses c",
+    "TRUNCATE expenses",
+    "COPY expenses TO '/tmp/out.csv'",
+]
+
+
+def legacy_allows(sql: str) -> bool:
+    if any(re.search(pattern, sql, re.IGNORECASE) for pattern in LEGACY_PATTERNS):
+        return False
+    return bool(re.match(r'^\s*select', sql, re.IGNORECASE))
+
+
+def per_check_us(check, corpus, rounds: int) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for sql in corpus:
+            check(sql)
+    return (time.perf_counter() - started) / (rounds * len(corpus)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rounds', type=int, default=200)
+    args = parser.parse_args()
+
+    corpus = LEGITIMATE + ATTACKS
+    validator = SqlValidator()
+    print(f"{'verdict':<10}{'regex':>7}{'ast':>7}  query")
+    failures = 0
+    for sql in corpus:
+        attack = sql in ATTACKS
+        legacy, verdict = legacy_allows(sql), validator.validate(sql)
+        wrong = verdict['allowed'] == attack
+        failures += wrong
+        label = 'attack' if attack else 'legit'
+        print(f"{label:<10}{'pass' if legacy else 'block':>7}{'pass' if verdict['allowed'] else 'block':>7}"
+              f"{' !' if wrong else '  '}{sql[:60]}{'' if verdict['allowed'] else '  [' + verdict['reason'] + ']'}")
+
+    legacy_false = sum(not legacy_allows(sql) for sql in LEGITIMATE)
+    legacy_missed = sum(legacy_allows(sql) for sql in ATTACKS)
+    print(f"\nregex: {legacy_false}/{len(LEGITIMATE)} legitimate rejected, {legacy_missed}/{len(ATTACKS)} attacks passed")
+    print(f"ast:   {failures} wrong verdicts")
+
+    cold_us = per_check_us(lambda sql: SqlValidator(cache_size=0).validate(sql), corpus, max(1, args.rounds // 20))
+    cached_us = per_check_us(validator.validate, corpus, args.rounds)
+    regex_us = per_check_us(legacy_allows, corpus, args.rounds)
+    print(f"\nper check: regex {regex_us:.1f} µs, ast parse {cold_us:.1f} µs, ast cached {cached_us:.1f} µs")
+    print(f"verdict cache: {validator.stats()}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+Startup benchmark for hybrid_bot
+Profiles imports with `python -X importtime` for the path that runs before the
+bot accepts updates (`import hybrid_bot`) and for the background agent stage
+(`import agent`), listing the heaviest packages of each. It then boots the staged
+startup in a fresh interpreter against the PostgREST stand-in and reports when
+the core stage is reached, when an early expense is saved by the direct
+pipeline and when the agent stage settles. Fails if langchain, langgraph,
+vanna, chromadb or openai are imported before the bot accepts updates.
+
+Usage: python benchmarks/bench_startup.py [--top 12] [--max-core-ms 2500]
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+# Packages that must load in the background agent stage, never before updates are accepted
+HEAVY_PACKAGES = ('langchain', 'langchain_core', 'langchain_openai', 'langgraph', 'vanna', 'chromadb', 'openai')
+
+
+def importtime(statement: str):
+    """
+    Run `statement` under -X importtime; returns {top-level module: (cumulative_us,
+    [(child, cumulative_us), ...])}, children being the modules it imported first
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement], cwd=ROOT,
+                            capture_output=True, text=True, env={**os.environ, 'PYTHONDONTWRITEBYTECODE': '1'})
+    groups, children = {}, []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        # Children are printed before their parent; a depth-0 line closes the group
+        if depth == 0:
+            groups[name.strip()] = (int(cumulative_us), children)
+            children = []
+        elif depth == 1:
+            children.append((name.strip(), int(cumulative_us)))
+    return groups
+
+
+def print_profile(title: str, profile, top: int):
+    cumulative_us, children = profile
+    print(f"\n{title}: {cumulative_us / 1000:.0f} ms")
+    for name, cumulative in sorted(children, key=lambda item: -item[1])[:top]:
+        print(f"  {name:<36}{cumulative / 1000:>9.1f} ms")
+
+
+def child():
+    """Staged startup in this (fresh) interpreter; prints stage timings as JSON"""
+    from fake_postgrest import FakePostgrest
+    from bench_insert_rpc import build_rpc, build_tables
+
+    tables = build_tables()
+    with FakePostgrest(tables, latency=0.005, rpc=build_rpc(tables)) as server, tempfile.TemporaryDirectory() as store:
+        os.environ.update({
+            'SUPABASE_URL': server.url, 'SUPABASE_SERVICE_ROLE_KEY': 'bench.bench.bench',
+            'TELEGRAM_BOT_TOKEN': '1:bench', 'OPENAI_API_KEY': 'sk-bench',
+            'CONVERSATION_PERSIST': '0', 'VANNA_CHROMA_PATH': store, 'STARTUP_AGENT_WAIT': '120'
+        })
+        started = time.perf_counter()
+        import hybrid_bot
+        imported = time.perf_counter() - started
+
+        async def run():
+            await hybrid_bot.initialize_components()
+            core = time.perf_counter() - started
+            # The agent task hasn't run yet: this is everything loaded before updates are accepted
+            heavy_at_core = sorted(name for name in HEAVY_PACKAGES if name in sys.modules)
+            response = await hybrid_bot.direct_pipeline.process('costco 120.54', 1001, [])
+            first_expense = time.perf_counter() - started
+            await hybrid_bot.readiness.wait_ready()
+            settled = time.perf_counter() - started
+            await hybrid_bot.shutdown_components()
+            return {
+                'import_ms': imported * 1000, 'core_ms': core * 1000, 'first_expense_ms': first_expense * 1000,
+                'expense_saved': bool(response), 'agent_ms': settled * 1000,
+                'stage': hybrid_bot.readiness.stage, 'error': hybrid_bot.readiness.stats()['error'],
+                'heavy_at_core': heavy_at_core
+            }
+
+        print(json.dumps(asyncio.run(run())))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--top', type=int, default=12, help='packages listed per profile')
+    parser.add_argument('--max-core-ms', type=float, default=2500.0, help='fail if the core stage takes longer')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child()
+
+    # In one interpreter, `agent` only lists what hybrid_bot hadn't imported already
+    profile = importtime('import hybrid_bot, agent')
+    print_profile('before accepting updates (import hybrid_bot)', profile['hybrid_bot'], args.top)
+    print_profile('background agent stage (import agent)', profile['agent'], args.top)
+
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), '--child'], cwd=ROOT,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        print(result.stderr[-2000:])
+        sys.exit(1)
+    staged = json.loads(result.stdout.strip().splitlines()[-1])
+    print(f"\n{'stage':<34}{'ms':>9}")
+    print(f"{'import hybrid_bot':<34}{staged['import_ms']:>9.0f}")
+    print(f"{'core (accepting updates)':<34}{staged['core_ms']:>9.0f}")
+    print(f"{'first expense via direct path':<34}{staged['first_expense_ms']:>9.0f}  saved={staged['expense_saved']}")
+    print(f"{'agent stage ' + staged['stage']:<34}{staged['agent_ms']:>9.0f}")
+    if staged['error']:
+        print(f"agent error: {staged['error'][:200]}")
+    print(f"heavy packages before accepting updates: {', '.join(staged['heavy_at_core']) or 'none'}")
+
+    failed = bool(staged['heavy_at_core']) or staged['core_ms'] > args.max_core_ms or not staged['expense_saved']
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
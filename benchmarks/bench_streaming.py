@@ -0,0 +1,136 @@
+"""
+Streaming reply benchmark for hybrid_bot
+Runs FinAIAgent.process_message against a scripted agent (a model step, a
+sql_query tool call, then a streamed answer) and a stand-in Telegram bot, and
+compares time to first visible output, total time and message edits for the
+blocking reply and StreamingReply. Fails if edits break the edit interval.
+
+Usage: python benchmarks/bench_streaming.py [--tool-seconds 1.5] [--tokens 120]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from langchain_core.messages import AIMessage, AIMessageChunk  # noqa: E402
+
+from agent import FinAIAgent  # noqa: E402
+from context_builder import ContextBuilder  # noqa: E402
+from memory import ConversationMemory  # noqa: E402
+from streaming import StreamingReply  # noqa: E402
+
+API_LATENCY = 0.05
+
+
+class ScriptedAgent:
+    """astream_events/ainvoke stand-in with the timing of a one-tool ReAct run"""
+    def __init__(self, tool_seconds: float, tokens: int, token_seconds: float):
+        self.tool_seconds = tool_seconds
+        self.words = [f"word{i} " for i in range(tokens)]
+        self.token_seconds = token_seconds
+
+    async def astream_events(self, inputs, version='v2'):
+        yield {'event': 'on_chat_model_start', 'name': 'ChatOpenAI', 'data': {}, 'parent_ids': ['g']}
+        await asyncio.sleep(0.6)
+        yield {'event': 'on_tool_start', 'name': 'sql_query', 'data': {}, 'parent_ids': ['g']}
+        await asyncio.sleep(self.tool_seconds)
+        yield {'event': 'on_tool_end', 'name': 'sql_query', 'data': {}, 'parent_ids': ['g']}
+        yield {'event': 'on_chat_model_start', 'name': 'ChatOpenAI', 'data': {}, 'parent_ids': ['g']}
+        for word in self.words:
+            await asyncio.sleep(self.token_seconds / len(self.words))
+            yield {'event': 'on_chat_model_stream', 'name': 'ChatOpenAI',
+                   'data': {'chunk': AIMessageChunk(content=word)}, 'parent_ids': ['g']}
+        answer = AIMessage(content=''.join(self.words))
+        yield {'event': 'on_chain_end', 'name': 'LangGraph', 'parent_ids': [],
+               'data': {'output': {'messages': inputs['messages'] + [answer]}}}
+
+    async def ainvoke(self, inputs):
+        result = None
+        async for event in self.astream_events(inputs):
+            result = event['data'].get('output', result)
+        return result
+
+
+class FakeBot:
+    def __init__(self, started: float):
+        self.started = started
+        self.calls = []
+
+    async def _call(self, kind, text=None):
+        await asyncio.sleep(API_LATENCY)
+        self.calls.append((kind, time.monotonic() - self.started, text))
+
+    async def send_chat_action(self, chat_id, action):
+        await self._call('typing')
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        await self._call('send', text)
+        return SimpleNamespace(message_id=1)
+
+    async def edit_message_text(self, text, chat_id=None, message_id=None, parse_mode=None):
+        await self._call('edit', text)
+
+
+def build_agent(scripted: ScriptedAgent) -> FinAIAgent:
+    agent = FinAIAgent.__new__(FinAIAgent)
+    agent.memory = ConversationMemory(persist=False)
+    agent.context_builder = ContextBuilder('system prompt')
+    agent.direct_pipeline = False
+    agent.path_stats = {}
+    agent.agent_executor = scripted
+    # The concurrency fields FinAIAgent.__init__ sets
+    agent.max_llm_concurrency = 4
+    agent._llm_slots = asyncio.Semaphore(agent.max_llm_concurrency)
+    agent.llm_in_flight = agent.llm_waiting = agent.llm_runs = 0
+    agent.llm_wait_seconds = agent.llm_max_wait_seconds = 0.0
+    return agent
+
+
+async def blocking(agent: FinAIAgent):
+    started = time.monotonic()
+    bot = FakeBot(started)
+    response = await agent.process_message('compare september and october', user_id=1, chat_id=1)
+    await bot.send_message(1, response)
+    return bot.calls
+
+
+async def streamed(agent: FinAIAgent, interval: float):
+    started = time.monotonic()
+    bot = FakeBot(started)
+    streamer = StreamingReply(bot, 1, edit_interval=interval)
+    await streamer.start()
+    response = await agent.process_message('compare september and october', user_id=1, chat_id=1,
+                                           on_progress=streamer.on_progress)
+    await streamer.finish(response)
+    return bot.calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--tool-seconds', type=float, default=1.5)
+    parser.add_argument('--tokens', type=int, default=120)
+    parser.add_argument('--token-seconds', type=float, default=2.0)
+    parser.add_argument('--interval', type=float, default=1.0, help='edit interval (STREAM_EDIT_INTERVAL)')
+    args = parser.parse_args()
+
+    agent = build_agent(ScriptedAgent(args.tool_seconds, args.tokens, args.token_seconds))
+    print(f"{'mode':<10}{'first output ms':>16}{'first text ms':>15}{'done ms':>10}{'edits':>7}")
+    violations = 0
+    for name, run in (('blocking', blocking(agent)), ('streamed', streamed(agent, args.interval))):
+        calls = asyncio.run(run)
+        first_text = next(at for kind, at, _ in calls if kind in ('send', 'edit'))
+        edits = [at for kind, at, _ in calls if kind == 'edit']
+        # The final edit may follow flood-control waits only, interim ones must respect the interval
+        gaps = [b - a for a, b in zip(edits, edits[1:-1])]
+        violations += sum(gap < args.interval - API_LATENCY for gap in gaps)
+        print(f"{name:<10}{calls[0][1] * 1000:>16.0f}{first_text * 1000:>15.0f}{calls[-1][1] * 1000:>10.0f}{len(edits):>7}")
+    print(f"edit interval violations: {violations}")
+    sys.exit(1 if violations else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Update concurrency benchmark for hybrid_bot
+Feeds interleaved messages from several chats through the old sequential
+processing and through ChatUpdateProcessor, with FinAIAgent runs behind the
+AGENT_MAX_CONCURRENCY cap. It reports the total time, the p50/max
+update-to-reply latency and the queue metrics. It fails if any chat sees its
+replies out of order or if the LLM cap is exceeded.
+
+Usage: python benchmarks/bench_update_concurrency.py [--chats 8] [--messages 4] [--agent-seconds 0.5]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from langchain_core.messages import AIMessage  # noqa: E402
+
+from agent import FinAIAgent  # noqa: E402
+from concurrency import ChatUpdateProcessor  # noqa: E402
+from context_builder import ContextBuilder  # noqa: E402
+from memory import ConversationMemory  # noqa: E402
+
+
+class SlowAgent:
+    """ainvoke stand-in taking a fixed time and tracking concurrent runs"""
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.running = 0
+        self.peak = 0
+
+    async def ainvoke(self, inputs):
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        await asyncio.sleep(self.seconds)
+        self.running -= 1
+        return {'messages': inputs['messages'] + [AIMessage(content=inputs['messages'][-1].content)]}
+
+
+def build_agent(seconds: float, max_concurrency: int) -> FinAIAgent:
+    os.environ['AGENT_MAX_CONCURRENCY'] = str(max_concurrency)
+    agent = FinAIAgent.__new__(FinAIAgent)
+    agent.memory = ConversationMemory(persist=False)
+    agent.context_builder = ContextBuilder('system prompt')
+    agent.direct_pipeline = False
+    agent.path_stats = {}
+    agent.agent_executor = SlowAgent(seconds)
+    # The concurrency fields FinAIAgent.__init__ sets
+    agent.max_llm_concurrency = max_concurrency
+    agent._llm_slots = asyncio.Semaphore(max_concurrency)
+    agent.llm_in_flight = agent.llm_waiting = agent.llm_runs = 0
+    agent.llm_wait_seconds = agent.llm_max_wait_seconds = 0.0
+    return agent
+
+
+async def run(mode: str, chats: int, messages: int, seconds: float, max_llm: int):
+    agent = build_agent(seconds, max_llm)
+    replies = {chat: [] for chat in range(chats)}
+    latencies = []
+
+    async def handle(update):
+        response = await agent.process_message(update.text, user_id=update.effective_chat.id,
+                                               chat_id=update.effective_chat.id)
+        replies[update.effective_chat.id].append(int(response.rsplit(' ', 1)[-1]))
+        latencies.append(time.perf_counter() - update.sent_at)
+
+    updates = [SimpleNamespace(update_id=i * chats + chat, effective_chat=SimpleNamespace(id=chat),
+                               text=f"question {i}", sent_at=0.0)
+               for i in range(messages) for chat in range(chats)]
+    processor = ChatUpdateProcessor(max_concurrent_updates=64)
+    started = time.perf_counter()
+    for update in updates:
+        update.sent_at = started
+    if mode == 'sequential':
+        for update in updates:
+            await handle(update)
+    else:
+        # What Application does with concurrent updates: one task per update, in arrival order
+        await asyncio.gather(*(asyncio.ensure_future(processor.process_update(u, handle(u))) for u in updates))
+    total = time.perf_counter() - started
+
+    ordered = all(got == sorted(got) and len(got) == messages for got in replies.values())
+    return total, latencies, ordered, agent.agent_executor.peak, processor.stats(), agent.llm_metrics()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--chats', type=int, default=8)
+    parser.add_argument('--messages', type=int, default=4, help='messages per chat')
+    parser.add_argument('--agent-seconds', type=float, default=0.5)
+    parser.add_argument('--max-llm', type=int, default=4, help='AGENT_MAX_CONCURRENCY')
+    args = parser.parse_args()
+
+    print(f"{'mode':<12}{'total s':>9}{'p50 ms':>9}{'max ms':>9}{'ordered':>9}{'peak LLM':>10}")
+    failed = False
+    for mode in ('sequential', 'per-chat'):
+        total, latencies, ordered, peak, processor, llm = asyncio.run(
+            run(mode, args.chats, args.messages, args.agent_seconds, args.max_llm))
+        print(f"{mode:<12}{total:>9.2f}{statistics.median(latencies) * 1000:>9.0f}{max(latencies) * 1000:>9.0f}"
+              f"{str(ordered):>9}{peak:>10}")
+        failed |= not ordered or peak > args.max_llm
+        if mode == 'per-chat':
+            print(f"processor: max chat depth {processor['max_chat_depth']}, avg chat wait {processor['avg_wait_ms']:.0f} ms")
+            print(f"llm slots: avg wait {llm['avg_wait_ms']:.0f} ms, max wait {llm['max_wait_ms']:.0f} ms")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
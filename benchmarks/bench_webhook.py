@@ -0,0 +1,253 @@
+"""
+Webhook vs polling benchmark for hybrid_bot
+Runs a local fake Telegram Bot API (getMe, getUpdates long polling,
+setWebhook/deleteWebhook and webhook delivery with a simulated network round
+trip) and feeds the same update stream to a python-telegram-bot Application
+twice: once through Updater polling and once through webhook.WebhookApp served
+by uvicorn. It reports update-to-handler latency, then checks that a forged
+secret is refused and that shutdown drains in-flight updates. It fails if an
+update is lost.
+
+Usage: python benchmarks/bench_webhook.py [--updates 200] [--rtt-ms 60] [--rate 20]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import socket
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import aiohttp  # noqa: E402
+import uvicorn  # noqa: E402
+from aiohttp import web  # noqa: E402
+from telegram.ext import Application, MessageHandler, filters  # noqa: E402
+
+from concurrency import ChatUpdateProcessor  # noqa: E402
+from webhook import WebhookApp  # noqa: E402
+
+TOKEN = '123456:bench'
+SECRET = 'bench-secret'
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class FakeTelegram:
+    """Bot API stand-in: queues updates for getUpdates or pushes them to the webhook"""
+    def __init__(self, rtt: float):
+        self.rtt = rtt
+        self.updates = []
+        self.arrived = asyncio.Event()
+        self.webhook = None
+        self.secret = None
+        self.session = None
+        self.deliveries = []
+        self.redelivered = 0
+
+    async def handle(self, request: web.Request):
+        # Request travels to Telegram, the response travels back
+        await asyncio.sleep(self.rtt / 2)
+        method = request.match_info['method']
+        params = {key: json.loads(value) if value[:1] in '[{"' or value.isdigit() else value
+                  for key, value in (await request.post()).items()}
+        result = await getattr(self, f"api_{method}", self.api_ok)(params)
+        await asyncio.sleep(self.rtt / 2)
+        return web.json_response({'ok': True, 'result': result})
+
+    async def api_ok(self, params):
+        return True
+
+    async def api_getMe(self, params):
+        return {'id': 1, 'is_bot': True, 'first_name': 'Bench', 'username': 'bench_bot'}
+
+    async def api_setWebhook(self, params):
+        self.webhook, self.secret = params['url'], params.get('secret_token')
+        return True
+
+    async def api_deleteWebhook(self, params):
+        self.webhook = None
+        return True
+
+    async def api_getUpdates(self, params):
+        offset, timeout = int(params.get('offset', 0)), float(params.get('timeout', 0))
+        self.updates = [u for u in self.updates if u['update_id'] >= offset]
+        if not self.updates and timeout:
+            self.arrived.clear()
+            try:
+                await asyncio.wait_for(self.arrived.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return list(self.updates)
+
+    def inject(self, update: dict):
+        if self.webhook:
+            self.deliveries.append(asyncio.ensure_future(self._deliver(update)))
+        else:
+            self.updates.append(update)
+            self.arrived.set()
+
+    async def _deliver(self, update: dict, secret: str = None):
+        await asyncio.sleep(self.rtt / 2)
+        while True:
+            async with self.session.post(self.webhook, json=update, headers={
+                'X-Telegram-Bot-Api-Secret-Token': secret or self.secret
+            }) as response:
+                if response.status != 503:
+                    return response.status
+            # Telegram retries refused deliveries
+            self.redelivered += 1
+            await asyncio.sleep(0.05)
+
+
+def make_update(update_id: int, chat_id: int) -> dict:
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id, 'date': int(time.time()), 'text': f"coffee {update_id}",
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': {'id': chat_id, 'is_bot': False, 'first_name': 'User'}
+        }
+    }
+
+
+def build_application(api_port: int, handled: dict, injected: dict, delay: dict) -> Application:
+    """Handler records latency when it starts and completion once it returns"""
+    async def handle(update, context):
+        handled[update.update_id] = time.perf_counter() - injected[update.update_id]
+        await asyncio.sleep(delay['seconds'])
+        delay['finished'].add(update.update_id)
+
+    app = (Application.builder().token(TOKEN)
+           .base_url(f"http://127.0.0.1:{api_port}/bot")
+           .concurrent_updates(ChatUpdateProcessor())
+           .build())
+    app.add_handler(MessageHandler(filters.TEXT, handle))
+    return app
+
+
+async def feed(telegram: FakeTelegram, injected: dict, count: int, rate: float, first_id: int = 1):
+    rng = random.Random(7)
+    for update_id in range(first_id, first_id + count):
+        injected[update_id] = time.perf_counter()
+        telegram.inject(make_update(update_id, chat_id=update_id % 10))
+        await asyncio.sleep(rng.expovariate(rate) if rate else 0)
+
+
+async def wait_handled(handled: dict, count: int, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while len(handled) < count and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+
+
+async def start_api(telegram: FakeTelegram):
+    api = web.Application()
+    api.router.add_post('/bot{token}/{method}', telegram.handle)
+    runner = web.AppRunner(api)
+    await runner.setup()
+    port = free_port()
+    await web.TCPSite(runner, '127.0.0.1', port).start()
+    telegram.session = aiohttp.ClientSession()
+    return runner, port
+
+
+async def run_polling(args):
+    telegram = FakeTelegram(args.rtt_ms / 1000)
+    runner, port = await start_api(telegram)
+    handled, injected = {}, {}
+    app = build_application(port, handled, injected, {'seconds': args.handler_seconds, 'finished': set()})
+    await app.initialize()
+    await app.start()
+    await app.updater.start_polling(timeout=10, poll_interval=0.0)
+    await asyncio.sleep(0.2)
+
+    await feed(telegram, injected, args.updates, args.rate)
+    await wait_handled(handled, args.updates)
+
+    await app.updater.stop()
+    await app.stop()
+    await app.shutdown()
+    await telegram.session.close()
+    await runner.cleanup()
+    return list(handled.values())
+
+
+async def run_webhook(args):
+    telegram = FakeTelegram(args.rtt_ms / 1000)
+    runner, port = await start_api(telegram)
+    handled, injected = {}, {}
+    delay = {'seconds': args.handler_seconds, 'finished': set()}
+    app = build_application(port, handled, injected, delay)
+    webhook_port = free_port()
+    webhook_app = WebhookApp(app, webhook_url=f"http://127.0.0.1:{webhook_port}", secret_token=SECRET,
+                             drain_timeout=10.0)
+    server = uvicorn.Server(uvicorn.Config(webhook_app, host='127.0.0.1', port=webhook_port,
+                                           lifespan='on', log_level='warning'))
+    serving = asyncio.ensure_future(server.serve())
+    while not webhook_app.ready:
+        await asyncio.sleep(0.01)
+
+    await feed(telegram, injected, args.updates, args.rate)
+    await asyncio.gather(*telegram.deliveries)
+    await wait_handled(handled, args.updates)
+    latencies = list(handled.values())
+
+    async with telegram.session.get(f"http://127.0.0.1:{webhook_port}/healthz") as response:
+        health = response.status
+    forged = await telegram._deliver(make_update(10 ** 6, 1), secret='wrong')
+
+    # Graceful shutdown with slow handlers still running: every accepted update must finish
+    telegram.deliveries.clear()
+    delay['seconds'] = args.drain_handler_seconds
+    burst_ids = range(args.updates + 1, args.updates + 1 + args.burst)
+    await feed(telegram, injected, args.burst, 0, first_id=burst_ids[0])
+    await asyncio.gather(*telegram.deliveries)
+    stop_at = time.perf_counter()
+    server.should_exit = True
+    await serving
+    drained = sum(update_id in delay['finished'] for update_id in burst_ids)
+
+    await telegram.session.close()
+    await runner.cleanup()
+    return latencies, health, forged, drained, time.perf_counter() - stop_at
+
+
+def percentile(values, q):
+    return sorted(values)[min(len(values) - 1, int(q * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--updates', type=int, default=200)
+    parser.add_argument('--rtt-ms', type=float, default=60.0, help='simulated round trip to Telegram')
+    parser.add_argument('--rate', type=float, default=20.0, help='updates per second (Poisson arrivals)')
+    parser.add_argument('--handler-seconds', type=float, default=0.0)
+    parser.add_argument('--burst', type=int, default=20, help='updates in flight when shutdown starts')
+    parser.add_argument('--drain-handler-seconds', type=float, default=1.0)
+    args = parser.parse_args()
+    # Stopping the Updater drops its pending long poll; the fake API would log the reset
+    logging.getLogger('aiohttp.server').setLevel(logging.CRITICAL)
+
+    polling = asyncio.run(run_polling(args))
+    webhook, health, forged, drained, drain_seconds = asyncio.run(run_webhook(args))
+
+    print(f"{'mode':<9}{'handled':>9}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}")
+    for name, latencies in (('polling', polling), ('webhook', webhook)):
+        print(f"{name:<9}{len(latencies):>9}{statistics.median(latencies) * 1000:>9.1f}"
+              f"{percentile(latencies, 0.95) * 1000:>9.1f}{max(latencies) * 1000:>9.1f}")
+    print(f"healthz: {health}, forged secret: {forged}")
+    print(f"shutdown drained {drained}/{args.burst} in-flight updates in {drain_seconds:.2f}s")
+    lost = len(polling) < args.updates or len(webhook) < args.updates or drained < args.burst
+    sys.exit(1 if lost or health != 200 or forged != 403 else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""
+Minimal local PostgREST stand-in for benchmarks
+Serves /rest/v1/<table> with in-memory rows and a configurable per-request latency
+"""
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+from urllib.parse import parse_qsl, urlparse
+
+
+def _project(row: Dict, select: Optional[str]) -> Dict:
+    """Keep only the columns (and embedded resources) named in ?select="""
+    if not select or select == '*':
+        return row
+    columns = [item.split('(')[0].strip() for item in select.split(',') if '(' in item or ')' not in item]
+    if '*' in columns:
+        return row
+    return {column: row.get(column) for column in columns}
+
+
+def _matches(row: Dict, filters: List[tuple]) -> bool:
+    """Apply PostgREST-style eq/gte/lte/lt filters to a row"""
+    for column, expression in filters:
+        op, _, value = expression.partition('.')
+        current = row.get(column)
+        if current is None:
+            return False
+        current = str(current)
+        if op == 'eq' and current != value:
+            return False
+        if op == 'gte' and current < value:
+            return False
+        if op == 'lte' and current > value:
+            return False
+        if op == 'lt' and current >= value:
+            return False
+    return True
+
+
+class FakePostgrest:
+    """
+    In-memory PostgREST server
+
+    tables: {table_name: [row, ...]}
+    latency: seconds to sleep before answering each request (simulates network + DB)
+    rpc: {function_name: callable(payload) -> JSON-serialisable result}
+    """
+    def __init__(self, tables: Optional[Dict[str, List[Dict]]] = None, latency: float = 0.02,
+                 rpc: Optional[Dict[str, Callable]] = None):
+        self.tables = tables or {}
+        self.latency = latency
+        self.rpc = rpc or {}
+        self.requests = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset_counters(self) -> None:
+        with self._lock:
+            self.requests = 0
+            self.bytes_sent = 0
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, payload, status=200):
+                body = json.dumps(payload, default=str).encode()
+                with fake._lock:
+                    fake.requests += 1
+                    fake.bytes_sent += len(body)
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _route(self):
+                time.sleep(fake.latency)
+                parsed = urlparse(self.path)
+                parts = parsed.path.strip('/').split('/')
+                params = parse_qsl(parsed.query)
+                filters = [(k, v) for k, v in params if k not in ('select', 'order', 'limit', 'on_conflict')]
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length)) if length else None
+                single = 'vnd.pgrst.object' in (self.headers.get('Accept') or '')
+                return parts, dict(params), filters, body, single
+
+            def do_GET(self):
+                parts, params, filters, _, single = self._route()
+                rows = [_project(r, params.get('select')) for r in fake.tables.get(parts[-1], [])
+                        if _matches(r, filters)]
+                if 'limit' in params:
+                    rows = rows[:int(params['limit'])]
+                if single:
+                    return self._reply(rows[0] if rows else {}, 200 if rows else 406)
+                self._reply(rows)
+
+            def do_POST(self):
+                parts, params, _, body, single = self._route()
+                if parts[-2] == 'rpc':
+                    handler = fake.rpc.get(parts[-1])
+                    if handler is None:
+                        return self._reply({'message': 'function not found'}, 404)
+                    return self._reply(handler(body or {}))
+                rows = body if isinstance(body, list) else [body]
+                table = fake.tables.setdefault(parts[-1], [])
+                # Upsert: rows matching on the on_conflict columns are replaced
+                keys = [k for k in params.get('on_conflict', '').split(',') if k]
+                stored = []
+                for row in rows:
+                    row = dict(row, id=row.get('id') or str(uuid.uuid4()))
+                    if keys:
+                        table[:] = [r for r in table if any(r.get(k) != row.get(k) for k in keys)]
+                    table.append(row)
+                    stored.append(row)
+                self._reply(stored[0] if single else stored, 201)
+
+            def do_PATCH(self):
+                parts, _, filters, body, _ = self._route()
+                rows = [r for r in fake.tables.get(parts[-1], []) if _matches(r, filters)]
+                for row in rows:
+                    row.update(body or {})
+                self._reply(rows)
+
+            def do_DELETE(self):
+                parts, _, filters, _, _ = self._route()
+                table = fake.tables.get(parts[-1], [])
+                removed = [r for r in table if _matches(r, filters)]
+                fake.tables[parts[-1]] = [r for r in table if not _matches(r, filters)]
+                self._reply(removed)
+
+        return Handler
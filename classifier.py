@@ -3,13 +3,132 @@ Expense classification system - port of the JavaScript classification logic
 Handles merchant categorization using rules and fuzzy matching
 """
 import re
-from typing import Dict, List, Optional
+from collections import deque
+from typing import Dict, List, Optional, Set, Tuple
 from fuzzywuzzy import fuzz
 
+from instrumentation import timed
+
+# fuzz.partial_ratio must round above this for a fuzzy hit (score > 80)
+FUZZY_MIN_RATIO = 0.805
+
+class AhoCorasick:
+    """Multi-pattern substring matcher: finds every pattern contained in a text in one pass"""
+    def __init__(self, patterns: List[str]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[List[int]] = [[]]
+        
+        for index, pattern in enumerate(patterns):
+            if not pattern:
+                continue
+            state = 0
+            for ch in pattern:
+                if ch not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[state][ch] = len(self.goto) - 1
+                state = self.goto[state][ch]
+            self.output[state].append(index)
+        
+        # Breadth-first pass to wire failure links and merge outputs
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(ch, 0) if state else 0
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+    
+    def search(self, text: str) -> Set[int]:
+        """Return the indexes of all patterns that occur in text"""
+        found = set()
+        state = 0
+        for ch in text:
+            while state and ch not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(ch, 0)
+            if self.output[state]:
+                found.update(self.output[state])
+        return found
+
+class ClassificationIndex:
+    """
+    Pre-normalized phrases for one category list: exact-match map, Aho-Corasick
+    containment pass, and fuzzy scoring only for phrases that can still score > 80
+    """
+    def __init__(self, categories: List[Dict], category_rules: Dict[str, List[str]], normalize):
+        self.categories = categories
+        # Unique normalized phrases; each category keeps the ids of its name phrase and rule phrases
+        self.phrases: List[str] = []
+        phrase_ids: Dict[str, int] = {}
+        
+        def phrase_id(phrase: str) -> int:
+            normalized = normalize(phrase)
+            if normalized not in phrase_ids:
+                phrase_ids[normalized] = len(self.phrases)
+                self.phrases.append(normalized)
+            return phrase_ids[normalized]
+        
+        self.name_phrase: List[int] = []
+        self.rule_phrases: List[List[int]] = []
+        for cat in categories:
+            self.name_phrase.append(phrase_id(cat['name']))
+            self.rule_phrases.append([phrase_id(p) for p in category_rules.get(cat['name'], [])])
+        
+        self.exact = phrase_ids
+        self.matcher = AhoCorasick(self.phrases)
+        self.alphabet = frozenset(''.join(self.phrases))
+    
+    def phrase_scores(self, normalized_merchant: str) -> List[float]:
+        """Score every indexed phrase against a normalized merchant (same rules as _score_match)"""
+        scores = [0.0] * len(self.phrases)
+        if not normalized_merchant:
+            return scores
+        
+        exact = self.exact.get(normalized_merchant)
+        contained = self.matcher.search(normalized_merchant)
+        merchant_len = len(normalized_merchant)
+        # Translation table deleting every character the merchant doesn't contain
+        absent = {ord(ch): None for ch in self.alphabet.difference(normalized_merchant)}
+        
+        for index, phrase in enumerate(self.phrases):
+            if not phrase:
+                continue
+            if index == exact:
+                scores[index] = 2.0
+            elif index in contained:
+                scores[index] = min(1.5, len(phrase) / max(4, merchant_len))
+            else:
+                # partial_ratio <= 2*overlap / (m + overlap), where overlap bounds the shared
+                # characters and m is the shorter length; skip phrases that can't pass
+                shorter = min(len(phrase), merchant_len)
+                overlap = min(len(phrase.translate(absent)), shorter)
+                if 2 * overlap < FUZZY_MIN_RATIO * (shorter + overlap):
+                    continue
+                fuzzy_score = fuzz.partial_ratio(normalized_merchant, phrase)
+                if fuzzy_score > 80:
+                    scores[index] = fuzzy_score / 100.0
+        return scores
+    
+    def category_scores(self, normalized_merchant: str) -> List[Tuple[float, float]]:
+        """(name_score, rule_score) per category, in category order"""
+        scores = self.phrase_scores(normalized_merchant)
+        return [
+            (scores[name_id], max((scores[i] for i in rule_ids), default=0.0))
+            for name_id, rule_ids in zip(self.name_phrase, self.rule_phrases)
+        ]
+
 class ExpenseClassifier:
     def __init__(self, db_client):
         self.db_client = db_client
         self.category_rules = self._build_category_rules()
+        self._index: Optional[ClassificationIndex] = None
+        self._index_key: Optional[Tuple] = None
     
     def normalize_text(self, text: str) -> str:
         """Normalize text for comparison"""
@@ -101,6 +220,14 @@ class ExpenseClassifier:
             ]
         }
     
+    def _get_index(self, categories: List[Dict]) -> ClassificationIndex:
+        """Return the compiled index for this category list, rebuilding it when the list changes"""
+        key = tuple((cat['id'], cat['name']) for cat in categories)
+        if self._index is None or key != self._index_key:
+            self._index = ClassificationIndex(categories, self.category_rules, self.normalize_text)
+            self._index_key = key
+        return self._index
+    
     def _score_match(self, normalized_merchant: str, phrase: str) -> float:
         """Score how well a phrase matches the merchant name"""
         if not phrase or not normalized_merchant:
@@ -123,6 +250,7 @@ class ExpenseClassifier:
         
         return 0.0
     
+    @timed('classifier.classify_expense')
     async def classify_expense(self, merchant: str, categories: List[Dict], explicit_category: str = None) -> Dict:
         """
         Classify an expense by merchant name
@@ -158,8 +286,7 @@ class ExpenseClassifier:
             # If no exact match, try fuzzy matching on category names
             best_match = None
             best_score = 0.0
-            for cat in categories:
-                score = self._score_match(normalized_category, cat['name'])
+            for cat, (score, _) in zip(categories, self._get_index(categories).category_scores(normalized_category)):
                 if score > best_score:
                     best_score = score
                     best_match = cat
@@ -175,19 +302,12 @@ class ExpenseClassifier:
         normalized_merchant = self.normalize_text(merchant)
 
         # NEW WORKFLOW: Score database categories FIRST (database is source of truth)
+        # Score 1: direct match against category name
+        # Score 2: match against hardcoded rules (supplementary hints only)
+        scores = self._get_index(categories).category_scores(normalized_merchant)
         category_scores = {}
 
-        for cat in categories:
-            # Score 1: Direct match against category name
-            name_score = self._score_match(normalized_merchant, cat['name'])
-
-            # Score 2: Match against hardcoded rules (supplementary hints only)
-            rule_score = 0.0
-            if cat['name'] in self.category_rules:
-                for phrase in self.category_rules[cat['name']]:
-                    phrase_score = self._score_match(normalized_merchant, phrase)
-                    rule_score = max(rule_score, phrase_score)
-
+        for cat, (name_score, rule_score) in zip(categories, scores):
             # Combined score: prioritize direct name match, boost with rule hints
             # If name_score is strong, use it; otherwise combine with rule_score
             if name_score >= 1.0:
@@ -229,7 +349,7 @@ class ExpenseClassifier:
         # Show ALL available categories so agent can present them to user
         suggestions = []
         if best_score < 0.7:
-            suggestions = self._get_all_categories_as_suggestions(normalized_merchant, categories)
+            suggestions = self._get_all_categories_as_suggestions(normalized_merchant, categories, scores)
 
         return {
             'category_name': best_category,
@@ -245,26 +365,25 @@ class ExpenseClassifier:
                 return cat['id']
         return None
     
-    def _get_all_categories_as_suggestions(self, normalized_merchant: str, categories: List[Dict]) -> List[Dict]:
+    def _get_all_categories_as_suggestions(
+        self,
+        normalized_merchant: str,
+        categories: List[Dict],
+        scores: Optional[List[Tuple[float, float]]] = None
+    ) -> List[Dict]:
         """
         Get ALL category suggestions for uncertain matches
         Returns all available categories scored against the merchant
         This allows the agent to present all options to the user
+        Reuses the (name_score, rule_score) pairs from classify_expense when given
         """
         suggestions = []
 
-        # Score all categories
-        for cat in categories:
-            # Score against category name
-            name_score = self._score_match(normalized_merchant, cat['name'])
-
-            # Score against category rules (supplementary)
-            rule_score = 0.0
-            if cat['name'] in self.category_rules:
-                for phrase in self.category_rules[cat['name']]:
-                    phrase_score = self._score_match(normalized_merchant, phrase)
-                    rule_score = max(rule_score, phrase_score)
+        if scores is None:
+            scores = self._get_index(categories).category_scores(normalized_merchant)
 
+        # Score all categories
+        for cat, (name_score, rule_score) in zip(categories, scores):
             # Combined score
             total_score = max(name_score, rule_score * 0.9)
 
@@ -0,0 +1,120 @@
+"""
+Concurrent update processing for hybrid_bot
+Updates from different chats run in parallel while the updates of one chat are
+processed one at a time in arrival order, so per-chat state (pending_expenses,
+conversation memory) never sees two handlers at once. Expensive LLM work is
+capped separately by FinAIAgent (AGENT_MAX_CONCURRENCY)
+"""
+import asyncio
+import logging
+import os
+import sys
+import time
+from typing import Any, Awaitable, Dict, List
+
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+# Updates running at once across chats; updates waiting on their own chat don't count
+DEFAULT_MAX_CONCURRENT_UPDATES = 64
+
+# Updates one chat may have running or queued before new ones are shed
+DEFAULT_CHAT_QUEUE_LIMIT = 20
+
+class ChatUpdateProcessor(BaseUpdateProcessor):
+    """
+    Serializes updates per chat (FIFO asyncio.Lock per chat id); an update takes
+    one of the max_concurrent_updates slots only once it holds its chat's lock, so
+    updates queued behind a busy chat never occupy slots other chats need. A chat
+    flooding the bot past chat_queue_limit has its newest updates dropped
+    """
+    def __init__(self, max_concurrent_updates: int = None, chat_queue_limit: int = None):
+        if max_concurrent_updates is None:
+            max_concurrent_updates = int(os.getenv('BOT_MAX_CONCURRENT_UPDATES', DEFAULT_MAX_CONCURRENT_UPDATES))
+        # PTB's semaphore is taken before do_process_update, i.e. before the chat
+        # lock; leave it unbounded and cap running updates with our own slots
+        super().__init__(sys.maxsize)
+        self.max_running = max_concurrent_updates
+        self._slots = asyncio.Semaphore(max_concurrent_updates)
+        self.running = 0
+        self.chat_queue_limit = int(os.getenv('CHAT_QUEUE_LIMIT', DEFAULT_CHAT_QUEUE_LIMIT)) if chat_queue_limit is None else chat_queue_limit
+        # chat_id -> [lock, updates queued or running]
+        self._chats: Dict[Any, List] = {}
+
+        # Stats
+        self.processed = 0
+        self.shed = 0
+        self.waiting = 0
+        self.max_chat_depth = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        chat = getattr(update, 'effective_chat', None)
+        if chat is None:
+            async with self._slots:
+                await self._run(coroutine)
+            return
+
+        entry = self._chats.get(chat.id)
+        if entry is None:
+            entry = self._chats[chat.id] = [asyncio.Lock(), 0]
+        if self.chat_queue_limit > 0 and entry[1] >= self.chat_queue_limit:
+            self.shed += 1
+            logger.warning(f"Chat {chat.id} has {entry[1]} updates queued, dropping update {getattr(update, 'update_id', '?')}")
+            if hasattr(coroutine, 'close'):
+                coroutine.close()
+            return
+
+        entry[1] += 1
+        self.max_chat_depth = max(self.max_chat_depth, entry[1])
+        queued_at = time.monotonic()
+        self.waiting += 1
+        acquired = False
+        try:
+            async with entry[0], self._slots:
+                acquired = True
+                self.waiting -= 1
+                waited = time.monotonic() - queued_at
+                self.wait_seconds += waited
+                self.max_wait_seconds = max(self.max_wait_seconds, waited)
+                await self._run(coroutine)
+        finally:
+            if not acquired:
+                # Cancelled while queued behind the chat's running update or for a slot
+                self.waiting -= 1
+                if hasattr(coroutine, 'close'):
+                    coroutine.close()
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._chats[chat.id]
+
+    async def _run(self, coroutine: Awaitable[Any]) -> None:
+        self.running += 1
+        try:
+            await coroutine
+            self.processed += 1
+        finally:
+            self.running -= 1
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        if self.processed:
+            logger.info(f"Update processor: {self.stats()}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'in_flight': self.running,
+            'max_concurrent_updates': self.max_running,
+            'waiting_on_chat': self.waiting,
+            'active_chats': len(self._chats),
+            'queue_depth': {chat_id: depth for chat_id, (_, depth) in self._chats.items() if depth > 1},
+            'max_chat_depth': self.max_chat_depth,
+            'processed': self.processed,
+            'shed': self.shed,
+            'avg_wait_ms': self.wait_seconds / self.processed * 1000 if self.processed else 0.0,
+            'max_wait_ms': self.max_wait_seconds * 1000
+        }
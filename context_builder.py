@@ -0,0 +1,199 @@
+"""
+Token-budgeted context for FinAIAgent
+Counts the tokens each request would send (static system prompt, chat history,
+current message) and fits the history and message into a per-request budget:
+recent turns are kept verbatim, older assistant replies such as category
+breakdowns are compacted to their heading and totals, and turns that still don't
+fit are dropped oldest first. The system prompt is fixed, so it is counted but not
+charged against the budget; it always goes first and unchanged, so provider-side
+prompt caching keeps matching its prefix
+"""
+import logging
+import os
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Tokens allowed for history + current message (and a ReAct run's steps) on each
+# request, on top of the fixed system prompt (about 2,450 o200k tokens)
+DEFAULT_CONTEXT_BUDGET = 4000
+
+# Most recent turns whose replies are sent verbatim when they fit
+DEFAULT_RECENT_TURNS = 2
+
+# Size older assistant replies (and earlier tool outputs within a ReAct run) are compacted to
+DEFAULT_COMPACT_REPLY_TOKENS = 80
+
+# Per-message framing tokens in the chat format
+MESSAGE_OVERHEAD = 4
+
+# Encoder used when tiktoken and its encoding file are available
+TOKEN_ENCODING = 'o200k_base'
+
+# Lines of a breakdown/table reply and the summary lines kept when compacting it
+_LIST_LINE = re.compile(r'^\s*(?:[•\-\*\|]|\d+[.)]\s|[^\w\s]\s*\S.*\$\s?\d)')
+_TOTAL_LINE = re.compile(r'\b(?:total|budget|presupuesto|remaining|restante|spent|gastado)\b', re.IGNORECASE)
+
+Turn = Tuple[str, str]
+
+_encoder = None
+_encoder_loaded = False
+
+def _get_encoder():
+    """tiktoken encoder, or None (character estimate) when it can't be loaded"""
+    global _encoder, _encoder_loaded
+    if not _encoder_loaded:
+        _encoder_loaded = True
+        try:
+            import tiktoken
+            _encoder = tiktoken.get_encoding(TOKEN_ENCODING)
+        except Exception as e:
+            logger.info(f"tiktoken unavailable ({type(e).__name__}), estimating tokens from characters")
+    return _encoder
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    encoder = _get_encoder()
+    if encoder is not None:
+        return len(encoder.encode(text, disallowed_special=()))
+    # ~4 characters per token for English/Spanish prose
+    return (len(text) + 3) // 4
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    encoder = _get_encoder()
+    if encoder is not None:
+        return encoder.decode(encoder.encode(text, disallowed_special=())[:max_tokens])
+    return text[:max_tokens * 4]
+
+def compact_reply(text: str, max_tokens: int) -> str:
+    """
+    Shorten an assistant reply or tool output to about `max_tokens`: breakdowns
+    keep their heading and total lines, anything else is truncated
+    """
+    if count_tokens(text) <= max_tokens:
+        return text
+    lines = [line for line in text.splitlines() if line.strip()]
+    listed = [line for line in lines[1:] if _LIST_LINE.match(line)]
+    if len(listed) >= 3:
+        kept = [lines[0]] + [line for line in lines[1:] if _TOTAL_LINE.search(line) and line != lines[0]]
+        summary = '\n'.join(kept + [f"[{len(listed)}-line breakdown omitted]"])
+        if count_tokens(summary) <= max_tokens:
+            return summary
+    return truncate_tokens(text, max_tokens).rstrip() + ' …[truncated]'
+
+class ContextBuilder:
+    """
+    Fits chat history into AGENT_CONTEXT_BUDGET tokens beside the system prompt
+    and reports the tokens per turn before and after compaction
+    """
+    def __init__(
+        self,
+        system_prompt: str,
+        budget: Optional[int] = None,
+        recent_turns: Optional[int] = None,
+        compact_reply_tokens: Optional[int] = None
+    ):
+        self.system_prompt = system_prompt
+        self.budget = int(os.getenv('AGENT_CONTEXT_BUDGET', DEFAULT_CONTEXT_BUDGET)) if budget is None else budget
+        self.recent_turns = int(os.getenv('AGENT_RECENT_TURNS', DEFAULT_RECENT_TURNS)) if recent_turns is None else recent_turns
+        self.compact_reply_tokens = int(os.getenv('AGENT_COMPACT_REPLY_TOKENS', DEFAULT_COMPACT_REPLY_TOKENS)) if compact_reply_tokens is None else compact_reply_tokens
+        self.system_tokens = count_tokens(system_prompt) + MESSAGE_OVERHEAD
+
+        # Stats
+        self.turns = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self.replies_compacted = 0
+        self.turns_dropped = 0
+        self.steps_compacted = 0
+
+    def _message_tokens(self, text: str) -> int:
+        return count_tokens(text) + MESSAGE_OVERHEAD
+
+    def build(self, history: Sequence[Turn], message: str) -> Tuple[List[Turn], Dict[str, Any]]:
+        """
+        History (oldest first) to send with `message`, and a report with the
+        request's tokens before and after fitting it to the budget
+        """
+        message_tokens = self._message_tokens(message)
+        turn_tokens = [self._message_tokens(user) + self._message_tokens(reply) for user, reply in history]
+        before = self.system_tokens + message_tokens + sum(turn_tokens)
+
+        available = self.budget - message_tokens
+        kept: List[Turn] = []
+        compacted = 0
+        # Newest first; stop at the first turn that doesn't fit so context stays contiguous
+        for age, ((user, reply), tokens) in enumerate(zip(reversed(history), reversed(turn_tokens))):
+            if age >= self.recent_turns or tokens > available:
+                short = compact_reply(reply, self.compact_reply_tokens)
+                if short != reply:
+                    compacted += 1
+                    reply = short
+                    tokens = self._message_tokens(user) + self._message_tokens(reply)
+            if tokens > available:
+                break
+            kept.append((user, reply))
+            available -= tokens
+        kept.reverse()
+
+        after = self.system_tokens + self.budget - available
+        dropped = len(history) - len(kept)
+        self.turns += 1
+        self.tokens_before += before
+        self.tokens_after += after
+        self.replies_compacted += compacted
+        self.turns_dropped += dropped
+        return kept, {
+            'tokens_before': before,
+            'tokens_after': after,
+            'system_tokens': self.system_tokens,
+            'history_turns': len(kept),
+            'compacted': compacted,
+            'dropped': dropped
+        }
+
+    def pre_model_hook(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        langgraph pre_model_hook: before every ReAct step, compact the tool outputs
+        of earlier steps when the step would exceed the budget. Only the input sent
+        to the model changes; the graph state keeps the full messages
+        """
+        messages = state['messages']
+        total = sum(self._message_tokens(_content_text(m.content)) for m in messages)
+        if total <= self.budget:
+            return {'llm_input_messages': messages}
+
+        # Outputs answering the latest tool calls are what the model is reasoning about now
+        last_call = max((i for i, m in enumerate(messages) if getattr(m, 'tool_calls', None)), default=len(messages))
+        trimmed = []
+        for index, msg in enumerate(messages):
+            if getattr(msg, 'type', None) == 'tool' and index < last_call and isinstance(msg.content, str):
+                short = compact_reply(msg.content, self.compact_reply_tokens)
+                if short != msg.content:
+                    msg = msg.model_copy(update={'content': short})
+                    self.steps_compacted += 1
+            trimmed.append(msg)
+        return {'llm_input_messages': trimmed}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'turns': self.turns,
+            'budget': self.budget,
+            'system_tokens': self.system_tokens,
+            'tokens_per_turn_before': self.tokens_before / self.turns if self.turns else 0.0,
+            'tokens_per_turn_after': self.tokens_after / self.turns if self.turns else 0.0,
+            'saved': 1 - self.tokens_after / self.tokens_before if self.tokens_before else 0.0,
+            'replies_compacted': self.replies_compacted,
+            'turns_dropped': self.turns_dropped,
+            'steps_compacted': self.steps_compacted
+        }
+
+def _content_text(content: Any) -> str:
+    """Text of a message content (string or list of content blocks)"""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return ''.join(block.get('text', '') if isinstance(block, dict) else str(block) for block in content)
+    return str(content or '')
@@ -2,12 +2,124 @@
 Currency conversion functionality
 Handles multi-currency expense tracking with exchange rates
 """
-from datetime import datetime
-from typing import Dict, Optional, List
+import asyncio
+import json
+import os
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional, List, Sequence, Tuple, Union
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Currency cross rates are triangulated through first (rates are stored against it)
+PIVOT_CURRENCY = 'MXN'
+
+# Seconds between scheduled currency rate refreshes (RateRefreshJob)
+DEFAULT_RATE_REFRESH_INTERVAL = 6 * 3600
+
+# Rates served by the stub provider (1 MXN in each currency)
+STUB_RATES = {'CAD': 0.075, 'USD': 0.055, 'EUR': 0.05, 'GBP': 0.043}
+
+class RateMatrix:
+    """
+    Immutable snapshot of the currency_rates table
+    Every pair reachable from the stored rows (direct, inverse, or through one
+    intermediate currency - the pivot first) is resolved when the snapshot is
+    built, so lookups are a single dict access and conversions need no I/O
+    """
+    def __init__(self, rows: Iterable[Dict], pivot: str = PIVOT_CURRENCY):
+        self.pivot = pivot.upper()
+        direct: Dict[Tuple[str, str], float] = {}
+        versions: Dict[Tuple[str, str], str] = {}
+        for row in rows:
+            pair = (str(row['base_currency']).upper(), str(row['target_currency']).upper())
+            rate = float(row['rate'])
+            version = str(row.get('updated_at') or '')
+            # Duplicate pairs: the most recently updated row wins
+            if rate <= 0 or (pair in versions and versions[pair] > version):
+                continue
+            direct[pair] = rate
+            versions[pair] = version
+        self._direct = direct
+        self._versions = versions
+        self.updated_at = max(versions.values(), default='') or None
+        
+        # When both directions of a pair are stored, the newer row defines both
+        self.rates: Dict[Tuple[str, str], float] = {}
+        for pair, rate in direct.items():
+            reverse = (pair[1], pair[0])
+            if reverse in direct and versions[reverse] > versions[pair]:
+                continue
+            self.rates[pair] = rate
+            if reverse not in direct or versions[reverse] < versions[pair]:
+                self.rates[reverse] = 1 / rate
+        
+        self.currencies = {currency for pair in self.rates for currency in pair} | {self.pivot}
+        self.triangulated = set()
+        intermediates = [self.pivot] + sorted(self.currencies - {self.pivot})
+        for base in self.currencies:
+            for target in self.currencies:
+                if base == target or (base, target) in self.rates:
+                    continue
+                via = next((c for c in intermediates if (base, c) in self.rates and (c, target) in self.rates), None)
+                if via is not None:
+                    self.rates[(base, target)] = self.rates[(base, via)] * self.rates[(via, target)]
+                    self.triangulated.add((base, target))
+        for currency in self.currencies:
+            self.rates[(currency, currency)] = 1.0
+    
+    def __len__(self) -> int:
+        return len(self.rates)
+    
+    def rows(self) -> List[Dict]:
+        """The stored currency_rates rows this snapshot was built from"""
+        return [
+            {'base_currency': base, 'target_currency': target, 'rate': rate,
+             'updated_at': self._versions[(base, target)] or None}
+            for (base, target), rate in self._direct.items()
+        ]
+    
+    def merged(self, rows: Iterable[Dict]) -> 'RateMatrix':
+        """New snapshot with `rows` replacing the stored rows for the same pairs"""
+        rows = list(rows)
+        replaced = {(str(r['base_currency']).upper(), str(r['target_currency']).upper()) for r in rows}
+        kept = [r for r in self.rows() if (r['base_currency'], r['target_currency']) not in replaced]
+        return RateMatrix(kept + rows, self.pivot)
+    
+    def rate(self, from_currency: str, to_currency: str) -> Optional[float]:
+        """Multiplier from one currency to another, None when no path exists"""
+        from_curr, to_curr = from_currency.upper(), to_currency.upper()
+        if from_curr == to_curr:
+            return 1.0
+        return self.rates.get((from_curr, to_curr))
+    
+    def convert(self, amount: float, from_currency: str, to_currency: str) -> Optional[float]:
+        rate = self.rate(from_currency, to_currency)
+        return amount * rate if rate is not None else None
+    
+    def convert_many(
+        self,
+        amounts: Sequence[float],
+        currencies: Union[str, Sequence[str]],
+        to_currency: str
+    ) -> List[Optional[float]]:
+        """
+        Convert a column of amounts to one currency; `currencies` is either a
+        single code or one code per amount. Unconvertible rows come back as None
+        """
+        if isinstance(currencies, str):
+            rate = self.rate(currencies, to_currency)
+            return [amount * rate if rate is not None else None for amount in amounts]
+        if len(currencies) != len(amounts):
+            raise ValueError(f"{len(amounts)} amounts but {len(currencies)} currencies")
+        
+        # One lookup per distinct currency, then a plain multiply per row
+        rates = {code: self.rate(code or '', to_currency) for code in set(currencies)}
+        return [
+            amount * rate if rate is not None else None
+            for amount, rate in zip(amounts, (rates[code] for code in currencies))
+        ]
+
 class CurrencyConverter:
     def __init__(self, db_client):
         self.db_client = db_client
@@ -92,10 +204,11 @@ class CurrencyConverter:
                     'success': True
                 }
             
-            # Get exchange rate from database
-            rate_data = await self.db_client.get_currency_rate(from_curr, to_curr)
+            # Exchange rate from the in-process rate matrix (no per-conversion query)
+            matrix = await self.db_client.get_rate_matrix()
+            rate = matrix.rate(from_curr, to_curr)
             
-            if not rate_data:
+            if rate is None:
                 # Fallback to 1:1 conversion with warning
                 logger.warning(f"No exchange rate found for {from_curr} to {to_curr}, using 1:1")
                 return {
@@ -109,20 +222,13 @@ class CurrencyConverter:
                     'error': 'Exchange rate not found'
                 }
             
-            # Calculate converted amount
-            rate = rate_data['rate']
-            if rate_data['direct']:
-                converted_amount = amount * rate
-            else:
-                converted_amount = amount / rate
-            
             return {
-                'converted_amount': round(converted_amount, 2),
+                'converted_amount': round(amount * rate, 2),
                 'original_amount': amount,
                 'from_currency': from_curr,
                 'to_currency': to_curr,
                 'rate': rate,
-                'rate_date': datetime.now().isoformat(),
+                'rate_date': matrix.updated_at or datetime.now().isoformat(),
                 'success': True
             }
             
@@ -139,6 +245,24 @@ class CurrencyConverter:
                 'error': str(e)
             }
     
+    async def convert_many(
+        self,
+        amounts: Sequence[float],
+        currencies: Union[str, Sequence[str]],
+        to_currency: str = None
+    ) -> List[Optional[float]]:
+        """
+        Convert many amounts against one rate snapshot (for analytics and bulk
+        import); rows without a known rate come back as None, never 1:1
+        """
+        to_curr = self.normalize_currency_code(to_currency or self.default_currency)
+        if isinstance(currencies, str):
+            currencies = self.normalize_currency_code(currencies)
+        else:
+            currencies = [self.normalize_currency_code(code) for code in currencies]
+        matrix = await self.db_client.get_rate_matrix()
+        return matrix.convert_many(amounts, currencies, to_curr)
+    
     async def get_supported_currencies(self) -> List[Dict]:
         """Get list of supported currencies with details"""
         currencies = []
@@ -212,16 +336,136 @@ class CurrencyConverter:
         }
         """
         try:
-            base_currency = rates_data.get('base_currency', 'MXN')
+            base_currency = self.normalize_currency_code(rates_data.get('base_currency', 'MXN'))
             rates = rates_data.get('rates', {})
-            updated_at = rates_data.get('updated_at', datetime.now().isoformat())
+            # Every row of one update shares its version
+            updated_at = rates_data.get('updated_at') or datetime.now(timezone.utc).isoformat()
+            
+            rows = []
+            for code, rate in rates.items():
+                target = self.normalize_currency_code(code)
+                if target == base_currency:
+                    continue
+                try:
+                    rate = float(rate)
+                except (TypeError, ValueError):
+                    rate = 0.0
+                if rate <= 0:
+                    logger.warning(f"Skipping invalid {base_currency}->{target} rate: {rates[code]!r}")
+                    continue
+                rows.append({
+                    'base_currency': base_currency,
+                    'target_currency': target,
+                    'rate': rate,
+                    'updated_at': updated_at
+                })
+            
+            if not rows:
+                logger.warning(f"No valid currency rates to update for base {base_currency}")
+                return False
             
-            # This would update the currency_rates table
-            # Implementation depends on how the rates table is structured
-            logger.info(f"Would update {len(rates)} currency rates with base {base_currency}")
+            # One upsert for every pair; the client publishes the new matrix to its cache
+            await self.db_client.upsert_currency_rates(rows)
+            logger.info(f"Updated {len(rows)} currency rates with base {base_currency} (version {updated_at})")
             
             return True
             
         except Exception as e:
             logger.error(f"Error updating currency rates: {e}")
-            return False
\ No newline at end of file
+            return False
+
+class FileRateProvider:
+    """
+    Reads rates from a local JSON file in the update_currency_rates format (one
+    object, or a list of them for several bases). The file's modification time is
+    the version of feeds without an updated_at, so an unchanged file isn't rewritten
+    """
+    def __init__(self, path: str):
+        self.path = path
+    
+    async def fetch(self) -> List[Dict]:
+        return await asyncio.get_running_loop().run_in_executor(None, self._read)
+    
+    def _read(self) -> List[Dict]:
+        with open(self.path, encoding='utf-8') as f:
+            data = json.load(f)
+        version = datetime.fromtimestamp(os.path.getmtime(self.path), timezone.utc).isoformat()
+        feeds = data if isinstance(data, list) else [data]
+        return [dict(feed, updated_at=feed.get('updated_at') or version) for feed in feeds]
+
+class StaticRateProvider:
+    """Stub provider serving fixed rates (local development, offline deployments)"""
+    def __init__(self, rates: Optional[Dict[str, float]] = None, base_currency: str = 'MXN'):
+        self.rates = dict(rates or STUB_RATES)
+        self.base_currency = base_currency
+        self.updated_at = datetime.now(timezone.utc).isoformat()
+    
+    async def fetch(self) -> List[Dict]:
+        return [{'base_currency': self.base_currency, 'rates': dict(self.rates), 'updated_at': self.updated_at}]
+
+def rate_provider_from_env():
+    """CURRENCY_RATES_FILE selects a FileRateProvider, CURRENCY_RATES_PROVIDER=stub the stub"""
+    path = os.getenv('CURRENCY_RATES_FILE')
+    if path:
+        return FileRateProvider(path)
+    if os.getenv('CURRENCY_RATES_PROVIDER', '').lower() == 'stub':
+        return StaticRateProvider()
+    return None
+
+class RateRefreshJob:
+    """
+    Periodically pulls rates from a provider into currency_rates through
+    CurrencyConverter.update_currency_rates. Feeds whose version was already
+    written are skipped, so an unchanged source costs no database writes
+    """
+    def __init__(self, converter: CurrencyConverter, provider, interval: Optional[float] = None):
+        self.converter = converter
+        self.provider = provider
+        self.interval = float(os.getenv('CURRENCY_REFRESH_INTERVAL', DEFAULT_RATE_REFRESH_INTERVAL)) if interval is None else interval
+        self._versions: Dict[str, str] = {}
+        self._task: Optional[asyncio.Task] = None
+        
+        # Stats
+        self.runs = 0
+        self.writes = 0
+        self.failures = 0
+    
+    async def run_once(self) -> int:
+        """Fetch from the provider and write changed feeds; returns the number written"""
+        written = 0
+        for feed in await self.provider.fetch():
+            base_currency = self.converter.normalize_currency_code(feed.get('base_currency', 'MXN'))
+            version = feed.get('updated_at')
+            if version and self._versions.get(base_currency) == version:
+                continue
+            if await self.converter.update_currency_rates(feed):
+                self._versions[base_currency] = version
+                written += 1
+            else:
+                self.failures += 1
+        self.runs += 1
+        self.writes += written
+        return written
+    
+    async def _loop(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"Currency rate refresh failed: {e}")
+            await asyncio.sleep(self.interval)
+    
+    def start(self):
+        """Run the refresh now and then every `interval` seconds on the running loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._loop())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -3,35 +3,178 @@ Supabase database client for FinAIssistant
 Handles all database operations with proper error handling
 """
 import os
+import re
+import time
+import asyncio
 import logging
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Callable, Dict, Iterable, List, Optional, Any
 from supabase import create_client, Client
 
+from currency import RateMatrix
+from instrumentation import instrument_methods, timed
+from structured_logging import preview
+
 logger = logging.getLogger(__name__)
 
+# Default number of worker threads used to run blocking PostgREST requests
+DEFAULT_MAX_WORKERS = 8
+
+# Seconds the in-process category catalog is served before it is re-fetched
+DEFAULT_CATEGORY_CACHE_TTL = 300
+
+# Seconds the in-process currency rate matrix is served before it is re-fetched
+DEFAULT_RATE_CACHE_TTL = 3600
+
+# Rows run_readonly_sql returns at most (the function itself clamps to 5000)
+DEFAULT_SQL_MAX_ROWS = 1000
+
+def normalize_category_name(name: str) -> str:
+    """Lowercase, strip accents and collapse whitespace for category lookups"""
+    decomposed = unicodedata.normalize('NFKD', str(name or ''))
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return ' '.join(stripped.lower().split())
+
+@instrument_methods('supabase')
 class SupabaseClient:
-    def __init__(self):
+    def __init__(self, max_workers: Optional[int] = None):
+        """
+        Args:
+            max_workers: Size of the thread pool that runs PostgREST round trips off
+                the event loop. Defaults to SUPABASE_MAX_WORKERS (or 8). Use 0 to run
+                requests inline on the event loop (legacy blocking behaviour).
+        """
         self.supabase_url = os.getenv('SUPABASE_URL')
         self.supabase_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
         
         if not self.supabase_url or not self.supabase_key:
             raise ValueError("Missing SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY environment variables")
         
+        # A single client (and therefore a single pooled HTTP session) is shared by
+        # every worker thread, so concurrent requests reuse keep-alive connections
         self.client: Client = create_client(self.supabase_url, self.supabase_key)
+        
+        if max_workers is None:
+            max_workers = int(os.getenv('SUPABASE_MAX_WORKERS', DEFAULT_MAX_WORKERS))
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix='supabase'
+        ) if max_workers > 0 else None
+        
+        # Server-side aggregation RPCs (supabase/migrations); functions reported
+        # missing by PostgREST are remembered so we go straight to the Python path
+        self.use_aggregate_rpc = os.getenv('SUPABASE_AGGREGATE_RPC', '1') != '0'
+        self._missing_rpcs = set()
+        
+        # Generated SQL runs through the read-only run_readonly_sql function
+        self.use_sql_rpc = os.getenv('SUPABASE_SQL_RPC', '1') != '0'
+        self.sql_max_rows = int(os.getenv('SQL_RPC_MAX_ROWS', DEFAULT_SQL_MAX_ROWS))
+        
+        # In-process category catalog shared by the classifier, tools and bot handlers
+        self.category_cache_ttl = float(os.getenv('CATEGORY_CACHE_TTL', DEFAULT_CATEGORY_CACHE_TTL))
+        self.category_cache_hits = 0
+        self.category_cache_misses = 0
+        self._categories: Optional[List[Dict]] = None
+        self._categories_by_id: Dict[str, Dict] = {}
+        self._categories_by_name: Dict[str, Dict] = {}
+        self._categories_loaded_at = 0.0
+        self._categories_generation = 0
+        self._categories_refresh: Optional[asyncio.Future] = None
+        
+        # In-process currency rate matrix (currency.RateMatrix) used for every conversion
+        self.rate_cache_ttl = float(os.getenv('CURRENCY_RATE_TTL', DEFAULT_RATE_CACHE_TTL))
+        self._rate_matrix: Optional[RateMatrix] = None
+        self._rates_loaded_at = 0.0
+        self._rates_generation = 0
+        self._rates_refresh: Optional[asyncio.Future] = None
+        
+        # Callbacks told which expense_date values a write touched (None = unknown),
+        # e.g. the SqlQueryTool answer cache
+        self._expense_listeners: List[Callable[[Optional[List[str]]], None]] = []
+    
+    @timed('supabase.request')
+    async def _execute(self, query):
+        """Run a PostgREST request builder without blocking the event loop"""
+        if self._executor is None:
+            return query.execute()
+        
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, query.execute)
+    
+    async def _rpc_aggregate(self, function: str, args: Dict[str, Any]) -> Optional[List[Dict]]:
+        """
+        Run a server-side aggregation function
+        Returns None when the RPC is disabled or unavailable so callers can fall back
+        to aggregating in Python
+        """
+        if not self.use_aggregate_rpc or function in self._missing_rpcs:
+            return None
+        
+        try:
+            result = await self._execute(self.client.rpc(function, args))
+            return result.data or []
+        except Exception as e:
+            self._remember_missing_rpc(function, e)
+            logger.warning(f"Aggregation RPC {function} failed, using Python fallback: {e}")
+            return None
+    
+    async def run_readonly_sql(self, sql: str) -> Optional[List[Dict]]:
+        """
+        Run a validated SELECT in Postgres through run_readonly_sql (restricted
+        role, read-only transaction, statement timeout, row cap) and return its
+        rows. Returns None when the function is disabled or not deployed so the
+        caller can fall back; query errors (syntax, permission, timeout) raise
+        """
+        function = 'run_readonly_sql'
+        if not self.use_sql_rpc or function in self._missing_rpcs:
+            return None
+        
+        try:
+            result = await self._execute(self.client.rpc(function, {'p_sql': sql, 'p_max_rows': self.sql_max_rows}))
+        except Exception as e:
+            if self._remember_missing_rpc(function, e):
+                logger.warning(f"RPC {function} not deployed, interpreting generated SQL in Python: {e}")
+                return None
+            raise Exception(f"SQL execution error: {getattr(e, 'message', None) or e}")
+        
+        rows = result.data or []
+        if len(rows) >= self.sql_max_rows:
+            logger.warning(f"Generated SQL hit the {self.sql_max_rows} row cap")
+        return rows
+    
+    def _remember_missing_rpc(self, function: str, error: Exception) -> bool:
+        """Remember functions PostgREST reports as undeployed; True if `error` was that"""
+        # PGRST202: function not exposed by PostgREST. 42883 is also raised for an
+        # undefined operator or function *inside* a deployed body, so it only counts
+        # when the missing function is this one
+        code = getattr(error, 'code', None)
+        message = str(getattr(error, 'message', None) or error)
+        if code == 'PGRST202' or (code == '42883' and re.search(rf'\bfunction (public\.)?{function}\(', message)):
+            self._missing_rpcs.add(function)
+            return True
+        return False
+    
+    def close(self) -> None:
+        """Release the worker threads (pending requests are allowed to finish)"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
     
     async def upsert_user(self, telegram_id: int, username: str, display_name: str) -> Dict:
         """Upsert user and return user data"""
         try:
-            result = self.client.table('users').upsert({
+            result = await self._execute(self.client.table('users').upsert({
                 'telegram_id': str(telegram_id),
                 'name': display_name or username or 'Unknown'
-            }, on_conflict='telegram_id').execute()
+            }, on_conflict='telegram_id'))
             
             # Get the user data with a separate query
-            user_result = self.client.table('users').select('id, name, telegram_id').eq(
+            user_result = await self._execute(self.client.table('users').select('id, name, telegram_id').eq(
                 'telegram_id', str(telegram_id)
-            ).single().execute()
+            ).single())
             
             if user_result.data:
                 return user_result.data
@@ -44,9 +187,9 @@ class SupabaseClient:
     async def get_user_by_telegram_id(self, telegram_id: int) -> Optional[Dict]:
         """Get user by telegram ID"""
         try:
-            result = self.client.table('users').select('id, name, telegram_id').eq(
+            result = await self._execute(self.client.table('users').select('id, name, telegram_id').eq(
                 'telegram_id', str(telegram_id)
-            ).single().execute()
+            ).single())
             
             return result.data if result.data else None
             
@@ -54,13 +197,83 @@ class SupabaseClient:
             return None
     
     async def get_categories(self) -> List[Dict]:
-        """Get all categories"""
+        """
+        Get all categories
+        Served from the in-process catalog while it is younger than the TTL;
+        concurrent misses share a single database round trip
+        """
+        if self._categories is not None and time.monotonic() - self._categories_loaded_at < self.category_cache_ttl:
+            self.category_cache_hits += 1
+            return list(self._categories)
+        
+        self.category_cache_misses += 1
+        refresh = self._categories_refresh
+        if refresh is None or refresh.done() or refresh.get_loop() is not asyncio.get_running_loop():
+            refresh = asyncio.ensure_future(self._load_categories())
+            self._categories_refresh = refresh
+        
+        categories = await asyncio.shield(refresh)
+        return list(categories)
+    
+    async def _load_categories(self) -> List[Dict]:
+        """Fetch categories and publish them to the catalog"""
+        generation = self._categories_generation
         try:
-            result = self.client.table('categories').select('id, name, description').order('name').execute()
-            return result.data if result.data else []
+            result = await self._execute(self.client.table('categories').select('id, name, description').order('name'))
+            categories = result.data if result.data else []
             
         except Exception as e:
             raise Exception(f"Database error fetching categories: {str(e)}")
+        
+        # Don't publish a catalog that was invalidated while the request was in flight
+        if generation == self._categories_generation:
+            self._categories = categories
+            self._categories_by_id = {str(cat['id']): cat for cat in categories}
+            self._categories_by_name = {normalize_category_name(cat['name']): cat for cat in categories}
+            self._categories_loaded_at = time.monotonic()
+        return categories
+    
+    async def get_category_by_id(self, category_id: Any) -> Optional[Dict]:
+        """Look up a category by id in the catalog"""
+        await self.get_categories()
+        return self._categories_by_id.get(str(category_id))
+    
+    async def get_category_by_name(self, name: str) -> Optional[Dict]:
+        """Look up a category by name (case, accent and whitespace insensitive)"""
+        await self.get_categories()
+        return self._categories_by_name.get(normalize_category_name(name))
+    
+    def invalidate_categories(self) -> None:
+        """Drop the category catalog so the next read goes to the database"""
+        self._categories_generation += 1
+        self._categories = None
+        self._categories_by_id = {}
+        self._categories_by_name = {}
+        self._categories_refresh = None
+    
+    def add_expense_listener(self, callback: Callable[[Optional[List[str]]], None]) -> None:
+        """Register a callback run after every expense insert/update/delete"""
+        self._expense_listeners.append(callback)
+    
+    def _notify_expense_write(self, dates: Optional[Iterable[str]]) -> None:
+        dates = None if dates is None else list(dates)
+        if dates is not None and not all(dates):
+            dates = None
+        for callback in self._expense_listeners:
+            try:
+                callback(dates)
+            except Exception as e:
+                logger.warning(f"Expense write listener failed: {e}")
+    
+    def category_cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size of the category catalog"""
+        return {
+            'hits': self.category_cache_hits,
+            'misses': self.category_cache_misses,
+            'size': len(self._categories or []),
+            'age_seconds': time.monotonic() - self._categories_loaded_at if self._categories is not None else None,
+            'ttl_seconds': self.category_cache_ttl
+        }
     
     async def insert_expense(
         self,
@@ -75,7 +288,7 @@ class SupabaseClient:
         """Insert a new expense"""
         try:
             # Get the user's name for paid_by field
-            user_result = self.client.table('users').select('name').eq('id', user_id).single().execute()
+            user_result = await self._execute(self.client.table('users').select('name').eq('id', user_id).single())
             user_name = user_result.data.get('name', 'Unknown User') if user_result.data else 'Unknown User'
             
             # Convert to MXN if different currency
@@ -87,10 +300,7 @@ class SupabaseClient:
                 rate_data = await self.get_currency_rate(currency.upper(), 'MXN')
                 if rate_data:
                     rate = rate_data['rate']
-                    if rate_data['direct']:
-                        converted_amount = amount * rate
-                    else:
-                        converted_amount = amount / rate
+                    converted_amount = amount * rate
                     logger.info(f"Converted {amount} {currency} to {converted_amount:.2f} MXN (rate: {rate})")
                 else:
                     logger.warning(f"No conversion rate found for {currency} to MXN, using original amount")
@@ -110,7 +320,8 @@ class SupabaseClient:
                 'notes': notes
             }
             
-            result = self.client.table('expenses').insert(expense_data).execute()
+            result = await self._execute(self.client.table('expenses').insert(expense_data))
+            self._notify_expense_write([expense_data['expense_date']])
             
             if result.data:
                 return result.data[0]
@@ -120,29 +331,173 @@ class SupabaseClient:
         except Exception as e:
             raise Exception(f"Database error inserting expense: {str(e)}")
     
+    async def insert_expense_for_telegram_user(
+        self,
+        telegram_id: int,
+        category: str,
+        merchant: str,
+        amount: float,
+        currency: str = 'MXN',
+        expense_date: Optional[str] = None,
+        notes: Optional[str] = None
+    ) -> Dict:
+        """
+        Insert an expense for a Telegram user in a single round trip
+        The insert_expense_for_telegram function resolves the user, paid_by and
+        the category (id or name) in Postgres; the MXN amount is converted here with
+        the rate matrix, so cross rates match every other conversion. Falls back to
+        the lookup + insert_expense path when the function isn't deployed
+        """
+        expense_date = expense_date or datetime.now().strftime('%Y-%m-%d')
+        function = 'insert_expense_for_telegram'
+        
+        if function not in self._missing_rpcs:
+            amount_mxn = amount
+            if currency.upper() != 'MXN':
+                rate_data = await self.get_currency_rate(currency.upper(), 'MXN')
+                amount_mxn = amount * rate_data['rate'] if rate_data else None
+                if amount_mxn is None:
+                    logger.warning(f"No conversion rate found for {currency} to MXN, using original amount")
+            try:
+                result = await self._execute(self.client.rpc(function, {
+                    'p_telegram_id': int(telegram_id),
+                    'p_category': str(category),
+                    'p_expense_detail': merchant,
+                    'p_amount': amount,
+                    'p_currency': currency,
+                    'p_expense_date': expense_date,
+                    'p_notes': notes,
+                    'p_amount_mxn': amount_mxn
+                }))
+                rows = result.data if isinstance(result.data, list) else [result.data]
+                if not rows or not rows[0]:
+                    raise Exception("Failed to insert expense")
+                self._notify_expense_write([expense_date])
+                return rows[0]
+            except Exception as e:
+                if not self._remember_missing_rpc(function, e):
+                    raise Exception(f"Database error inserting expense: {str(e)}")
+                logger.warning(f"RPC {function} not deployed, using multi-request insert: {e}")
+        
+        user = await self.get_user_by_telegram_id(telegram_id)
+        if not user:
+            raise Exception(f"Database error inserting expense: User not found for Telegram ID: {telegram_id}")
+        category_row = await self.get_category_by_id(category) or await self.get_category_by_name(category)
+        if not category_row:
+            raise Exception(f"Database error inserting expense: Category not found: {category}")
+        return await self.insert_expense(
+            user_id=user['id'],
+            category_id=category_row['id'],
+            merchant=merchant,
+            amount=amount,
+            currency=currency,
+            expense_date=expense_date,
+            notes=notes
+        )
+    
+    async def insert_expenses(self, rows: List[Dict]) -> int:
+        """
+        Insert prepared expense rows (insert_expense column layout) in one
+        multi-row request; returns the number of rows written
+        """
+        if not rows:
+            return 0
+        try:
+            result = await self._execute(
+                self.client.table('expenses').insert(rows, returning='minimal')
+            )
+            self._notify_expense_write([row.get('expense_date') for row in rows])
+            return len(result.data) if result.data else len(rows)
+        except Exception as e:
+            raise Exception(f"Database error inserting expenses: {str(e)}")
+    
+    async def get_currency_rates(self) -> List[Dict]:
+        """All currency_rates rows (one request) for callers that convert in bulk"""
+        try:
+            result = await self._execute(self.client.table('currency_rates').select(
+                'base_currency, target_currency, rate, updated_at'
+            ))
+            return result.data or []
+        except Exception as e:
+            raise Exception(f"Database error fetching currency rates: {str(e)}")
+    
+    async def get_rate_matrix(self) -> RateMatrix:
+        """
+        Snapshot of every known currency pair (direct, inverse and triangulated)
+        Served from memory while younger than the TTL; concurrent misses share a
+        single database round trip
+        """
+        if self._rate_matrix is not None and time.monotonic() - self._rates_loaded_at < self.rate_cache_ttl:
+            return self._rate_matrix
+        
+        refresh = self._rates_refresh
+        if refresh is None or refresh.done() or refresh.get_loop() is not asyncio.get_running_loop():
+            refresh = asyncio.ensure_future(self._load_rate_matrix())
+            self._rates_refresh = refresh
+        
+        return await asyncio.shield(refresh)
+    
+    async def _load_rate_matrix(self) -> RateMatrix:
+        """Fetch currency_rates and publish them as a new matrix"""
+        generation = self._rates_generation
+        matrix = RateMatrix(await self.get_currency_rates())
+        # Don't publish a matrix that was invalidated while the request was in flight
+        if generation == self._rates_generation:
+            self._rate_matrix = matrix
+            self._rates_loaded_at = time.monotonic()
+        return matrix
+    
+    async def upsert_currency_rates(self, rows: List[Dict]) -> int:
+        """
+        Write currency_rates rows in one upsert keyed by (base_currency, target_currency)
+        and publish them to the rate matrix; returns the number of rows written
+        """
+        if not rows:
+            return 0
+        try:
+            await self._execute(self.client.table('currency_rates').upsert(
+                rows, on_conflict='base_currency,target_currency', returning='minimal'
+            ))
+        except Exception as e:
+            raise Exception(f"Database error upserting currency rates: {str(e)}")
+        self.publish_rates(rows)
+        return len(rows)
+    
+    def publish_rates(self, rows: List[Dict]) -> None:
+        """
+        Swap in a rate matrix with `rows` applied as a single reference assignment;
+        readers holding the previous snapshot keep a consistent view
+        """
+        # A load already in flight predates these rows
+        self._rates_generation += 1
+        self._rates_refresh = None
+        if self._rate_matrix is None:
+            # Nothing to patch: the next read loads the whole table
+            return
+        self._rate_matrix = self._rate_matrix.merged(rows)
+        self._rates_loaded_at = time.monotonic()
+    
+    def invalidate_rates(self) -> None:
+        """Drop the rate matrix so the next conversion reloads currency_rates"""
+        self._rates_generation += 1
+        self._rate_matrix = None
+        self._rates_refresh = None
+    
     async def get_currency_rate(self, from_currency: str, to_currency: str) -> Optional[Dict]:
-        """Get currency conversion rate"""
+        """
+        Get currency conversion rate from the rate matrix
+        The rate is always a multiplier (inverse and cross rates are resolved), so
+        'direct' is True whenever a rate is found
+        """
         try:
-            # Try direct conversion first
-            result = self.client.table('currency_rates').select('rate').eq(
-                'base_currency', from_currency
-            ).eq('target_currency', to_currency).single().execute()
-            
-            if result.data:
-                return {'rate': result.data['rate'], 'direct': True}
-            
-            # Try reverse conversion
-            result = self.client.table('currency_rates').select('rate').eq(
-                'base_currency', to_currency
-            ).eq('target_currency', from_currency).single().execute()
-            
-            if result.data:
-                return {'rate': result.data['rate'], 'direct': False}
-            
-            return None
-            
+            matrix = await self.get_rate_matrix()
         except Exception:
             return None
+        
+        rate = matrix.rate(from_currency, to_currency)
+        if rate is None:
+            return None
+        return {'rate': rate, 'direct': True}
     
     async def execute_sql(self, sql: str, params: Optional[List] = None) -> List[Dict]:
         """
@@ -162,8 +517,13 @@ class SupabaseClient:
         Execute raw SQL with parameters - for AI agent queries
         This queries your actual Supabase data
         """
+        if template_name == "dynamic_sql":
+            rows = await self.run_readonly_sql(sql)
+            if rows is not None:
+                return rows
+        
         try:
-            logger.info(f"Execute raw SQL called with: template='{template_name}', params={params}")
+            logger.debug("Execute raw SQL: template=%s, params=%s", template_name, preview(params))
             # Map SQL queries to actual Supabase PostgREST queries
             if "SUM(amount)" in sql and "specific_category_total" in str(params):
                 # Specific category total query
@@ -173,7 +533,7 @@ class SupabaseClient:
                 end_date = params[3] if len(params) > 3 else None
                 
                 # Get user first
-                user_result = self.client.table('users').select('id').eq('telegram_id', user_telegram_id).execute()
+                user_result = await self._execute(self.client.table('users').select('id').eq('telegram_id', user_telegram_id))
                 if not user_result.data:
                     return [{"total": 0}]
                 
@@ -186,7 +546,7 @@ class SupabaseClient:
                 if end_date:
                     query = query.lte('expense_date', end_date)
                 
-                result = query.execute()
+                result = await self._execute(query)
                 
                 # Filter by category and sum
                 total = 0.0
@@ -226,6 +586,13 @@ class SupabaseClient:
                 
                 logger.info(f"Total spending query (ALL USERS): template={template_name}, start={start_date}, end={end_date}")
                 
+                rows = await self._rpc_aggregate('expense_total', {
+                    'p_start_date': str(start_date) if start_date else None,
+                    'p_end_date': str(end_date) if end_date else None
+                })
+                if rows is not None:
+                    return [{"total": float(rows[0]['total']) if rows else 0.0}]
+                
                 # Query ALL expenses for date range (not user-specific)
                 query = self.client.table('expenses').select('amount')
                 if start_date:
@@ -233,7 +600,7 @@ class SupabaseClient:
                 if end_date:
                     query = query.lte('expense_date', str(end_date))
                 
-                result = query.execute()
+                result = await self._execute(query)
                 total = sum(float(expense['amount']) for expense in result.data)
                 logger.info(f"Total calculated: ${total} from {len(result.data)} expenses")
                 
@@ -266,6 +633,23 @@ class SupabaseClient:
                 
                 logger.info(f"Category breakdown query (ALL USERS): template={template_name}, start={start_date}, end={end_date}")
                 
+                limit = params[2] if template_name == "top_categories_period" and len(params) >= 3 else None
+                rows = await self._rpc_aggregate('expense_totals_by_category', {
+                    'p_start_date': str(start_date) if start_date else None,
+                    'p_end_date': str(end_date) if end_date else None,
+                    'p_limit': limit
+                })
+                if rows is not None:
+                    return [
+                        {
+                            "category": row['category'],
+                            "total": float(row['total']),
+                            "count": row['count'],
+                            "transactions": row['count']
+                        }
+                        for row in rows
+                    ]
+                
                 # Query ALL expenses with categories (not user-specific)
                 query = self.client.table('expenses').select('amount, categories(name)')
                 if start_date:
@@ -273,7 +657,7 @@ class SupabaseClient:
                 if end_date:
                     query = query.lte('expense_date', str(end_date))
                 
-                result = query.execute()
+                result = await self._execute(query)
                 logger.info(f"Raw query returned {len(result.data)} expenses (ALL USERS)")
                 
                 # Group by category
@@ -298,15 +682,14 @@ class SupabaseClient:
                 ]
                 
                 # Apply limit if this is top_categories_period query
-                if template_name == "top_categories_period" and len(params) >= 3:
-                    limit = params[2]
+                if limit:
                     results = results[:limit]
                     
                 return results
                 
             elif template_name.startswith("custom_month_category_"):
                 # Handle specific month/year queries like "july_2025"
-                from datetime import datetime
+                from datetime import datetime, timedelta
                 import calendar
                 
                 # Extract month and year from params
@@ -335,12 +718,22 @@ class SupabaseClient:
                 
                 logger.info(f"Custom month query: {month_name} {year} ({start_date} to {end_date})")
                 
+                rows = await self._rpc_aggregate('expense_totals_by_category', {
+                    'p_start_date': str(start_date),
+                    'p_end_date': str(end_date - timedelta(days=1))
+                })
+                if rows is not None:
+                    return [
+                        {"category": row['category'], "total": float(row['total']), "count": row['count']}
+                        for row in rows
+                    ]
+                
                 # Query expenses for specific month
                 query = self.client.table('expenses').select('amount, categories(name)')
                 query = query.gte('expense_date', str(start_date))
                 query = query.lt('expense_date', str(end_date))
                 
-                result = query.execute()
+                result = await self._execute(query)
                 logger.info(f"Custom month query returned {len(result.data)} expenses")
                 
                 # Group by category
@@ -364,7 +757,7 @@ class SupabaseClient:
                 
             elif template_name.startswith("custom_month_budget_"):
                 # Handle specific month/year budget vs spending analysis
-                from datetime import datetime
+                from datetime import datetime, timedelta
                 import calendar
                 
                 # Extract month and year from params
@@ -386,9 +779,24 @@ class SupabaseClient:
                 
                 logger.info(f"Custom month budget query: {month_name} {year}")
                 
+                # Spending window for the specific month
+                start_date = datetime(year, month_num, 1).date()
+                if month_num == 12:
+                    end_date = datetime(year + 1, 1, 1).date()
+                else:
+                    end_date = datetime(year, month_num + 1, 1).date()
+                
+                # Static budget table: no month/year filter
+                rows = await self._rpc_aggregate('budget_vs_spending', {
+                    'p_start_date': str(start_date),
+                    'p_end_date': str(end_date - timedelta(days=1))
+                })
+                if rows is not None:
+                    return self._format_budget_rows(rows)
+                
                 # Get ALL budgets (static/fixed budget table)
                 budgets_query = self.client.table('budgets').select('category_id, amount, categories(name)')
-                budgets_result = budgets_query.execute()
+                budgets_result = await self._execute(budgets_query)
                 
                 logger.info(f"Found {len(budgets_result.data)} budget entries in static table")
                 
@@ -396,16 +804,10 @@ class SupabaseClient:
                     return []
                 
                 # Get spending for the specific month
-                start_date = datetime(year, month_num, 1).date()
-                if month_num == 12:
-                    end_date = datetime(year + 1, 1, 1).date()
-                else:
-                    end_date = datetime(year, month_num + 1, 1).date()
-                
                 spending_query = self.client.table('expenses').select('category_id, amount')
                 spending_query = spending_query.gte('expense_date', str(start_date))
                 spending_query = spending_query.lt('expense_date', str(end_date))
-                spending_result = spending_query.execute()
+                spending_result = await self._execute(spending_query)
                 
                 logger.info(f"Found {len(spending_result.data)} expense entries for {month_name} {year}")
                 
@@ -451,11 +853,18 @@ class SupabaseClient:
                 
                 logger.info(f"Querying budgets for month={current_month}, year={current_year}")
                 
+                rows = await self._rpc_aggregate('budget_total', {
+                    'p_month': current_month,
+                    'p_year': current_year
+                })
+                if rows is not None:
+                    return [{"total": float(rows[0]['total']) if rows else 0.0}]
+                
                 # Get all budgets for current month/year
                 budgets_query = self.client.table('budgets').select('amount')
                 budgets_query = budgets_query.eq('month', current_month)
                 budgets_query = budgets_query.eq('year', current_year)
-                budgets_result = budgets_query.execute()
+                budgets_result = await self._execute(budgets_query)
                 
                 logger.info(f"Found {len(budgets_result.data)} budget entries for month {current_month}/{current_year}")
                 
@@ -474,12 +883,22 @@ class SupabaseClient:
                 today = datetime.now()
                 current_month = today.month
                 current_year = today.year
+                month_start = today.date().replace(day=1)
+                
+                rows = await self._rpc_aggregate('budget_vs_spending', {
+                    'p_start_date': str(month_start),
+                    'p_end_date': str(today.date()),
+                    'p_month': current_month,
+                    'p_year': current_year
+                })
+                if rows is not None:
+                    return self._format_budget_rows(rows)
                 
                 # Get budgets for current month/year
                 budgets_query = self.client.table('budgets').select('category_id, amount, categories(name)')
                 budgets_query = budgets_query.eq('month', current_month)
                 budgets_query = budgets_query.eq('year', current_year)
-                budgets_result = budgets_query.execute()
+                budgets_result = await self._execute(budgets_query)
                 
                 logger.info(f"Found {len(budgets_result.data)} budget entries for month {current_month}/{current_year}")
                 
@@ -487,11 +906,10 @@ class SupabaseClient:
                     return []
                 
                 # Get spending for current month
-                month_start = today.date().replace(day=1)
                 spending_query = self.client.table('expenses').select('category_id, amount')
                 spending_query = spending_query.gte('expense_date', str(month_start))
                 spending_query = spending_query.lte('expense_date', str(today.date()))
-                spending_result = spending_query.execute()
+                spending_result = await self._execute(spending_query)
                 
                 logger.info(f"Found {len(spending_result.data)} expense entries for current month")
                 
@@ -537,7 +955,7 @@ class SupabaseClient:
                 if start_date:
                     query = query.gte('expense_date', start_date)
                 
-                result = query.order('expense_date', desc=True).limit(limit).execute()
+                result = await self._execute(query.order('expense_date', desc=True).limit(limit))
                 
                 return [
                     {
@@ -551,8 +969,9 @@ class SupabaseClient:
                 ]
                 
             elif template_name == "dynamic_sql":
-                # Handle dynamic SQL generated queries - TRULY GENERIC APPROACH
-                logger.info(f"Executing dynamic SQL: {sql[:200]}...")
+                # Fallback when run_readonly_sql isn't deployed: interpret the SQL's
+                # date range, category and aggregate in Python
+                logger.debug("Executing dynamic SQL: %s", preview(sql, chars=200))
                 
                 # Check if this is a budget query
                 if "FROM budgets" in sql or "FROM budgets b" in sql or "budgets b" in sql:
@@ -658,7 +1077,7 @@ class SupabaseClient:
                         query = query.lt('expense_date', str(end_date))
                     
                     # Execute base query
-                    result = query.execute()
+                    result = await self._execute(query)
                     logger.info(f"Dynamic SQL: Found {len(result.data)} expenses in date range")
                     
                     # Filter and process results
@@ -735,6 +1154,19 @@ class SupabaseClient:
             logger.error(f"Raw SQL execution error: {e}")
             return []
     
+    def _format_budget_rows(self, rows: List[Dict]) -> List[Dict]:
+        """Normalize budget_vs_spending RPC rows (numeric columns arrive as JSON numbers or strings)"""
+        return [
+            {
+                "category_name": row['category_name'],
+                "budget": float(row['budget']),
+                "spent": float(row['spent']),
+                "remaining": float(row['remaining']),
+                "percent_used": float(row['percent_used'])
+            }
+            for row in rows
+        ]
+    
     async def _execute_budget_query(self, sql: str, question: Optional[str] = None) -> List[Dict]:
         """
         Execute a SQL query against the budgets table using RAW SQL
@@ -743,7 +1175,7 @@ class SupabaseClient:
         import re
         from datetime import datetime
         
-        logger.info(f"Executing budget query with RAW SQL: {sql[:200]}...")
+        logger.debug("Executing budget query with RAW SQL: %s", preview(sql, chars=200))
         
         try:
             # Use Supabase RPC to execute raw SQL
@@ -776,7 +1208,7 @@ class SupabaseClient:
                 logger.info(f"Filtering by year: {current_year}")
             
             # Execute query
-            result = query.execute()
+            result = await self._execute(query)
             logger.info(f"Budget query returned {len(result.data)} rows")
             
             # Process results based on SQL structure
@@ -832,7 +1264,7 @@ class SupabaseClient:
             if end_date:
                 query = query.lte('expense_date', end_date)
                 
-            result = query.limit(limit).execute()
+            result = await self._execute(query.limit(limit))
             return result.data if result.data else []
             
         except Exception as e:
@@ -855,9 +1287,9 @@ class SupabaseClient:
     async def get_budgets_for_month(self, year: int, month: int) -> List[Dict]:
         """Get budget entries for a specific month"""
         try:
-            result = self.client.table('budgets').select(
+            result = await self._execute(self.client.table('budgets').select(
                 '*, categories(name)'
-            ).eq('year', year).eq('month', month).execute()
+            ).eq('year', year).eq('month', month))
             
             return result.data if result.data else []
             
@@ -872,11 +1304,15 @@ class SupabaseClient:
     ) -> Dict:
         """Update an expense (with user ownership check)"""
         try:
-            result = self.client.table('expenses').update(updates).eq(
+            result = await self._execute(self.client.table('expenses').update(updates).eq(
                 'id', expense_id
-            ).eq('user_id', user_id).execute()
+            ).eq('user_id', user_id))
             
             if result.data:
+                # The previous expense_date isn't returned, so a date change invalidates everything
+                self._notify_expense_write(
+                    None if 'expense_date' in updates else [row.get('expense_date') for row in result.data]
+                )
                 return result.data[0]
             else:
                 raise Exception("Expense not found or not owned by user")
@@ -887,9 +1323,11 @@ class SupabaseClient:
     async def delete_expense(self, expense_id: int, user_id: int) -> bool:
         """Delete an expense (with user ownership check)"""
         try:
-            result = self.client.table('expenses').delete().eq(
+            result = await self._execute(self.client.table('expenses').delete().eq(
                 'id', expense_id
-            ).eq('user_id', user_id).execute()
+            ).eq('user_id', user_id))
+            if result.data:
+                self._notify_expense_write([row.get('expense_date') for row in result.data])
             
             return len(result.data) > 0
             
@@ -899,10 +1337,11 @@ class SupabaseClient:
     async def create_category(self, name: str, description: Optional[str] = None) -> Dict:
         """Create a new category"""
         try:
-            result = self.client.table('categories').insert({
+            result = await self._execute(self.client.table('categories').insert({
                 'name': name,
                 'description': description
-            }).execute()
+            }))
+            self.invalidate_categories()
             
             if result.data:
                 return result.data[0]
@@ -915,9 +1354,9 @@ class SupabaseClient:
     async def get_conversation_state(self, chat_id: int) -> Optional[Dict]:
         """Get conversation state for a chat"""
         try:
-            result = self.client.table('conversation_state').select('*').eq(
+            result = await self._execute(self.client.table('conversation_state').select('*').eq(
                 'chat_id', chat_id
-            ).single().execute()
+            ).single())
             
             return result.data if result.data else None
             
@@ -932,12 +1371,12 @@ class SupabaseClient:
     ) -> None:
         """Update conversation state"""
         try:
-            self.client.table('conversation_state').upsert({
+            await self._execute(self.client.table('conversation_state').upsert({
                 'chat_id': chat_id,
                 'last_status': status,
                 'payload': payload,
                 'updated_at': datetime.now().isoformat()
-            }, on_conflict='chat_id').execute()
+            }, on_conflict='chat_id'))
             
         except Exception as e:
             raise Exception(f"Database error updating conversation state: {str(e)}")
\ No newline at end of file
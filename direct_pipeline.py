@@ -0,0 +1,111 @@
+"""
+Direct expense pipeline for FinAIssistant
+Plain expense entries are parsed with the local grammar, classified and inserted
+in-process with no LLM call. Anything that isn't confidently an expense returns
+None so the caller can hand it to the agent. Imports nothing heavy, so the bot
+can use it while the agent is still loading
+"""
+import os
+import re
+from typing import List, Optional
+
+# Classification confidence needed to insert without asking the agent
+DEFAULT_MIN_CONFIDENCE = 0.8
+
+# Parsed amounts above this are rejected (usually a year or an id, not an expense)
+MAX_EXPENSE_AMOUNT = 5000
+
+# A 20xx after a month name or a date preposition reads as a year, not an amount
+YEAR_IN_DATE_CONTEXT = (
+    r'\b(january|february|march|april|may|june|july|august|september|october|november|december'
+    r'|enero|febrero|marzo|abril|mayo|junio|julio|agosto|septiembre|setiembre|octubre|noviembre|diciembre'
+    r'|in|en|de|del|during|durante|since|desde)\s*,?\s+20\d{2}\b'
+)
+
+def looks_like_question(text: str) -> bool:
+    """True when the text reads like a question about expenses rather than an entry"""
+    # Enhanced logic to avoid parsing questions as expenses
+    text_lower = text.lower().strip()
+
+    # Check if this looks like a question rather than an expense
+    # IMPORTANT: Only reject if it's CLEARLY a question, not just mentioning spending
+    # Removed 'spent', 'expenses' from indicators as they're commonly used in expense entries
+    question_indicators = [
+        'give me', 'show me', 'tell me', 'what is', 'what are', 'what was', 'what were',
+        'how much', 'how many', 'when did', 'where did', 'why did',
+        'total', 'breakdown', 'analysis', 'compare', 'comparison', 'summary', 'report',
+        'list all', 'list my', 'list the', 'show all', 'show my', 'show the'
+    ]
+
+    # Only reject if it matches a clear question pattern
+    # Check for question words at the start or combined with specific patterns
+    is_question = False
+    for indicator in question_indicators:
+        if indicator in text_lower:
+            # Additional check: make sure it's not just "spent" with amount
+            # e.g., "spent 155" is an expense, but "what did I spend" is a question
+            if indicator in ['give me', 'show me', 'tell me', 'what', 'how', 'list', 'breakdown']:
+                is_question = True
+                break
+
+    if is_question:
+        return True
+
+    # A year only suggests analysis in date context ("july 2025", "in 2024", "2025?");
+    # "rent 2000" is an expense of 2000
+    if re.search(YEAR_IN_DATE_CONTEXT, text_lower) or re.fullmatch(r'\s*20\d{2}\s*\??', text_lower):
+        return True
+
+    return False
+
+class DirectPipeline:
+    """
+    Local parse -> classification -> single round-trip insert
+    Args:
+        min_confidence: classifier confidence required (DIRECT_MIN_CONFIDENCE)
+    """
+    def __init__(self, db_client, classifier, parser, min_confidence: Optional[float] = None):
+        self.db_client = db_client
+        self.classifier = classifier
+        self.parser = parser
+        self.enabled = os.getenv('DIRECT_PIPELINE', '1') != '0'
+        self.min_confidence = float(os.getenv('DIRECT_MIN_CONFIDENCE', DEFAULT_MIN_CONFIDENCE)) if min_confidence is None else min_confidence
+
+    async def process(self, message: str, user_id: Optional[int], history: List) -> Optional[str]:
+        """
+        Save a plain expense entry and return the confirmation. Returns None
+        (agent fallback) unless every step is confident
+        """
+        if not user_id:
+            return None
+        # The agent asked something last turn (e.g. which category): let it keep the thread
+        if history and history[-1][1].rstrip().endswith('?'):
+            return None
+        if looks_like_question(message):
+            return None
+
+        parsed = self.parser.parse_expense_text_local(message)
+        if not parsed or parsed['amount'] > MAX_EXPENSE_AMOUNT:
+            return None
+
+        categories = await self.db_client.get_categories()
+        classification = await self.classifier.classify_expense(
+            parsed['merchant'], categories, parsed.get('category')
+        )
+        if not classification.get('category_id') or classification.get('confidence', 0.0) < self.min_confidence:
+            return None
+
+        description = parsed.get('detail') or parsed['merchant']
+        currency = parsed.get('currency', 'MXN')
+        await self.db_client.insert_expense_for_telegram_user(
+            telegram_id=int(user_id),
+            category=classification['category_id'],
+            merchant=description,
+            amount=parsed['amount'],
+            currency=currency
+        )
+        return (
+            f"✅ Expense saved!\n\n"
+            f"💳 {description} — ${parsed['amount']:.2f} {currency}\n"
+            f"🏷 Category: {classification['category_name']}"
+        )
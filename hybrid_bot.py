@@ -11,13 +11,21 @@ from pathlib import Path
 
 from dotenv import load_dotenv
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup
+from telegram.constants import ChatAction
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, ContextTypes, filters
 
 from database import SupabaseClient
 from classifier import ExpenseClassifier
 from parser import ExpenseParser
-from currency import CurrencyConverter
-from agent import FinAIAgent
+from currency import CurrencyConverter, RateRefreshJob, rate_provider_from_env
+from memory import ConversationMemory
+from direct_pipeline import DirectPipeline
+from startup import Readiness
+from instrumentation import metrics
+from streaming import StreamingReply
+from concurrency import ChatUpdateProcessor
+from webhook import WebhookApp, serve
+from structured_logging import configure_logging
 
 # Load environment variables
 env_path = Path(__file__).parent / "api.env"
@@ -26,11 +34,8 @@ if env_path.exists():
 else:
     load_dotenv()
 
-# Configure logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+# Configure logging (queued writer, LOG_LEVEL / LOG_FORMAT=json, capped messages)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 # Global components
@@ -38,12 +43,27 @@ db_client = None
 classifier = None
 parser = None
 converter = None
+rate_refresh = None
+conversation_memory = None
+direct_pipeline = None
 hybrid_agent = None
 pending_expenses = {}
+readiness = Readiness()
+
+STARTING_TEXT = (
+    "⏳ I'm still starting up. Expenses like 'Costco 120.54' already work; "
+    "please ask that again in a few seconds!"
+)
+AGENT_UNAVAILABLE_TEXT = (
+    "⚠️ AI answers are unavailable right now. Expenses like 'Costco 120.54' still work!"
+)
 
 async def initialize_components():
-    """Initialize all components including hybrid AI agent"""
-    global db_client, classifier, parser, converter, hybrid_agent
+    """
+    Core stage: everything the bot needs to accept updates and save plain expenses.
+    The LangChain agent is loaded in the background afterwards (load_agent)
+    """
+    global db_client, classifier, parser, converter, rate_refresh, conversation_memory, direct_pipeline
     
     required_vars = ['TELEGRAM_BOT_TOKEN', 'SUPABASE_URL', 'SUPABASE_SERVICE_ROLE_KEY', 'OPENAI_API_KEY']
     missing = [var for var in required_vars if not os.getenv(var)]
@@ -56,15 +76,85 @@ async def initialize_components():
     classifier = ExpenseClassifier(db_client)
     parser = ExpenseParser()
     converter = CurrencyConverter(db_client)
+    conversation_memory = ConversationMemory(db_client)
+    direct_pipeline = DirectPipeline(db_client, classifier, parser)
+    
+    # Scheduled FX refresh (CURRENCY_RATES_FILE or CURRENCY_RATES_PROVIDER=stub)
+    provider = rate_provider_from_env()
+    if provider:
+        rate_refresh = RateRefreshJob(converter, provider)
+        rate_refresh.start()
+        logger.info(f"💱 Currency rates refresh every {rate_refresh.interval:.0f}s from {type(provider).__name__}")
+    
+    # Gauges next to the per-call-site timings on /metrics
+    metrics.register_collector('memory', conversation_memory.stats)
+    metrics.register_collector('category_cache', db_client.category_cache_stats)
+    metrics.register_collector('startup', lambda: {'agent_ready': readiness.is_ready})
+    
+    readiness.mark('core')
+    readiness.load_in_background(load_agent)
+    logger.info("✅ Core components ready, loading the AI agent in the background")
+
+async def load_agent():
+    """Agent stage: import langchain/langgraph and build FinAIAgent off the event loop"""
+    global hybrid_agent
+    
+    def build():
+        from agent import FinAIAgent
+        return FinAIAgent(db_client, classifier, parser, memory=conversation_memory)
     
     # Initialize LangChain AI agent with tools
-    hybrid_agent = FinAIAgent(db_client, classifier, parser)
+    hybrid_agent = await asyncio.to_thread(build)
+    metrics.register_collector('llm', hybrid_agent.llm_metrics)
+    sql_tool = next(tool for tool in hybrid_agent.tools if tool.name == 'sql_query')
+    metrics.register_collector('sql_validator', sql_tool.validator.stats)
+    metrics.register_collector('sql_cache', sql_tool.sql_cache.stats)
     
     logger.info("🚀 FinAIssistant LangChain Agent initialized!")
     logger.info("🔧 LangChain tools: ParseExpense, ClassifyExpense, InsertExpense, SqlQuery")
     logger.info("🧠 AI-powered decision making between expense parsing and question answering")
     logger.info("✅ All components ready")
 
+async def wait_for_agent(message):
+    """
+    The agent, once loaded. While starting, waits up to STARTUP_AGENT_WAIT seconds;
+    if it still isn't there the user is told so and None is returned
+    """
+    if hybrid_agent is None and not await readiness.wait_ready():
+        await message.reply_text(AGENT_UNAVAILABLE_TEXT if readiness.stage == 'failed' else STARTING_TEXT)
+        return None
+    return hybrid_agent
+
+async def answer_while_starting(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str) -> bool:
+    """
+    Before the agent has loaded: plain expenses are saved by the direct pipeline,
+    anything else waits for the agent. Returns True when the update was answered here
+    """
+    chat_id = update.effective_chat.id
+    history = await conversation_memory.get(chat_id)
+    response = None
+    if direct_pipeline.enabled:
+        try:
+            response = await direct_pipeline.process(text, update.effective_user.id, history)
+        except Exception as e:
+            logger.error(f"Direct pipeline error during startup: {e}")
+    if response:
+        await conversation_memory.append(chat_id, text, response)
+        await update.message.reply_text(f"🤖 {response}", parse_mode='Markdown')
+        return True
+    
+    await context.bot.send_chat_action(chat_id, ChatAction.TYPING)
+    return await wait_for_agent(update.message) is None
+
+async def shutdown_components():
+    """Stop background jobs and flush state once the Application has stopped"""
+    if rate_refresh:
+        await rate_refresh.stop()
+    if conversation_memory:
+        await conversation_memory.close()
+    if db_client:
+        db_client.close()
+
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Enhanced start command with quick analysis"""
     user = update.effective_user
@@ -109,9 +199,12 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def quick_analysis_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Process quick analysis request using LangChain agent"""
     user_id = update.effective_user.id
+    agent = await wait_for_agent(update.message)
+    if agent is None:
+        return
     
     # Use LangChain agent to handle the request
-    response = await hybrid_agent.process_message("Show me quick analysis options", user_id)
+    response = await agent.process_message("Show me quick analysis options", user_id)
     
     await update.message.reply_text(
         "📊 **Quick Analysis**\n\n"
@@ -127,16 +220,32 @@ async def quick_analysis_command(update: Update, context: ContextTypes.DEFAULT_T
 async def insights_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Generate AI insights about spending"""
     user_id = update.effective_user.id
+    agent = await wait_for_agent(update.message)
+    if agent is None:
+        return
     
     await update.message.reply_text("🧠 Analyzing your spending patterns with AI...")
     
     try:
-        insights = await hybrid_agent.get_expense_insights(str(user_id))
+        insights = await agent.get_expense_insights(str(user_id))
         await update.message.reply_text(insights, parse_mode='Markdown')
     except Exception as e:
         logger.error(f"Error generating insights: {e}")
         await update.message.reply_text("❌ Couldn't generate insights right now. Try again later!")
 
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Per-call-site latency and token counts (only for STATS_ADMIN_IDS when set)"""
+    admins = {item.strip() for item in os.getenv('STATS_ADMIN_IDS', '').split(',') if item.strip()}
+    if admins and str(update.effective_user.id) not in admins:
+        return
+    
+    lines = [f"📈 **Bot stats** (startup: {readiness.stage})"]
+    if hybrid_agent:
+        llm = hybrid_agent.llm_metrics()
+        lines.append(f"🤖 Agent runs: {llm['runs']}, in flight {llm['in_flight']}, waiting {llm['waiting']}")
+    lines.append(f"```\n{metrics.summary()}\n```")
+    await update.message.reply_text('\n'.join(lines), parse_mode='Markdown')
+
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Enhanced help with hybrid capabilities"""
     help_text = """🤖 **FinAIssistant Hybrid Help**
@@ -210,31 +319,49 @@ async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE
     elif text == '💡 Insights':
         return await insights_command(update, context)
     
+    # Still starting up: cheap paths only until the agent has loaded
+    if hybrid_agent is None and await answer_while_starting(update, context, text):
+        return
+    
     # Process with LangChain AI agent
+    # Streaming mode: typing indicator now, then a placeholder edited with tool progress
+    # and the answer as it streams (STREAM_REPLIES=0 waits for the whole reply)
+    streamer = None
+    if os.getenv('STREAM_REPLIES', '1') != '0':
+        streamer = StreamingReply(context.bot, chat_id, is_group=update.effective_chat.type != 'private')
+        await streamer.start()
     try:
         # LangChain agent will decide which tool to use (with conversation memory)
-        response = await hybrid_agent.process_message(text, user_id=user_id, chat_id=chat_id)
+        response = await hybrid_agent.process_message(
+            text, user_id=user_id, chat_id=chat_id,
+            on_progress=streamer.on_progress if streamer else None
+        )
         
         if response and isinstance(response, str):
             # Direct response from agent
-            await update.message.reply_text(f"🤖 {response}", parse_mode='Markdown')
+            if not (streamer and await streamer.finish(f"🤖 {response}", parse_mode='Markdown')):
+                await update.message.reply_text(f"🤖 {response}", parse_mode='Markdown')
         else:
-            await update.message.reply_text(
+            fallback_text = (
                 "🤔 I didn't quite understand that. Try asking:\n"
                 "• 'Add expense: Costco 120.54'\n"
                 "• 'Show my spending this month'\n"
                 "• 'What did I spend on restaurants?'\n"
                 "• 'Break down expenses by category'"
             )
+            if not (streamer and await streamer.finish(fallback_text)):
+                await update.message.reply_text(fallback_text)
             
     except Exception as e:
         logger.error(f"LangChain agent error: {e}")
-        await update.message.reply_text(
+        error_text = (
             "❌ I encountered an error processing that. Try:\n"
             "• Asking a simpler question\n" 
             "• Being more specific about what you want\n"
             "• Or just tell me about an expense like 'Costco 50.25'!"
         )
+        if not (streamer and await streamer.finish(error_text)):
+            await update.message.reply_text(error_text)
 
 async def handle_expense_result(update: Update, context: ContextTypes.DEFAULT_TYPE, result: dict, chat_id: int, user_id: str):
     """Handle expense entry from hybrid AI processing"""
@@ -275,11 +402,9 @@ async def handle_expense_result(update: Update, context: ContextTypes.DEFAULT_TY
         )
     else:
         # Auto-save with high confidence
-        user_data = await db_client.get_user_by_telegram_id(int(user_id))
-        
-        await db_client.insert_expense(
-            user_id=user_data['id'],
-            category_id=classification['category_id'],
+        await db_client.insert_expense_for_telegram_user(
+            telegram_id=int(user_id),
+            category=classification['category_id'],
             merchant=merchant,
             amount=amount,
             currency=currency
@@ -321,11 +446,15 @@ async def handle_quick_analysis_callback(update: Update, context: ContextTypes.D
         )
         return
     
+    agent = await wait_for_agent(query.message)
+    if agent is None:
+        return
+    
     # Process through LangChain agent
     await query.edit_message_text("🤖 Processing with AI agent...")
     
     try:
-        response = await hybrid_agent.process_message("Show me spending analysis", user_id)
+        response = await agent.process_message("Show me spending analysis", user_id)
         if response and isinstance(response, str):
             await query.edit_message_text(f"🤖 {response}", parse_mode='Markdown')
         else:
@@ -356,21 +485,18 @@ async def handle_category_selection(update: Update, context: ContextTypes.DEFAUL
     category_id = choice
     
     try:
-        # Get user data
-        user_data = await db_client.get_user_by_telegram_id(int(pending['user_id']))
-        
-        # Save expense
-        await db_client.insert_expense(
-            user_id=user_data['id'],
-            category_id=category_id,
+        # Save expense (user lookup + insert in one round trip)
+        await db_client.insert_expense_for_telegram_user(
+            telegram_id=int(pending['user_id']),
+            category=category_id,
             merchant=pending['merchant'],
             amount=pending['amount'],
             currency=pending['currency']
         )
         
         # Get category name for display
-        categories = await db_client.get_categories()
-        category_name = next((cat['name'] for cat in categories if cat['id'] == category_id), 'Unknown')
+        category = await db_client.get_category_by_id(category_id)
+        category_name = category['name'] if category else 'Unknown'
         
         formatted_amount = converter.format_amount(pending['amount'], pending['currency'])
         
@@ -393,17 +519,27 @@ def main():
         logger.error("TELEGRAM_BOT_TOKEN not found in environment")
         sys.exit(1)
     
-    app = Application.builder().token(token).build()
+    # Different chats are handled concurrently; each chat's updates keep their order
+    processor = ChatUpdateProcessor()
+    app = Application.builder().token(token).concurrent_updates(processor).build()
+    metrics.register_collector('updates', processor.stats)
     
     # Add handlers
     app.add_handler(CommandHandler("start", start_command))
     app.add_handler(CommandHandler("help", help_command))
     app.add_handler(CommandHandler("quick", quick_analysis_command))
     app.add_handler(CommandHandler("insights", insights_command))
+    app.add_handler(CommandHandler("stats", stats_command))
     app.add_handler(CallbackQueryHandler(handle_category_selection, pattern=r'^cat:'))
     app.add_handler(CallbackQueryHandler(handle_quick_analysis_callback, pattern=r'^(quick:|custom_query|cancel)'))
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text_message))
     
+    # Webhook mode: Telegram pushes updates to an ASGI app served on $PORT
+    if os.getenv('WEBHOOK_URL'):
+        logger.info("🌐 Starting in webhook mode")
+        asyncio.run(serve(WebhookApp(app, on_startup=initialize_components, on_shutdown=shutdown_components)))
+        return
+    
     async def start_bot():
         await initialize_components()
         await app.initialize()
@@ -426,6 +562,7 @@ def main():
             await app.updater.stop()
             await app.stop()
             await app.shutdown()
+            await shutdown_components()
     
     asyncio.run(start_bot())
 
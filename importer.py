@@ -0,0 +1,442 @@
+"""
+Bulk expense import for FinAIssistant
+Streams CSV or OFX bank statements into the expenses table: rows are read
+incrementally, classified with ExpenseClassifier against one category list,
+converted to MXN with one currency-rate snapshot and written with chunked
+multi-row inserts, so memory stays bounded by the chunk size.
+
+Usage: python importer.py statement.csv --telegram-id 123456 [--format ofx] [--dry-run]
+"""
+import argparse
+import asyncio
+import csv
+import logging
+import re
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Rows per multi-row insert request
+DEFAULT_CHUNK_SIZE = 500
+
+# Insert requests allowed in flight while the next chunk is being prepared
+DEFAULT_MAX_IN_FLIGHT = 2
+
+# Classifier confidence below which a row goes to the fallback category. Lower than the
+# chat threshold (0.7): containment scores shrink with the long descriptors banks use
+# ("COSTCO WHOLESALE" scores 0.375 for 'costco')
+DEFAULT_MIN_CONFIDENCE = 0.25
+
+# Store numbers, reference codes (two or more digits) and separators stripped from
+# descriptors before classifying; one-digit names like 7ELEVEN are kept
+_DESCRIPTOR_NOISE = re.compile(r'[#*]|\b(?=\w*\d\w*\d)\w+\b|\.com\b', re.IGNORECASE)
+
+# Per-row errors kept in the report (the total is always counted)
+MAX_REPORTED_ERRORS = 100
+
+# Header names recognised in bank CSV exports (lowercased)
+CSV_COLUMNS = {
+    'date': ('date', 'fecha', 'transaction date', 'posted date', 'posting date', 'fecha operacion', 'fecha de operacion'),
+    'description': ('description', 'descripcion', 'descripción', 'merchant', 'payee', 'name', 'concepto', 'detalle', 'memo'),
+    'amount': ('amount', 'monto', 'importe', 'cargo', 'debit', 'withdrawal', 'cad$', 'usd$'),
+    'currency': ('currency', 'moneda', 'divisa'),
+}
+
+# Amount columns that list charges as positive numbers; they are negated so a debit
+# is negative in every statement, as in OFX
+DEBIT_COLUMNS = ('cargo', 'debit', 'withdrawal')
+
+DATE_FORMATS = ('%Y-%m-%d', '%m/%d/%Y', '%d/%m/%Y', '%Y/%m/%d', '%d-%m-%Y', '%Y%m%d')
+
+# Rows buffered while looking for a date that fixes the file's day/month order
+DATE_DETECTION_ROWS = 1000
+
+@dataclass
+class StatementRow:
+    """One transaction read from a statement (line is 1-based in the source file)"""
+    line: int
+    expense_date: str
+    description: str
+    amount: float
+    currency: Optional[str] = None
+
+@dataclass
+class RowError:
+    """A statement row that couldn't be parsed"""
+    line: int
+    message: str
+
+@dataclass
+class ImportReport:
+    rows_read: int = 0
+    rows_prepared: int = 0
+    rows_inserted: int = 0
+    rows_skipped: int = 0
+    low_confidence: int = 0
+    error_count: int = 0
+    errors: List[Tuple[int, str]] = field(default_factory=list)
+    started_at: float = field(default_factory=time.perf_counter)
+    elapsed: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows_read / self.elapsed if self.elapsed else 0.0
+
+    def add_error(self, line: int, message: str):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+    def summary(self) -> str:
+        return (f"{self.rows_read} rows read, {self.rows_prepared} prepared, {self.rows_inserted} inserted, "
+                f"{self.rows_skipped} skipped, "
+                f"{self.low_confidence} low-confidence, {self.error_count} errors "
+                f"in {self.elapsed:.1f}s ({self.rows_per_second:.0f} rows/s)")
+
+def parse_amount(value: str) -> float:
+    """'1,234.56', '-45.00', '(45.00)', '$12', '1.234,56' -> float (sign kept)"""
+    text = value.strip().replace(' ', '')
+    negative = text.startswith('-') or (text.startswith('(') and text.endswith(')'))
+    text = re.sub(r'[^\d.,]', '', text)
+    if not text:
+        raise ValueError(f"invalid amount {value!r}")
+    if ',' in text and '.' in text:
+        # The right-most separator is the decimal one
+        if text.rfind(',') > text.rfind('.'):
+            text = text.replace('.', '').replace(',', '.')
+        else:
+            text = text.replace(',', '')
+    elif ',' in text:
+        head, _, tail = text.rpartition(',')
+        text = head.replace(',', '') + ('.' if len(tail) <= 2 else '') + tail
+    amount = float(text)
+    return -amount if negative else amount
+
+def parse_date(value: str, date_format: Optional[str] = None) -> str:
+    value = value.strip()
+    formats = (date_format,) if date_format else DATE_FORMATS
+    for fmt in formats:
+        try:
+            return datetime.strptime(value, fmt).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+    raise ValueError(f"unrecognised date {value!r}")
+
+def date_formats_matching(value: str) -> List[str]:
+    """Every DATE_FORMATS entry that parses `value` ('03/04/2025' matches two)"""
+    matching = []
+    for fmt in DATE_FORMATS:
+        try:
+            datetime.strptime(value.strip(), fmt)
+        except ValueError:
+            continue
+        matching.append(fmt)
+    return matching
+
+def detect_date_format(values: Iterable[str]) -> Optional[str]:
+    """
+    The one format every parseable value fits, chosen from the first unambiguous
+    value; None if they all read the same under each remaining format. Raises
+    ValueError when the day/month order can't be told
+    """
+    candidates: Optional[List[str]] = None
+    parsed = []
+    for value in values:
+        matching = date_formats_matching(value)
+        if not matching:
+            continue
+        parsed.append(value)
+        candidates = [fmt for fmt in (candidates or matching) if fmt in matching] or candidates
+        if len(candidates) == 1:
+            return candidates[0]
+    if candidates and len({tuple(parse_date(value, fmt) for value in parsed) for fmt in candidates}) > 1:
+        raise ValueError(f"ambiguous day/month order in dates like {parsed[0]!r}; pass --date-format, "
+                         f"e.g. {' or '.join(candidates)}")
+    return candidates[0] if candidates else None
+
+def read_csv(stream: TextIO, date_format: Optional[str] = None) -> Iterator[Union[StatementRow, RowError]]:
+    """
+    Yield statement rows from a bank CSV export (header row required)
+    Without `date_format`, one format is chosen for the whole file from the first
+    unambiguous date (up to DATE_DETECTION_ROWS rows are buffered until then).
+    Amounts are signed: money out is negative. Rows that can't be parsed are
+    yielded as RowError
+    """
+    reader = csv.reader(stream)
+    header = next(reader, None)
+    if not header:
+        return
+    lowered = [h.strip().lower() for h in header]
+    columns = {}
+    for key, names in CSV_COLUMNS.items():
+        for i, name in enumerate(lowered):
+            if name in names:
+                columns[key] = i
+                break
+    missing = [key for key in ('date', 'description', 'amount') if key not in columns]
+    if missing:
+        raise ValueError(f"CSV header is missing {', '.join(missing)} column(s): {header}")
+    sign = -1 if lowered[columns['amount']] in DEBIT_COLUMNS else 1
+
+    def to_row(line: int, record: List[str]) -> Union[StatementRow, RowError]:
+        try:
+            currency = record[columns['currency']].strip().upper() if 'currency' in columns else ''
+            return StatementRow(
+                line=line,
+                expense_date=parse_date(record[columns['date']], date_format),
+                description=record[columns['description']].strip(),
+                amount=sign * parse_amount(record[columns['amount']]),
+                currency=currency or None
+            )
+        except (ValueError, IndexError) as e:
+            return RowError(line, str(e))
+
+    records = ((line, record) for line, record in enumerate(reader, start=2) if any(cell.strip() for cell in record))
+    if not date_format:
+        buffered = []
+        for line, record in records:
+            buffered.append((line, record))
+            if len(buffered) >= DATE_DETECTION_ROWS or (len(record) > columns['date']
+                                                         and len(date_formats_matching(record[columns['date']])) == 1):
+                break
+        date_format = detect_date_format(record[columns['date']] for _, record in buffered
+                                         if len(record) > columns['date'])
+        for line, record in buffered:
+            yield to_row(line, record)
+
+    for line, record in records:
+        yield to_row(line, record)
+
+_OFX_TAG = re.compile(r'<(/?)([A-Z0-9.]+)>([^<\r\n]*)')
+
+def read_ofx(stream: TextIO) -> Iterator[Union[StatementRow, RowError]]:
+    """
+    Yield <STMTTRN> transactions from an OFX file (SGML 1.x or XML 2.x), line by line
+    Uses the statement's CURDEF as the currency of its transactions
+    """
+    currency = None
+    current: Optional[Dict[str, str]] = None
+    start_line = 0
+    for line_number, line in enumerate(stream, start=1):
+        for closing, tag, value in _OFX_TAG.findall(line):
+            value = value.strip()
+            if tag == 'CURDEF' and value:
+                currency = value.upper()
+            elif tag == 'STMTTRN' and not closing:
+                current, start_line = {}, line_number
+            elif tag == 'STMTTRN' and closing and current is not None:
+                try:
+                    yield StatementRow(
+                        line=start_line,
+                        expense_date=parse_date(current['DTPOSTED'][:8], '%Y%m%d'),
+                        description=(current.get('NAME') or current.get('MEMO') or '').strip(),
+                        amount=parse_amount(current['TRNAMT']),
+                        currency=current.get('CURSYM') or currency
+                    )
+                except (KeyError, ValueError) as e:
+                    yield RowError(start_line, f"{type(e).__name__}: {e}")
+                current = None
+            elif current is not None and not closing and value:
+                current[tag] = value
+
+class BulkImporter:
+    """
+    Streams statement rows into SupabaseClient.insert_expenses
+    Args:
+        negative_is_expense: True (default) imports only negative amounts (debits)
+            as positive expenses, False only positive ones, None keeps every row
+            (abs), including refunds, card payments and other credits
+    """
+    def __init__(
+        self,
+        db_client,
+        classifier,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+        default_currency: str = 'MXN',
+        fallback_category: str = 'Others',
+        min_confidence: float = DEFAULT_MIN_CONFIDENCE,
+        negative_is_expense: Optional[bool] = True,
+        dry_run: bool = False
+    ):
+        self.db_client = db_client
+        self.classifier = classifier
+        self.chunk_size = chunk_size
+        self.max_in_flight = max(1, max_in_flight)
+        self.default_currency = default_currency.upper()
+        self.fallback_category = fallback_category
+        self.min_confidence = min_confidence
+        self.negative_is_expense = negative_is_expense
+        self.dry_run = dry_run
+
+    async def _classify(self, description: str, categories: List[Dict], cache: Dict[str, Tuple]) -> Tuple[Optional[str], bool]:
+        """(category_id, confident) - statements repeat merchants, so results are memoised per description"""
+        cleaned = ' '.join(_DESCRIPTOR_NOISE.sub(' ', description).split()) or description
+        key = self.classifier.normalize_text(cleaned)
+        if key not in cache:
+            result = await self.classifier.classify_expense(cleaned, categories)
+            confident = result.get('category_id') is not None and result.get('confidence', 0.0) >= self.min_confidence
+            cache[key] = (result.get('category_id'), confident)
+        return cache[key]
+
+    async def run(
+        self,
+        rows: Iterable,
+        telegram_id: int,
+        source: str = 'statement',
+        on_progress: Optional[Callable[[ImportReport], None]] = None
+    ) -> ImportReport:
+        report = ImportReport()
+
+        # Everything that would otherwise be fetched per row is loaded once
+        user = await self.db_client.get_user_by_telegram_id(int(telegram_id))
+        if not user:
+            raise ValueError(f"User not found for Telegram ID: {telegram_id}")
+        categories = await self.db_client.get_categories()
+        fallback = next((c for c in categories if c['name'].lower() == self.fallback_category.lower()), None)
+        rates = await self.db_client.get_rate_matrix()
+        classifications: Dict[str, Tuple] = {}
+        timestamp = datetime.now().isoformat()
+        notes = f"Imported from {source}"
+
+        in_flight: List[asyncio.Task] = []
+        chunk: List[Dict] = []
+        chunk_lines: List[int] = []
+
+        async def flush():
+            nonlocal chunk, chunk_lines
+            if not chunk:
+                return
+            batch, lines = chunk, chunk_lines
+            chunk, chunk_lines = [], []
+            report.rows_prepared += len(batch)
+            if self.dry_run:
+                return
+            in_flight.append(asyncio.ensure_future(self._insert(batch, lines, report)))
+            while len(in_flight) >= self.max_in_flight:
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    in_flight.remove(task)
+            if on_progress:
+                on_progress(report)
+
+        for row in rows:
+            report.rows_read += 1
+            if isinstance(row, RowError):
+                report.add_error(row.line, row.message)
+                continue
+
+            amount = row.amount
+            if self.negative_is_expense is True:
+                if amount >= 0:
+                    report.rows_skipped += 1
+                    continue
+            elif self.negative_is_expense is False and amount <= 0:
+                report.rows_skipped += 1
+                continue
+            amount = abs(amount)
+            if not amount or not row.description:
+                report.rows_skipped += 1
+                continue
+
+            category_id, confident = await self._classify(row.description, categories, classifications)
+            if not confident:
+                report.low_confidence += 1
+                if fallback:
+                    category_id = fallback['id']
+            if not category_id:
+                report.add_error(row.line, f"no category for {row.description!r}")
+                continue
+
+            currency = (row.currency or self.default_currency).upper()
+            converted = rates.convert(amount, currency, 'MXN')
+            chunk.append({
+                'user_id': user['id'],
+                'category_id': category_id,
+                'expense_detail': row.description,
+                'amount': round(converted if converted is not None else amount, 2),
+                'original_amount': amount,
+                'original_currency': currency,
+                'currency': 'MXN' if converted is not None else currency,
+                'expense_date': row.expense_date,
+                'paid_by': user.get('name') or 'Unknown User',
+                'timestamp': timestamp,
+                'notes': notes
+            })
+            chunk_lines.append(row.line)
+            if len(chunk) >= self.chunk_size:
+                await flush()
+
+        await flush()
+        if in_flight:
+            await asyncio.gather(*in_flight)
+        report.elapsed = time.perf_counter() - report.started_at
+        if on_progress:
+            on_progress(report)
+        return report
+
+    async def _insert(self, batch: List[Dict], lines: List[int], report: ImportReport):
+        try:
+            inserted = await self.db_client.insert_expenses(batch)
+            report.rows_inserted += inserted
+        except Exception as e:
+            logger.error(f"Chunk of {len(batch)} rows (lines {lines[0]}-{lines[-1]}) failed: {e}")
+            for line in lines:
+                report.add_error(line, str(e))
+
+def open_statement(path: str, file_format: Optional[str] = None, date_format: Optional[str] = None) -> Tuple[Iterator, TextIO]:
+    """Returns (row iterator, open file); the format is taken from the extension unless given"""
+    file_format = (file_format or path.rsplit('.', 1)[-1]).lower()
+    stream = open(path, newline='', encoding='utf-8-sig', errors='replace')
+    if file_format in ('ofx', 'qfx'):
+        return read_ofx(stream), stream
+    return read_csv(stream, date_format), stream
+
+async def _main(args):
+    from dotenv import load_dotenv
+    from database import SupabaseClient
+    from classifier import ExpenseClassifier
+
+    load_dotenv('api.env')
+    db_client = SupabaseClient()
+    importer = BulkImporter(
+        db_client,
+        ExpenseClassifier(db_client),
+        chunk_size=args.chunk_size,
+        default_currency=args.currency,
+        negative_is_expense={'negative': True, 'positive': False, 'all': None}[args.expenses],
+        dry_run=args.dry_run
+    )
+    rows, stream = open_statement(args.path, args.format, args.date_format)
+    try:
+        report = await importer.run(
+            rows, args.telegram_id, source=args.path,
+            on_progress=lambda r: print(f"\r{r.rows_read} rows read, {r.rows_prepared} prepared, {r.rows_inserted} inserted",
+                                        end='', flush=True)
+        )
+    finally:
+        stream.close()
+        db_client.close()
+    print(f"\n{report.summary()}")
+    for line, message in report.errors:
+        print(f"  line {line}: {message}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('path', help='CSV or OFX statement')
+    parser.add_argument('--telegram-id', type=int, required=True, help='Telegram user the expenses belong to')
+    parser.add_argument('--format', choices=['csv', 'ofx'], help='default: from the file extension')
+    parser.add_argument('--currency', default='MXN', help='currency of rows without one (default MXN)')
+    parser.add_argument('--date-format', help='strptime format for CSV dates, e.g. %%d/%%m/%%Y')
+    parser.add_argument('--expenses', choices=['negative', 'positive', 'all'], default='negative',
+                        help='which signed amounts are expenses (default negative: money out; debit/cargo '
+                             'columns count as money out; all also imports refunds and payments)')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--dry-run', action='store_true', help='parse and classify without inserting')
+    asyncio.run(_main(parser.parse_args()))
+
+if __name__ == '__main__':
+    main()
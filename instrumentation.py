@@ -0,0 +1,236 @@
+"""
+Hot-path instrumentation for FinAIssistant
+Latency histograms, call/error counters and OpenAI token counts per call site
+(SupabaseClient methods, agent tools, OpenAI calls, process_message). They are
+rendered in the Prometheus text format for GET /metrics (webhook mode) and
+summarised by the /stats bot command
+"""
+import asyncio
+import functools
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Tuple
+
+# Histogram bucket upper bounds in seconds (cache hits up to agent runs)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+PREFIX = 'finai'
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class Histogram:
+    """Fixed-bucket latency histogram (per-bucket counts, sum and count)"""
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                index = i
+                break
+        self.counts[index] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Estimate (linear within the bucket, like Prometheus histogram_quantile)"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+class Metrics:
+    """
+    Process-wide registry. Sites are dotted names ('supabase.get_categories',
+    'tool.sql_query', 'openai.consult_library'); collectors add gauges from the
+    components' own stats() dicts at render time
+    """
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.enabled = os.getenv('METRICS_ENABLED', '1') != '0'
+        self.buckets = buckets
+        self._latency: Dict[str, Histogram] = {}
+        self._errors: Dict[str, int] = {}
+        self._tokens: Dict[Tuple[str, str], int] = {}
+        self._collectors: Dict[str, Callable[[], Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, site: str, seconds: float, error: bool = False):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._latency.get(site)
+            if histogram is None:
+                histogram = self._latency[site] = Histogram(self.buckets)
+            histogram.observe(seconds)
+            if error:
+                self._errors[site] = self._errors.get(site, 0) + 1
+
+    def add_tokens(self, site: str, usage: Any):
+        """
+        Count tokens from an OpenAI `usage` object, a LangChain `usage_metadata`
+        dict or a plain total
+        """
+        if not self.enabled or not usage:
+            return
+        if isinstance(usage, int):
+            counts = {'total': usage}
+        elif isinstance(usage, dict):
+            counts = {'prompt': usage.get('input_tokens', 0), 'completion': usage.get('output_tokens', 0)}
+        else:
+            counts = {'prompt': getattr(usage, 'prompt_tokens', 0) or 0,
+                      'completion': getattr(usage, 'completion_tokens', 0) or 0}
+        with self._lock:
+            for kind, count in counts.items():
+                if count:
+                    self._tokens[(site, kind)] = self._tokens.get((site, kind), 0) + count
+
+    @contextmanager
+    def timer(self, site: str):
+        """Time a block (sync or inside a coroutine); exceptions count as errors"""
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.observe(site, time.perf_counter() - started, error=True)
+            raise
+        self.observe(site, time.perf_counter() - started)
+
+    def timed(self, site: str):
+        """Decorator timing every call of a function or coroutine function"""
+        def decorate(func):
+            if asyncio.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    with self.timer(site):
+                        return await func(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(site):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def register_collector(self, name: str, collect: Callable[[], Dict[str, Any]]):
+        """Expose the numeric values of collect() as gauges finai_<name>_<key>"""
+        self._collectors[name] = collect
+
+    def reset(self):
+        with self._lock:
+            self._latency.clear()
+            self._errors.clear()
+            self._tokens.clear()
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Per site: calls, errors, avg/p50/p95 latency (ms) and tokens"""
+        with self._lock:
+            sites = {}
+            for site, histogram in self._latency.items():
+                sites[site] = {
+                    'count': histogram.count,
+                    'errors': self._errors.get(site, 0),
+                    'total_s': histogram.sum,
+                    'avg_ms': histogram.sum / histogram.count * 1000 if histogram.count else 0.0,
+                    'p50_ms': histogram.quantile(0.5) * 1000,
+                    'p95_ms': histogram.quantile(0.95) * 1000,
+                    'tokens': 0
+                }
+            for (site, _), count in self._tokens.items():
+                sites.setdefault(site, {'count': 0, 'errors': 0, 'total_s': 0.0, 'avg_ms': 0.0,
+                                        'p50_ms': 0.0, 'p95_ms': 0.0, 'tokens': 0})['tokens'] += count
+            return sites
+
+    def _gauges(self) -> List[Tuple[str, float]]:
+        gauges = []
+        for name, collect in self._collectors.items():
+            try:
+                values = collect() or {}
+            except Exception:
+                continue
+            for key, value in values.items():
+                if isinstance(value, bool):
+                    value = int(value)
+                if isinstance(value, (int, float)):
+                    gauges.append((re.sub(r'[^a-zA-Z0-9_]', '_', f"{PREFIX}_{name}_{key}"), float(value)))
+        return gauges
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = [
+            f"# HELP {PREFIX}_call_duration_seconds Latency per instrumented call site",
+            f"# TYPE {PREFIX}_call_duration_seconds histogram"
+        ]
+        with self._lock:
+            latency = {site: (list(h.counts), h.sum, h.count) for site, h in sorted(self._latency.items())}
+            errors = dict(self._errors)
+            tokens = dict(self._tokens)
+        for site, (counts, total, count) in latency.items():
+            label = f'site="{_escape(site)}"'
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                lines.append(f'{PREFIX}_call_duration_seconds_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f'{PREFIX}_call_duration_seconds_bucket{{{label},le="+Inf"}} {count}')
+            lines.append(f'{PREFIX}_call_duration_seconds_sum{{{label}}} {total:.6f}')
+            lines.append(f'{PREFIX}_call_duration_seconds_count{{{label}}} {count}')
+
+        lines += [f"# HELP {PREFIX}_call_errors_total Calls that raised, per call site",
+                  f"# TYPE {PREFIX}_call_errors_total counter"]
+        for site in latency:
+            lines.append(f'{PREFIX}_call_errors_total{{site="{_escape(site)}"}} {errors.get(site, 0)}')
+
+        lines += [f"# HELP {PREFIX}_llm_tokens_total OpenAI tokens per call site",
+                  f"# TYPE {PREFIX}_llm_tokens_total counter"]
+        for (site, kind), count in sorted(tokens.items()):
+            lines.append(f'{PREFIX}_llm_tokens_total{{site="{_escape(site)}",kind="{kind}"}} {count}')
+
+        for name, value in self._gauges():
+            lines += [f"# TYPE {name} gauge", f"{name} {value:g}"]
+        return '\n'.join(lines) + '\n'
+
+    def summary(self, limit: int = 15) -> str:
+        """Plain-text table of the busiest sites (by total time) for /stats"""
+        sites = sorted(self.snapshot().items(), key=lambda item: -item[1]['total_s'])[:limit]
+        if not sites:
+            return "No calls recorded yet"
+        rows = [f"{'site':<36}{'calls':>7}{'p50ms':>8}{'p95ms':>8}{'err':>5}{'tokens':>8}"]
+        for site, s in sites:
+            rows.append(f"{site[:35]:<36}{s['count']:>7}{s['p50_ms']:>8.0f}{s['p95_ms']:>8.0f}"
+                        f"{s['errors']:>5}{s['tokens']:>8}")
+        return '\n'.join(rows)
+
+# Shared registry used by the instrumented modules
+metrics = Metrics()
+
+def timed(site: str):
+    """Shorthand for metrics.timed(site)"""
+    return metrics.timed(site)
+
+def instrument_methods(prefix: str):
+    """
+    Class decorator timing every public coroutine method as '<prefix>.<name>'
+    (methods already wrapped with timed() keep their own site)
+    """
+    def decorate(cls):
+        for name, member in list(vars(cls).items()):
+            if name.startswith('_') or not asyncio.iscoroutinefunction(member) or hasattr(member, '__wrapped__'):
+                continue
+            setattr(cls, name, metrics.timed(f"{prefix}.{name}")(member))
+        return cls
+    return decorate
@@ -0,0 +1,237 @@
+"""
+Conversation memory for FinAIAgent
+Keeps the last few (user, assistant) turns per chat in an LRU bounded by chat
+count and total bytes, expires idle chats, and optionally writes changed chats
+behind to the conversation_state table so context survives restarts
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Message pairs kept per chat
+DEFAULT_MEMORY_MAX_TURNS = 5
+
+# Chats held in memory (least recently used are evicted first)
+DEFAULT_MEMORY_MAX_CHATS = 2000
+
+# Total UTF-8 bytes of stored messages across all chats
+DEFAULT_MEMORY_MAX_BYTES = 16 * 1024 * 1024
+
+# Seconds without a message after which a chat's context is dropped
+DEFAULT_MEMORY_IDLE_TTL = 6 * 3600
+
+# Seconds between write-behind flushes to conversation_state
+DEFAULT_MEMORY_FLUSH_INTERVAL = 5.0
+
+# conversation_state.last_status of rows written by this store
+MEMORY_STATUS = 'chat_history'
+
+Turn = Tuple[str, str]
+
+def _turn_bytes(turn: Turn) -> int:
+    return len(turn[0].encode('utf-8')) + len(turn[1].encode('utf-8'))
+
+def _age_seconds(updated_at: Any) -> Optional[float]:
+    """Seconds since a conversation_state.updated_at value (naive values are local time)"""
+    try:
+        stamp = datetime.fromisoformat(str(updated_at).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    now = datetime.now(timezone.utc) if stamp.tzinfo else datetime.now()
+    return (now - stamp).total_seconds()
+
+class ConversationMemory:
+    """
+    Bounded per-chat history store
+    Args:
+        db_client: SupabaseClient used for write-behind persistence; None keeps
+            everything in process
+        persist: defaults to CONVERSATION_PERSIST (on when a db_client is given)
+    """
+    def __init__(
+        self,
+        db_client=None,
+        max_turns: Optional[int] = None,
+        max_chats: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        idle_ttl: Optional[float] = None,
+        persist: Optional[bool] = None,
+        flush_interval: Optional[float] = None
+    ):
+        self.db_client = db_client
+        self.max_turns = int(os.getenv('CONVERSATION_MAX_TURNS', DEFAULT_MEMORY_MAX_TURNS)) if max_turns is None else max_turns
+        self.max_chats = int(os.getenv('CONVERSATION_MAX_CHATS', DEFAULT_MEMORY_MAX_CHATS)) if max_chats is None else max_chats
+        self.max_bytes = int(os.getenv('CONVERSATION_MAX_BYTES', DEFAULT_MEMORY_MAX_BYTES)) if max_bytes is None else max_bytes
+        self.idle_ttl = float(os.getenv('CONVERSATION_IDLE_TTL', DEFAULT_MEMORY_IDLE_TTL)) if idle_ttl is None else idle_ttl
+        if persist is None:
+            persist = os.getenv('CONVERSATION_PERSIST', '1') != '0'
+        self.persist = bool(persist and db_client is not None)
+        self.flush_interval = float(os.getenv('CONVERSATION_FLUSH_INTERVAL', DEFAULT_MEMORY_FLUSH_INTERVAL)) if flush_interval is None else flush_interval
+
+        # chat_key -> (turns, bytes, last_used)
+        self._chats: "OrderedDict[Any, Tuple[List[Turn], int, float]]" = OrderedDict()
+        self.total_bytes = 0
+        # chat_key -> turns waiting to be written (survives eviction until flushed)
+        self._dirty: Dict[Any, List[Turn]] = {}
+        self._flusher: Optional[asyncio.Task] = None
+
+        # Stats
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.writes = 0
+        self.write_failures = 0
+
+    def __len__(self) -> int:
+        return len(self._chats)
+
+    async def get(self, chat_key: Any) -> List[Turn]:
+        """Recent turns for a chat, oldest first (loaded from conversation_state on a miss)"""
+        self._expire()
+        entry = self._chats.get(chat_key)
+        if entry is not None:
+            self._chats.move_to_end(chat_key)
+            self.hits += 1
+            return list(entry[0])
+
+        self.misses += 1
+        turns = self._dirty.get(chat_key)
+        if turns is None:
+            turns = await self._load(chat_key)
+        if turns:
+            self._store(chat_key, turns)
+        return list(turns or [])
+
+    async def append(self, chat_key: Any, user_message: str, assistant_message: str):
+        """Record a turn, keeping the last max_turns, and queue it for persistence"""
+        entry = self._chats.get(chat_key)
+        turns = list(entry[0]) if entry is not None else list(self._dirty.get(chat_key) or [])
+        turns.append((user_message, assistant_message))
+        turns = turns[-self.max_turns:] if self.max_turns > 0 else []
+        self._store(chat_key, turns)
+        if self.persist and chat_key is not None:
+            self._dirty[chat_key] = turns
+            self._schedule_flush()
+
+    def forget(self, chat_key: Any):
+        """Drop a chat from memory (its persisted row is left as is)"""
+        entry = self._chats.pop(chat_key, None)
+        if entry is not None:
+            self.total_bytes -= entry[1]
+        self._dirty.pop(chat_key, None)
+
+    def _store(self, chat_key: Any, turns: List[Turn]):
+        previous = self._chats.pop(chat_key, None)
+        if previous is not None:
+            self.total_bytes -= previous[1]
+        size = sum(_turn_bytes(turn) for turn in turns)
+        # A chat bigger than the whole budget sheds its own oldest turns first
+        while len(turns) > 1 and size > self.max_bytes:
+            size -= _turn_bytes(turns.pop(0))
+        self._chats[chat_key] = (turns, size, time.monotonic())
+        self.total_bytes += size
+        # The chat just stored is never evicted by its own write
+        while len(self._chats) > 1 and (len(self._chats) > self.max_chats or self.total_bytes > self.max_bytes):
+            _, (_, evicted_size, _) = self._chats.popitem(last=False)
+            self.total_bytes -= evicted_size
+            self.evictions += 1
+
+    def _expire(self):
+        """Drop chats idle for longer than the TTL (the LRU front is always the oldest)"""
+        if self.idle_ttl <= 0:
+            return
+        deadline = time.monotonic() - self.idle_ttl
+        while self._chats:
+            chat_key, (_, size, last_used) = next(iter(self._chats.items()))
+            if last_used >= deadline:
+                break
+            del self._chats[chat_key]
+            self.total_bytes -= size
+            self.expirations += 1
+
+    async def _load(self, chat_key: Any) -> List[Turn]:
+        if not self.persist or chat_key is None:
+            return []
+        state = await self.db_client.get_conversation_state(chat_key)
+        if not state or state.get('last_status') != MEMORY_STATUS:
+            return []
+        age = _age_seconds(state.get('updated_at'))
+        if self.idle_ttl > 0 and age is not None and age > self.idle_ttl:
+            return []
+        self.loads += 1
+        history = (state.get('payload') or {}).get('history') or []
+        return [(str(user), str(assistant)) for user, assistant in history][-self.max_turns:]
+
+    def _schedule_flush(self):
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.ensure_future(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        # Cleared first so failed writes re-queued by flush() schedule a new run
+        self._flusher = None
+        await self.flush()
+
+    async def flush(self) -> int:
+        """Write every changed chat to conversation_state; returns the number written"""
+        if not self._dirty:
+            return 0
+        pending, self._dirty = self._dirty, {}
+        results = await asyncio.gather(*(
+            self.db_client.update_conversation_state(
+                chat_key, MEMORY_STATUS, {'history': [list(turn) for turn in turns]}
+            )
+            for chat_key, turns in pending.items()
+        ), return_exceptions=True)
+
+        written = 0
+        for (chat_key, turns), result in zip(pending.items(), results):
+            if isinstance(result, Exception):
+                self.write_failures += 1
+                logger.warning(f"Conversation state write failed for chat {chat_key}: {result}")
+                # Retry with the next flush unless a newer turn is already queued; the
+                # retry queue is bounded like the LRU so an outage can't grow it forever
+                if len(self._dirty) < self.max_chats:
+                    self._dirty.setdefault(chat_key, turns)
+            else:
+                written += 1
+        self.writes += written
+        if self._dirty:
+            self._schedule_flush()
+        return written
+
+    async def close(self):
+        """Stop the scheduled flush and write whatever is still pending"""
+        if self._flusher is not None and not self._flusher.done():
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+        self._flusher = None
+        if self.persist:
+            await self.flush()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'chats': len(self._chats),
+            'bytes': self.total_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'loads': self.loads,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'pending_writes': len(self._dirty),
+            'writes': self.writes,
+            'write_failures': self.write_failures
+        }
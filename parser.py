@@ -4,8 +4,136 @@ Handles various expense input formats dynamically
 """
 import re
 import os
-from typing import Dict, Optional
-from openai import OpenAI
+import json
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from instrumentation import metrics, timed
+
+logger = logging.getLogger(__name__)
+
+# Milliseconds to wait for more parse requests before sending one batched completion (0 = no batching)
+DEFAULT_BATCH_WINDOW_MS = 0
+
+# Most texts sent in a single batched completion
+DEFAULT_BATCH_MAX_SIZE = 16
+
+PARSER_SYSTEM_PROMPT = """You are an expense parser. Extract expense information from natural language text, handling conversational input intelligently.
+
+Output JSON format:
+{
+  "merchant": "category or merchant name",
+  "detail": "description/concept/notes (optional)",
+  "amount": numeric value,
+  "currency": "MXN" (default) or "CAD", "USD", etc.,
+  "category": "explicit category if user specified one (optional)"
+}
+
+CRITICAL PARSING RULES:
+1. **AMOUNT**: Always extract the numeric value (required)
+2. **CATEGORY DETECTION**: Look for explicit category mentions with various keywords:
+   - "under [category]" → e.g., "under restaurants", "under other", "under Others"
+   - "on [category]" → e.g., "spent on restaurants", "on category others"
+   - "in [category]" → e.g., "in gas categories", "in groceries"
+   - "category [name]" → e.g., "category others", "category restaurants"
+   - "en [category]" → e.g., "en restaurantes", "en otros" (Spanish)
+   - "[category]" at end → e.g., "155 restaurants", "60 groceries"
+3. **DETAIL/DESCRIPTION KEYWORDS** (extract these as 'detail' field):
+   - "description [text]", "descripción [text]", "descriptible [text]"
+   - "concept [text]", "concepto [text]"
+   - "detail [text]", "detalle [text]"
+   - "for [text]", "para [text]"
+   - Text in quotes: "pelotas pádel", 'clase latina'
+4. **FIELD EXTRACTION**:
+   - "merchant": Use the explicit CATEGORY if mentioned (restaurants, others, groceries, etc.), OR the store name if no category specified
+   - "category": Extract the explicit category name if the user specified one (this helps skip classification)
+   - "detail": Any description, concept, person name, notes from keywords above, or the actual merchant/place name
+5. **COMMON CATEGORIES**: restaurants, groceries, gas, transportation, clothing, entertainment, oxxo, medicines, puppies, telcom, subscriptions, travel, gadgets, home appliances, others, finance, gym, canada, rent, beauty
+6. **CONVERSATIONAL HANDLING**:
+   - "spent", "gastado", "paid", "cost" are expense indicators, NOT questions
+   - Only return {"error": "not_an_expense"} for confirmations ("yes", "ok") or clear questions ("what is...", "how much...")
+
+EXAMPLES - CATEGORY EXPLICITLY MENTIONED:
+- "Spent 155 under restaurants, description is Marissa" → {"merchant": "restaurants", "category": "restaurants", "detail": "Marissa", "amount": 155, "currency": "MXN"}
+- "And Marissa 155 under restaurants" → {"merchant": "restaurants", "category": "restaurants", "detail": "Marissa", "amount": 155, "currency": "MXN"}
+- "i spent on other 150 concept pelotas pádel" → {"merchant": "others", "category": "others", "detail": "pelotas pádel", "amount": 150, "currency": "MXN"}
+- "i spent on category others 150 concept pelotas pádel" → {"merchant": "others", "category": "others", "detail": "pelotas pádel", "amount": 150, "currency": "MXN"}
+- "i spent on category others 150 descriptible pelotas pádel" → {"merchant": "others", "category": "others", "detail": "pelotas pádel", "amount": 150, "currency": "MXN"}
+- "add 971 in gas categories" → {"merchant": "gas", "category": "gas", "detail": null, "amount": 971, "currency": "MXN"}
+- "Pan de muerto marisa 60 restaurants" → {"merchant": "restaurants", "category": "restaurants", "detail": "Pan de muerto marisa", "amount": 60, "currency": "MXN"}
+- "Costco 120 groceries" → {"merchant": "groceries", "category": "groceries", "detail": "Costco", "amount": 120, "currency": "MXN"}
+- "211 jabón carita under belleza" → {"merchant": "belleza", "category": "belleza", "detail": "jabón carita", "amount": 211, "currency": "MXN"}
+
+EXAMPLES - NO CATEGORY (WILL BE CLASSIFIED LATER):
+- "Costco 120" → {"merchant": "Costco", "detail": null, "amount": 120, "currency": "MXN"}
+- "I paid 50 bucks for lunch today" → {"merchant": "lunch", "detail": null, "amount": 50, "currency": "MXN"}
+- "compré café por 45 pesos" → {"merchant": "café", "detail": null, "amount": 45, "currency": "MXN"}
+- "Marissa 155" → {"merchant": "Marissa", "detail": null, "amount": 155, "currency": "MXN"}
+
+EXAMPLES - NOT EXPENSES:
+- "what's my total spending?" → {"error": "not_an_expense"}
+- "yes please" → {"error": "not_an_expense"}
+- "ok" → {"error": "not_an_expense"}
+- "Others" (just the word) → {"error": "not_an_expense"}"""
+
+# Category names the local grammar accepts after under/on/in/en/category or as the last word
+# (the LLM prompt's COMMON CATEGORIES plus the Spanish spellings users type)
+CATEGORY_WORDS = {
+    'restaurants', 'groceries', 'gas', 'transportation', 'clothing', 'entertainment', 'oxxo', 'medicines',
+    'puppies', 'telcom', 'subscriptions', 'travel', 'gadgets', 'home appliances', 'others', 'finance', 'gym',
+    'canada', 'rent', 'beauty',
+    'restaurantes', 'despensa', 'supermercado', 'gasolina', 'transporte', 'ropa', 'entretenimiento',
+    'medicinas', 'medicamentos', 'suscripciones', 'viajes', 'electrodomesticos', 'otros', 'finanzas',
+    'gimnasio', 'renta', 'belleza',
+}
+
+# Words that introduce an explicit category / a description in the local grammar
+CATEGORY_KEYWORDS = ('under', 'on', 'in', 'en', 'category', 'categoria', 'categoría')
+DETAIL_KEYWORDS = ('description', 'descripcion', 'descripción', 'descriptible', 'concept', 'concepto',
+                   'detail', 'detalle')
+# "<merchant> <amount> for <detail>": the words after for/para describe the merchant's expense
+DETAIL_CONNECTORS = ('for', 'para')
+
+# Currency words and codes accepted next to the amount
+CURRENCY_WORDS = {
+    'mxn': 'MXN', 'peso': 'MXN', 'pesos': 'MXN',
+    'cad': 'CAD', 'usd': 'USD',
+    'eur': 'EUR', 'euro': 'EUR', 'euros': 'EUR',
+    'gbp': 'GBP', 'jpy': 'JPY', 'yen': 'JPY',
+}
+
+# Expense verbs and connectors trimmed from the edges of the merchant/detail text
+FILLER_WORDS = {
+    'i', 'we', 'and', 'y', 'spent', 'spend', 'paid', 'pay', 'add', 'added', 'bought', 'gaste', 'gasté',
+    'gastamos', 'pague', 'pagué', 'compre', 'compré', 'por', 'for', 'para', 'of', 'de', 'today', 'hoy',
+    'is', 'es',
+}
+
+# Anything that makes the text ambiguous enough to leave it to the LLM
+AMBIGUOUS_WORDS = {
+    'yesterday', 'ayer', 'tomorrow', 'manana', 'mañana', 'last', 'pasado', 'pasada', 'split', 'each', 'cada',
+    'dollars', 'dolares', 'dólares', 'bucks', 'what', 'how', 'much', 'many', 'cuanto', 'cuánto', 'cuantos',
+    'cuántos', 'que', 'qué', 'not', 'no',
+    'total', 'budget', 'presupuesto', 'show', 'list', 'delete', 'borra', 'edit', 'change', 'cambia',
+    'week', 'month', 'year', 'semana', 'mes', 'ano', 'año',
+}
+
+_QUOTED_RE = re.compile(r'["“”«»]([^"“”«»]+)["“”«»]|(?<!\w)[\'‘’]([^\'‘’]+)[\'‘’](?!\w)')
+_DETAIL_RE = re.compile(
+    r'(?:^|[\s,;])(?:' + '|'.join(DETAIL_KEYWORDS) + r')\b(?:\s+(?:is|es))?\s*[:=]?\s*([^,;\d$€£¥]+)',
+    re.IGNORECASE
+)
+_AMOUNT_RE = re.compile(
+    r'(?<![\w.,])([$€£¥])?\s?(\d{1,3}(?:[.,]\d{3})+(?:[.,]\d{1,2})?|\d+(?:[.,]\d{1,2})?)(?!\w|[.,]\d)\s?([$€£¥])?'
+)
+_WORD_RE = re.compile(r"[^\W\d_]+(?:[&'-][^\W\d_]+)*|&", re.UNICODE)
+
+PARSER_BATCH_INSTRUCTIONS = """
+
+BATCH MODE: The user message is a JSON array of independent expense texts.
+Parse each one on its own with the rules above and reply with
+{"results": [...]} holding exactly one object per input, in the same order."""
 
 class ExpenseParser:
     def __init__(self):
@@ -16,13 +144,62 @@ class ExpenseParser:
             '£': 'GBP',
             '¥': 'JPY',
         }
-        # Initialize OpenAI client for AI-powered parsing fallback
-        self.openai_client = OpenAI(api_key=os.getenv('OPENAI_API_KEY')) if os.getenv('OPENAI_API_KEY') else None
+        # OpenAI clients for the AI-powered parsing fallback, created on first use so
+        # the openai package isn't imported at startup (the local grammar needs neither)
+        self._openai_client = None
+        self._async_openai_client = None
+        
+        # Micro-batching of async AI parses
+        self.batch_window = float(os.getenv('PARSER_BATCH_WINDOW_MS', DEFAULT_BATCH_WINDOW_MS)) / 1000
+        self.batch_max_size = int(os.getenv('PARSER_BATCH_MAX_SIZE', DEFAULT_BATCH_MAX_SIZE))
+        self._batch: List[Tuple[str, asyncio.Future]] = []
+        self._batch_flush: Optional[asyncio.Task] = None
+
+    @property
+    def openai_client(self):
+        """Sync OpenAI client, or None without OPENAI_API_KEY"""
+        if self._openai_client is None and os.getenv('OPENAI_API_KEY'):
+            from openai import OpenAI
+            self._openai_client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+        return self._openai_client
+
+    @property
+    def async_openai_client(self):
+        """One async client (one pooled HTTP connection set) for every async parse"""
+        if self._async_openai_client is None and os.getenv('OPENAI_API_KEY'):
+            from openai import AsyncOpenAI
+            self._async_openai_client = AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+        return self._async_openai_client
 
     def parse_expense_text(self, text: str) -> Optional[Dict]:
         """
-        Parse expense text into components using AI-first approach
-        Falls back to simple regex only for obvious patterns
+        Parse expense text into components
+        The local regex/grammar stage handles the common keyword formats; only
+        text it can't parse unambiguously goes to the AI parser
+        """
+        if not text or not isinstance(text, str):
+            return None
+
+        text = text.strip()
+        if not text:
+            return None
+
+        local = self._parse_local(text)
+        if local:
+            return local
+
+        # Everything else goes to AI
+        # This handles:
+        # - "And Marissa 155 under restaurants"
+        # - "Spent 155 under restaurants, description is Marissa"
+        # - "155 for lunch yesterday"
+        # - ANY natural language format
+        return self._parse_with_ai(text)
+
+    async def parse_expense_text_async(self, text: str) -> Optional[Dict]:
+        """
+        Non-blocking parse_expense_text: same local stage, AI fallback through the
+        shared AsyncOpenAI client (micro-batched when PARSER_BATCH_WINDOW_MS > 0)
         """
         if not text or not isinstance(text, str):
             return None
@@ -31,13 +208,30 @@ class ExpenseParser:
         if not text:
             return None
 
+        local = self._parse_local(text)
+        if local:
+            return local
+
+        return await self._parse_with_ai_async(text)
+
+    def parse_expense_text_local(self, text: str) -> Optional[Dict]:
+        """Local stage only (no OpenAI call); None means the text needs the AI parser"""
+        if not text or not isinstance(text, str) or not text.strip():
+            return None
+        return self._parse_local(text.strip())
+
+    def _parse_local(self, text: str) -> Optional[Dict]:
+        """Parse without the LLM; returns None when the text needs the AI parser"""
         # Quick regex check ONLY for super obvious patterns like "Costco 120"
         # Pattern: merchant + number (most basic case)
         simple_pattern = r'^([a-zA-Z][a-zA-Z\s]{1,30})\s+(\d+(?:\.\d{1,2})?)$'
         simple_match = re.match(simple_pattern, text, re.IGNORECASE)
 
-        if simple_match:
+        if simple_match and not any(word.lower() in DETAIL_CONNECTORS for word in simple_match.group(1).split()):
             merchant = simple_match.group(1).strip()
+            # "how much restaurants 500" / "budget restaurants 3000" are questions, not entries
+            if any(word.lower() in AMBIGUOUS_WORDS or word.lower() in CURRENCY_WORDS for word in merchant.split()):
+                return None
             amount_str = simple_match.group(2)
             amount = self._parse_amount(amount_str)
 
@@ -48,13 +242,138 @@ class ExpenseParser:
                     'currency': 'MXN'
                 }
 
-        # Everything else goes to AI - this is the PRIMARY parser now
-        # This handles:
-        # - "And Marissa 155 under restaurants"
-        # - "Spent 155 under restaurants, description is Marissa"
-        # - "155 for lunch yesterday"
-        # - ANY natural language format
-        return self._parse_with_ai(text)
+        return self._parse_grammar(text)
+
+    def _normalize_amount(self, number: str) -> Optional[float]:
+        """'1,200' / '1.200' are thousands, '45,50' / '45.50' are decimals"""
+        groups = re.split(r'[.,]', number)
+        if len(groups) > 1 and len(groups[-1]) <= 2:
+            number = ''.join(groups[:-1]) + '.' + groups[-1]
+        else:
+            number = ''.join(groups)
+        return self._parse_amount(number)
+
+    def _category_at(self, words: List[str], start: int) -> Tuple[Optional[str], int]:
+        """Longest known category starting at words[start]; returns (category, words consumed)"""
+        for size in (2, 1):
+            candidate = ' '.join(words[start:start + size]).lower()
+            if len(words) - start < size:
+                continue
+            if candidate in CATEGORY_WORDS:
+                return candidate, size
+            if candidate + 's' in CATEGORY_WORDS:
+                return candidate + 's', size
+        return None, 0
+
+    def _parse_grammar(self, text: str) -> Optional[Dict]:
+        """
+        Deterministic parse of the keyword grammar in PARSER_SYSTEM_PROMPT:
+        one amount (symbols, currency words, decimal commas), an explicit category
+        after under/on/in/en/category or as the last word, a description after
+        concept/description/detalle, after an inner for/para or in quotes, and the
+        merchant from what's left.
+        Returns None as soon as anything is ambiguous so the LLM decides
+        """
+        if '?' in text or '¿' in text:
+            return None
+
+        detail = None
+        quoted = _QUOTED_RE.search(text)
+        if quoted:
+            detail = (quoted.group(1) or quoted.group(2)).strip()
+            text = text[:quoted.start()] + ' , ' + text[quoted.end():]
+
+        keyword_detail = _DETAIL_RE.search(text)
+        if keyword_detail:
+            if detail:
+                return None
+            detail = keyword_detail.group(1).strip()
+            text = text[:keyword_detail.start()] + ' , ' + text[keyword_detail.end():]
+
+        amounts = list(_AMOUNT_RE.finditer(text))
+        if len(amounts) != 1 or len(re.findall(r'\d+', text)) != len(re.findall(r'\d+', amounts[0].group(0))):
+            return None
+        amount_match = amounts[0]
+        amount = self._normalize_amount(amount_match.group(2))
+        if not amount:
+            return None
+        symbol = amount_match.group(1) or amount_match.group(3)
+        currency = self._extract_currency_from_amount(symbol) if symbol else None
+
+        # Everything around the amount, as words; commas split clauses
+        before = _WORD_RE.findall(text[:amount_match.start()])
+        after = _WORD_RE.findall(text[amount_match.end():])
+        if after and after[0].lower() in CURRENCY_WORDS:
+            if currency:
+                return None
+            currency = CURRENCY_WORDS[after.pop(0).lower()]
+        words = before + after
+        if any(word.lower() in AMBIGUOUS_WORDS or word.lower() in CURRENCY_WORDS for word in words):
+            return None
+
+        # Explicit category: keyword + known name, or a known name as the very last word
+        category = None
+        rest: List[str] = []
+        i = 0
+        while i < len(words):
+            word = words[i].lower()
+            if word in CATEGORY_KEYWORDS:
+                start = i + 1
+                if start < len(words) and words[start].lower() in ('category', 'categoria', 'categoría', 'la'):
+                    start += 1
+                found, size = self._category_at(words, start)
+                if not found or category:
+                    return None
+                category = found
+                i = start + size
+                if i < len(words) and words[i].lower() in ('category', 'categories', 'categoria', 'categorias'):
+                    i += 1
+                continue
+            rest.append(words[i])
+            i += 1
+
+        if not category and after and len(after) <= 2:
+            found, size = self._category_at(words, len(words) - len(after))
+            if found and size == len(after):
+                category = found
+                rest = rest[:len(rest) - size]
+
+        while rest and rest[0].lower() in FILLER_WORDS:
+            rest.pop(0)
+        while rest and rest[-1].lower() in FILLER_WORDS:
+            rest.pop()
+
+        # An inner for/para splits merchant from detail; a leading one was trimmed above
+        connector = next((i for i, word in enumerate(rest) if word.lower() in DETAIL_CONNECTORS), None)
+        if connector is not None:
+            head, tail = rest[:connector], rest[connector + 1:]
+            while head and head[-1].lower() in FILLER_WORDS:
+                head.pop()
+            while tail and tail[0].lower() in FILLER_WORDS:
+                tail.pop(0)
+            if head and tail:
+                if detail or category:
+                    return None
+                detail = ' '.join(tail)
+                rest = head
+            else:
+                rest = head + tail
+        leftover = ' '.join(rest).strip()
+        if len(rest) > 6 or len(leftover) > 40:
+            return None
+
+        if category:
+            if leftover:
+                if detail:
+                    return None
+                detail = leftover
+            parsed = {'merchant': category, 'detail': detail, 'amount': amount,
+                      'currency': currency or 'MXN', 'category': category}
+        else:
+            if not leftover:
+                return None
+            parsed = {'merchant': leftover, 'detail': detail, 'amount': amount, 'currency': currency or 'MXN'}
+        return parsed
 
     def _parse_amount(self, amount_str: str) -> Optional[float]:
         """Parse amount string to float"""
@@ -85,6 +404,7 @@ class ExpenseParser:
 
         return None
 
+    @timed('openai.parse_expense')
     def _parse_with_ai(self, text: str) -> Optional[Dict]:
         """
         AI-powered expense parsing using OpenAI
@@ -98,63 +418,7 @@ class ExpenseParser:
                 model="gpt-4o-mini",
                 messages=[{
                     "role": "system",
-                    "content": """You are an expense parser. Extract expense information from natural language text, handling conversational input intelligently.
-
-Output JSON format:
-{
-  "merchant": "category or merchant name",
-  "detail": "description/concept/notes (optional)",
-  "amount": numeric value,
-  "currency": "MXN" (default) or "CAD", "USD", etc.,
-  "category": "explicit category if user specified one (optional)"
-}
-
-CRITICAL PARSING RULES:
-1. **AMOUNT**: Always extract the numeric value (required)
-2. **CATEGORY DETECTION**: Look for explicit category mentions with various keywords:
-   - "under [category]" → e.g., "under restaurants", "under other", "under Others"
-   - "on [category]" → e.g., "spent on restaurants", "on category others"
-   - "in [category]" → e.g., "in gas categories", "in groceries"
-   - "category [name]" → e.g., "category others", "category restaurants"
-   - "en [category]" → e.g., "en restaurantes", "en otros" (Spanish)
-   - "[category]" at end → e.g., "155 restaurants", "60 groceries"
-3. **DETAIL/DESCRIPTION KEYWORDS** (extract these as 'detail' field):
-   - "description [text]", "descripción [text]", "descriptible [text]"
-   - "concept [text]", "concepto [text]"
-   - "detail [text]", "detalle [text]"
-   - "for [text]", "para [text]"
-   - Text in quotes: "pelotas pádel", 'clase latina'
-4. **FIELD EXTRACTION**:
-   - "merchant": Use the explicit CATEGORY if mentioned (restaurants, others, groceries, etc.), OR the store name if no category specified
-   - "category": Extract the explicit category name if the user specified one (this helps skip classification)
-   - "detail": Any description, concept, person name, notes from keywords above, or the actual merchant/place name
-5. **COMMON CATEGORIES**: restaurants, groceries, gas, transportation, clothing, entertainment, oxxo, medicines, puppies, telcom, subscriptions, travel, gadgets, home appliances, others, finance, gym, canada, rent, beauty
-6. **CONVERSATIONAL HANDLING**:
-   - "spent", "gastado", "paid", "cost" are expense indicators, NOT questions
-   - Only return {"error": "not_an_expense"} for confirmations ("yes", "ok") or clear questions ("what is...", "how much...")
-
-EXAMPLES - CATEGORY EXPLICITLY MENTIONED:
-- "Spent 155 under restaurants, description is Marissa" → {"merchant": "restaurants", "category": "restaurants", "detail": "Marissa", "amount": 155, "currency": "MXN"}
-- "And Marissa 155 under restaurants" → {"merchant": "restaurants", "category": "restaurants", "detail": "Marissa", "amount": 155, "currency": "MXN"}
-- "i spent on other 150 concept pelotas pádel" → {"merchant": "others", "category": "others", "detail": "pelotas pádel", "amount": 150, "currency": "MXN"}
-- "i spent on category others 150 concept pelotas pádel" → {"merchant": "others", "category": "others", "detail": "pelotas pádel", "amount": 150, "currency": "MXN"}
-- "i spent on category others 150 descriptible pelotas pádel" → {"merchant": "others", "category": "others", "detail": "pelotas pádel", "amount": 150, "currency": "MXN"}
-- "add 971 in gas categories" → {"merchant": "gas", "category": "gas", "detail": null, "amount": 971, "currency": "MXN"}
-- "Pan de muerto marisa 60 restaurants" → {"merchant": "restaurants", "category": "restaurants", "detail": "Pan de muerto marisa", "amount": 60, "currency": "MXN"}
-- "Costco 120 groceries" → {"merchant": "groceries", "category": "groceries", "detail": "Costco", "amount": 120, "currency": "MXN"}
-- "211 jabón carita under belleza" → {"merchant": "belleza", "category": "belleza", "detail": "jabón carita", "amount": 211, "currency": "MXN"}
-
-EXAMPLES - NO CATEGORY (WILL BE CLASSIFIED LATER):
-- "Costco 120" → {"merchant": "Costco", "detail": null, "amount": 120, "currency": "MXN"}
-- "I paid 50 bucks for lunch today" → {"merchant": "lunch", "detail": null, "amount": 50, "currency": "MXN"}
-- "compré café por 45 pesos" → {"merchant": "café", "detail": null, "amount": 45, "currency": "MXN"}
-- "Marissa 155" → {"merchant": "Marissa", "detail": null, "amount": 155, "currency": "MXN"}
-
-EXAMPLES - NOT EXPENSES:
-- "what's my total spending?" → {"error": "not_an_expense"}
-- "yes please" → {"error": "not_an_expense"}
-- "ok" → {"error": "not_an_expense"}
-- "Others" (just the word) → {"error": "not_an_expense"}"""
+                    "content": PARSER_SYSTEM_PROMPT
                 }, {
                     "role": "user",
                     "content": text
@@ -163,58 +427,156 @@ EXAMPLES - NOT EXPENSES:
                 max_tokens=100,
                 response_format={"type": "json_object"}
             )
+            metrics.add_tokens('openai.parse_expense', response.usage)
 
-            import json
             result = json.loads(response.choices[0].message.content)
+            return self._normalize_ai_result(result)
 
-            # Check if it's an error
-            if "error" in result:
-                return None
+        except Exception as e:
+            # If AI parsing fails, return None to avoid breaking the bot
+            import logging
+            logging.debug(f"AI parsing failed: {e}")
+            return None
 
-            # Validate required fields
-            if "merchant" not in result or "amount" not in result:
-                return None
+    @timed('openai.parse_expense_async')
+    async def _complete_async(self, content: str, system_prompt: str, max_tokens: int) -> Dict:
+        response = await self.async_openai_client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[{
+                "role": "system",
+                "content": system_prompt
+            }, {
+                "role": "user",
+                "content": content
+            }],
+            temperature=0.1,
+            max_tokens=max_tokens,
+            response_format={"type": "json_object"}
+        )
+        metrics.add_tokens('openai.parse_expense_async', response.usage)
+        return json.loads(response.choices[0].message.content)
+
+    async def _parse_one_async(self, text: str) -> Optional[Dict]:
+        try:
+            return self._normalize_ai_result(await self._complete_async(text, PARSER_SYSTEM_PROMPT, 100))
+        except Exception as e:
+            logger.debug(f"AI parsing failed: {e}")
+            return None
 
-            # Ensure amount is a number
+    async def _parse_with_ai_async(self, text: str) -> Optional[Dict]:
+        """Async twin of _parse_with_ai; joins the pending batch when batching is on"""
+        if not self.async_openai_client:
+            return None
+
+        if self.batch_window <= 0 or self.batch_max_size <= 1:
+            return await self._parse_one_async(text)
+
+        future = asyncio.get_running_loop().create_future()
+        self._batch.append((text, future))
+        if len(self._batch) >= self.batch_max_size:
+            self._start_batch(self._take_batch())
+        elif self._batch_flush is None:
+            self._batch_flush = asyncio.ensure_future(self._flush_after_window())
+        return await future
+
+    def _take_batch(self) -> List[Tuple[str, asyncio.Future]]:
+        batch, self._batch = self._batch, []
+        if self._batch_flush is not None and not self._batch_flush.done():
+            self._batch_flush.cancel()
+        self._batch_flush = None
+        return batch
+
+    def _start_batch(self, batch: List[Tuple[str, asyncio.Future]]):
+        if batch:
+            asyncio.ensure_future(self._run_batch(batch))
+
+    async def _flush_after_window(self):
+        await asyncio.sleep(self.batch_window)
+        self._batch_flush = None
+        batch, self._batch = self._batch, []
+        await self._run_batch(batch)
+
+    async def _run_batch(self, batch: List[Tuple[str, asyncio.Future]]):
+        """
+        Parse every text of the batch with one JSON-array completion
+        Items the batch reply doesn't cover (or the whole batch, if the call fails)
+        are retried individually so one bad input can't sink the others
+        """
+        results: List[Optional[Dict]] = [None] * len(batch)
+        retry = list(range(len(batch)))
+        if len(batch) > 1:
             try:
-                amount = float(result["amount"])
-                if not (0 < amount < 1000000):
-                    return None
-            except (ValueError, TypeError):
-                return None
+                reply = await self._complete_async(
+                    json.dumps([text for text, _ in batch], ensure_ascii=False),
+                    PARSER_SYSTEM_PROMPT + PARSER_BATCH_INSTRUCTIONS,
+                    100 * len(batch)
+                )
+                items = reply.get('results') if isinstance(reply, dict) else None
+                if isinstance(items, list) and len(items) == len(batch):
+                    retry = []
+                    for i, item in enumerate(items):
+                        results[i] = self._normalize_ai_result(item)
+                else:
+                    logger.warning(f"Batched parse returned {len(items) if isinstance(items, list) else 'no'} results for {len(batch)} texts, retrying individually")
+            except Exception as e:
+                logger.warning(f"Batched parse of {len(batch)} texts failed, retrying individually: {e}")
+
+        if retry:
+            singles = await asyncio.gather(*(self._parse_one_async(batch[i][0]) for i in retry))
+            for i, result in zip(retry, singles):
+                results[i] = result
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def _normalize_ai_result(self, result) -> Optional[Dict]:
+        """Validate one JSON object returned by the model and shape it like the regex result"""
+        if not isinstance(result, dict):
+            return None
 
-            # Extract detail if present
-            detail = result.get("detail")
-            if detail and detail != "null":
-                detail = str(detail).strip()
-            else:
-                detail = None
+        # Check if it's an error
+        if "error" in result:
+            return None
 
-            # Extract explicit category if user specified one
-            category = result.get("category")
-            if category and category != "null":
-                category = str(category).strip()
-            else:
-                category = None
+        # Validate required fields
+        if "merchant" not in result or "amount" not in result:
+            return None
 
-            parsed_result = {
-                "merchant": str(result["merchant"]).strip(),
-                "detail": detail,
-                "amount": amount,
-                "currency": result.get("currency", "MXN")
-            }
+        # Ensure amount is a number
+        try:
+            amount = float(result["amount"])
+            if not (0 < amount < 1000000):
+                return None
+        except (ValueError, TypeError):
+            return None
 
-            # Include category if explicitly mentioned by user
-            if category:
-                parsed_result["category"] = category
+        # Extract detail if present
+        detail = result.get("detail")
+        if detail and detail != "null":
+            detail = str(detail).strip()
+        else:
+            detail = None
+
+        # Extract explicit category if user specified one
+        category = result.get("category")
+        if category and category != "null":
+            category = str(category).strip()
+        else:
+            category = None
+
+        parsed_result = {
+            "merchant": str(result["merchant"]).strip(),
+            "detail": detail,
+            "amount": amount,
+            "currency": result.get("currency", "MXN")
+        }
 
-            return parsed_result
+        # Include category if explicitly mentioned by user
+        if category:
+            parsed_result["category"] = category
 
-        except Exception as e:
-            # If AI parsing fails, return None to avoid breaking the bot
-            import logging
-            logging.debug(f"AI parsing failed: {e}")
-            return None
+        return parsed_result
 
     def validate_expense_data(self, data: Dict) -> bool:
         """Validate parsed expense data"""
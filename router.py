@@ -0,0 +1,203 @@
+"""
+Deterministic intent router for analytics questions
+Maps common Spanish/English phrasings straight to SqlQueryTool templates so the
+LLM SQL Library consultant is only needed for questions it can't place confidently
+"""
+import math
+import re
+import unicodedata
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Routes below this confidence are handed to the LLM consultant
+DEFAULT_MIN_CONFIDENCE = 0.8
+
+# Assumed cost of one consultant round trip until a real one has been measured
+DEFAULT_CONSULT_LATENCY = 0.8
+
+def normalize_question(text: str) -> str:
+    """Lowercase, strip accents and punctuation, collapse whitespace"""
+    decomposed = unicodedata.normalize('NFKD', str(text or ''))
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch)).lower()
+    stripped = re.sub(r'[^a-z0-9\s]', ' ', stripped)
+    return ' '.join(stripped.split())
+
+PERIOD_PATTERNS = {
+    'today': r'\b(today|hoy|today s)\b',
+    'yesterday': r'\b(yesterday|ayer)\b',
+    'week': r'\b(this week|esta semana|last 7 days|ultimos 7 dias|past week|la semana|weekly|semanal)\b',
+    'month': r'\b(this month|este mes|current month|mes actual|monthly|mensual|en el mes|so far this month)\b',
+}
+
+INTENT_PATTERNS = {
+    'recent': r'\b(recent|latest|last (few |10 )?expenses|ultimos gastos|gastos recientes|recientes)\b',
+    'budget_vs': r'\b(budget vs|vs budget|against (my |the )?budget|budget progress|how am i doing|on track|'
+                 r'remaining|left|over budget|presupuesto vs|contra (el )?presupuesto|como voy|me queda|restante)\b',
+    'budget': r'\b(budget|presupuesto)\b',
+    'category': r'\b(by category|per category|por categoria|categories|categorias|breakdown|desglose|'
+                r'category breakdown|each category|cada categoria)\b',
+    'total': r'\b(how much|total|cuanto|cuantos|spent|spend|spending|gastado|gaste|gastamos|gastos|gasto|expenses)\b',
+}
+
+# Anything the fixed templates can't express: explicit dates, rankings, filters, comparisons
+DISQUALIFIERS = (
+    r'\b(top|highest|largest|biggest|lowest|smallest|most|least|average|avg|promedio|mayor|menor|mas caro)\b',
+    r'\b(compare|comparison|compara|comparar|versus|difference|diferencia|trend|tendencia|growth)\b',
+    r'\b(last month|mes pasado|last year|ano pasado|this year|este ano|last week|semana pasada)\b',
+    r'\b(january|february|march|april|may|june|july|august|september|october|november|december|'
+    r'enero|febrero|marzo|abril|mayo|junio|julio|agosto|septiembre|octubre|noviembre|diciembre)\b',
+    r'\b(above|below|over|under|more than|less than|greater|mas de|menos de|arriba de)\b(?! budget)',
+    r'\b(weekend|weekday|fin de semana|per day|por dia|daily|diario|percentage|porcentaje|percent)\b',
+    r'\b(who|quien|paid by|pago|each person|cada persona)\b',
+    # Counts, not sums
+    r'\b(how many|cuantos|cuantas|number of|numero de|cantidad de|count)\b',
+    # Exclusions
+    r'\b(excluding|exclude|except|without|apart from|aside from|sin|sin contar|excepto|salvo|menos)\b',
+    # One person's spending ("how much did maria spend"), not the family's
+    r'\b(?!(we|i|you|us|they|did|do|does|have|has|had|much|money|total|what|that|was|were)\b)[a-z]+\s+(spend|spent)\b',
+    # A specific merchant/category filter ("on restaurants", "en uber") needs custom SQL
+    r'\b(on|en|in|at|for|para|con)\s+(?!(this|the|my|our|esta|este|el|la|mi|total|today|hoy|ayer)\b)\w+',
+    r'\d',
+)
+
+# Example phrasings per template for the nearest-neighbour fallback
+TEMPLATE_EXAMPLES = {
+    'week_total': ['how much did we spend this week', 'total spending this week', 'cuanto gastamos esta semana',
+                   'gastos de la semana', 'weekly total'],
+    'month_total': ['how much did we spend this month', 'total spending this month', 'cuanto llevamos gastado este mes',
+                    'gasto total del mes', 'monthly total'],
+    'today_total': ['how much did we spend today', 'total today', 'cuanto gastamos hoy', 'gastos de hoy'],
+    'yesterday_total': ['how much did we spend yesterday', 'total yesterday', 'cuanto gastamos ayer', 'gastos de ayer'],
+    'month_by_category': ['spending by category this month', 'category breakdown this month',
+                          'gastos por categoria este mes', 'desglose por categoria del mes'],
+    'today_by_category': ['spending by category today', 'gastos por categoria hoy'],
+    'yesterday_by_category': ['spending by category yesterday', 'gastos por categoria ayer'],
+    'total_budget': ['what is our total budget', 'total budget this month', 'cual es el presupuesto total',
+                     'presupuesto del mes'],
+    'budget_vs_spending': ['how are we doing against the budget', 'budget vs spending', 'budget progress',
+                           'como vamos con el presupuesto', 'presupuesto vs gastos'],
+    'recent_expenses': ['show recent expenses', 'latest expenses', 'ultimos gastos', 'gastos recientes',
+                        'what did we buy recently'],
+}
+
+STOPWORDS = frozenset(
+    'a an the my our me i we is are was were what did do does of for in on to show tell give please '
+    'el la los las de del mi mis nuestro nuestros que en por para me dime muestra cual cuales y'.split()
+)
+
+class TemplateRouter:
+    """
+    Local router in front of SqlQueryTool._consult_sql_library
+    Keyword/regex rules first, then a TF-IDF nearest-neighbour table built from
+    TEMPLATE_EXAMPLES; returns None when it isn't confident
+    """
+    def __init__(self, template_names: Iterable[str], min_confidence: float = DEFAULT_MIN_CONFIDENCE):
+        self.template_names = set(template_names)
+        self.min_confidence = min_confidence
+        self._period_res = {k: re.compile(v) for k, v in PERIOD_PATTERNS.items()}
+        self._intent_res = {k: re.compile(v) for k, v in INTENT_PATTERNS.items()}
+        self._disqualifier_res = [re.compile(p) for p in DISQUALIFIERS]
+        self._build_neighbours()
+
+        # Stats
+        self.routed = 0
+        self.deferred = 0
+        self.consult_calls = 0
+        self.consult_seconds = 0.0
+
+    def _tokens(self, normalized: str) -> List[str]:
+        return [t for t in normalized.split() if t not in STOPWORDS]
+
+    def _build_neighbours(self):
+        """TF-IDF vectors for every example phrasing of the available templates"""
+        examples = [
+            (name, self._tokens(normalize_question(phrase)))
+            for name, phrases in TEMPLATE_EXAMPLES.items() if name in self.template_names
+            for phrase in phrases
+        ]
+        document_freq = Counter(token for _, tokens in examples for token in set(tokens))
+        total = max(1, len(examples))
+        self._idf = {token: math.log((1 + total) / (1 + df)) + 1 for token, df in document_freq.items()}
+        # Unknown query words get the rarest weight so they pull similarity down
+        self._unknown_idf = math.log(1 + total) + 1
+        self._neighbours = [(name, self._vector(tokens)) for name, tokens in examples]
+
+    def _vector(self, tokens: List[str]) -> Dict[str, float]:
+        counts = Counter(tokens)
+        vector = {t: n * self._idf.get(t, self._unknown_idf) for t, n in counts.items()}
+        norm = math.sqrt(sum(v * v for v in vector.values())) or 1.0
+        return {t: v / norm for t, v in vector.items()}
+
+    def _nearest(self, normalized: str) -> Tuple[Optional[str], float]:
+        query = self._vector(self._tokens(normalized))
+        best_name, best_score = None, 0.0
+        for name, vector in self._neighbours:
+            score = sum(weight * vector.get(token, 0.0) for token, weight in query.items())
+            if score > best_score:
+                best_name, best_score = name, score
+        return best_name, best_score
+
+    def _rule_match(self, normalized: str) -> Optional[str]:
+        """Map (intent, period) keyword hits to a template name"""
+        periods = [p for p, pattern in self._period_res.items() if pattern.search(normalized)]
+        intents = {i for i, pattern in self._intent_res.items() if pattern.search(normalized)}
+        if len(periods) > 1:
+            return None
+        period = periods[0] if periods else None
+
+        if 'recent' in intents and not period:
+            return 'recent_expenses'
+        if 'budget' in intents:
+            if period not in (None, 'month') or 'category' in intents and 'budget_vs' not in intents:
+                return None
+            if 'budget_vs' in intents or 'total' in intents and 'total budget' not in normalized:
+                return 'budget_vs_spending'
+            return 'total_budget'
+        # "how much do we have left", "cuanto me queda": the budget is implied
+        if 'budget_vs' in intents and period in (None, 'month'):
+            return 'budget_vs_spending'
+        if 'category' in intents and period in ('today', 'yesterday', 'month'):
+            return f'{period}_by_category'
+        if 'total' in intents and period:
+            return f'{period}_total'
+        return None
+
+    def route(self, question: str) -> Optional[Dict]:
+        """
+        Returns {'template_name', 'confidence', 'method'} for a confident match,
+        otherwise None (the caller should consult the LLM)
+        """
+        normalized = normalize_question(question)
+        if not normalized or any(pattern.search(normalized) for pattern in self._disqualifier_res):
+            self.deferred += 1
+            return None
+
+        template = self._rule_match(normalized)
+        if template in self.template_names:
+            self.routed += 1
+            return {'template_name': template, 'confidence': 0.95, 'method': 'rules'}
+
+        template, score = self._nearest(normalized)
+        if template and score >= self.min_confidence:
+            self.routed += 1
+            return {'template_name': template, 'confidence': round(score, 3), 'method': 'tfidf'}
+
+        self.deferred += 1
+        return None
+
+    def record_consultation(self, seconds: float):
+        """Record the latency of one LLM consultant call (used to estimate savings)"""
+        self.consult_calls += 1
+        self.consult_seconds += seconds
+
+    def stats(self) -> Dict:
+        """Hit rate and estimated latency saved by answering locally"""
+        total = self.routed + self.deferred
+        avg_consult = self.consult_seconds / self.consult_calls if self.consult_calls else DEFAULT_CONSULT_LATENCY
+        return {
+            'routed': self.routed,
+            'deferred': self.deferred,
+            'hit_rate': self.routed / total if total else 0.0,
+            'avg_consult_seconds': avg_consult,
+            'estimated_seconds_saved': self.routed * avg_consult
+        }
@@ -0,0 +1,182 @@
+"""
+Generated-SQL cache for SqlQueryTool
+Persists question -> SQL pairs produced by Vanna or the GPT fallback in SQLite,
+so a repeated dynamic question skips both the ChromaDB similarity search and the
+LLM completion, also across restarts. Questions are keyed after normalization
+(case, accents, punctuation, whitespace, and English/Spanish relative-date
+phrases mapped to one token each). SQL that pins dates or years the question
+doesn't spell out ("last 30 days", "since monday", "this year") is only served
+on the day it was generated. Entries expire after a TTL and the least recently
+used are evicted beyond the size limit
+"""
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import date
+from typing import Dict, Optional
+
+from router import normalize_question
+
+logger = logging.getLogger(__name__)
+
+# SQLite file (':memory:' keeps the cache in process)
+DEFAULT_SQL_CACHE_PATH = 'sql_cache.sqlite3'
+
+# Seconds a generated query is reused before it is generated again
+DEFAULT_SQL_CACHE_TTL = 7 * 24 * 3600
+
+# Entries kept (least recently used are evicted first)
+DEFAULT_SQL_CACHE_SIZE = 1000
+
+# Relative-date phrases (after normalize_question) and the token each is keyed as
+RELATIVE_DATES = (
+    (r'\b(today|hoy)\b', '<today>'),
+    (r'\b(yesterday|ayer)\b', '<yesterday>'),
+    (r'\b(this week|esta semana|current week)\b', '<this_week>'),
+    (r'\b(last week|past week|(la )?semana pasada)\b', '<last_week>'),
+    (r'\b(this month|este mes|current month|mes actual)\b', '<this_month>'),
+    (r'\b(last month|previous month|(el )?mes pasado)\b', '<last_month>'),
+    (r'\b(this year|este ano|current year)\b', '<this_year>'),
+    (r'\b(last year|previous year|(el )?ano pasado)\b', '<last_year>'),
+)
+
+# Dates ('2025-07-01', '2025-07') and bare years (EXTRACT(YEAR ...) = 2025) in generated SQL
+_SQL_YEARS = re.compile(r"'((?:19|20)\d{2})-\d{2}(?:-\d{2})?|\b((?:19|20)\d{2})\b")
+
+def normalize_sql_question(question: str) -> str:
+    """normalize_question plus one token per relative-date phrase"""
+    text = normalize_question(question)
+    for pattern, token in RELATIVE_DATES:
+        text = re.sub(pattern, token, text)
+    return text
+
+class SqlCache:
+    """
+    SQLite-backed question -> SQL store
+    Args:
+        path: defaults to SQL_CACHE_PATH (or sql_cache.sqlite3)
+        enabled: defaults to SQL_CACHE (on unless '0')
+    """
+    def __init__(self, path: Optional[str] = None, ttl: Optional[float] = None, max_entries: Optional[int] = None,
+                 enabled: Optional[bool] = None):
+        self.path = path or os.getenv('SQL_CACHE_PATH', DEFAULT_SQL_CACHE_PATH)
+        self.ttl = float(os.getenv('SQL_CACHE_TTL', DEFAULT_SQL_CACHE_TTL)) if ttl is None else ttl
+        self.max_entries = int(os.getenv('SQL_CACHE_SIZE', DEFAULT_SQL_CACHE_SIZE)) if max_entries is None else max_entries
+        self.enabled = os.getenv('SQL_CACHE', '1') != '0' if enabled is None else enabled
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if self.enabled:
+            try:
+                self._db = self._connect()
+            except sqlite3.Error as e:
+                logger.warning(f"SQL cache disabled, cannot open {self.path}: {e}")
+                self.enabled = False
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        if self.path != ':memory:':
+            db.execute('pragma journal_mode=wal')
+            db.execute('pragma synchronous=normal')
+        db.execute("""
+            create table if not exists generated_sql (
+                key text primary key,
+                question text not null,
+                sql text not null,
+                generator text not null,
+                anchor text,
+                created_at real not null,
+                last_used real not null,
+                hits integer not null default 0
+            )
+        """)
+        db.execute('create index if not exists generated_sql_last_used on generated_sql (last_used)')
+        return db
+
+    def get(self, question: str) -> Optional[Dict]:
+        """{'sql', 'generator', 'hits'} for a fresh entry, else None"""
+        if not self.enabled or not question:
+            return None
+        key = normalize_sql_question(question)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute('select sql, generator, anchor, created_at, hits from generated_sql where key = ?',
+                                   (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            sql, generator, anchor, created_at, hits = row
+            if now - created_at > self.ttl or (anchor and anchor != date.today().isoformat()):
+                self._db.execute('delete from generated_sql where key = ?', (key,))
+                self.misses += 1
+                return None
+            self._db.execute('update generated_sql set last_used = ?, hits = hits + 1 where key = ?', (now, key))
+            self.hits += 1
+        return {'sql': sql, 'generator': generator, 'hits': hits + 1}
+
+    def put(self, question: str, sql: str, generator: str):
+        if not self.enabled or not question or not sql:
+            return
+        key = normalize_sql_question(question)
+        anchor = date.today().isoformat() if self._pins_today(key, sql) else None
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                'insert or replace into generated_sql (key, question, sql, generator, anchor, created_at, last_used, hits) '
+                'values (?, ?, ?, ?, ?, ?, ?, 0)', (key, question, sql, generator, anchor, now, now)
+            )
+            self._db.execute(
+                'delete from generated_sql where key in (select key from generated_sql order by last_used desc '
+                'limit -1 offset ?)', (self.max_entries,)
+            )
+
+    @staticmethod
+    def _pins_today(key: str, sql: str) -> bool:
+        """
+        True when the SQL has dates computed from today: any date or year for a
+        question with a relative-date token, or a year the question never mentions
+        (relative phrasings outside RELATIVE_DATES, e.g. "last 30 days")
+        """
+        years = {quoted or bare for quoted, bare in _SQL_YEARS.findall(sql)}
+        if not years:
+            return False
+        return '<' in key or not years <= set(re.findall(r'\d{4}', key))
+
+    def discard(self, question: str):
+        """Drop the entry for a question whose SQL was rejected or failed to run"""
+        if not self.enabled or not question:
+            return
+        with self._lock:
+            self._db.execute('delete from generated_sql where key = ?', (normalize_sql_question(question),))
+
+    def clear(self):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._db.execute('delete from generated_sql')
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+            self.enabled = False
+
+    def stats(self) -> Dict:
+        entries, by_generator = 0, {}
+        if self.enabled:
+            with self._lock:
+                for generator, count in self._db.execute('select generator, count(*) from generated_sql group by generator'):
+                    by_generator[generator] = count
+                    entries += count
+        total = self.hits + self.misses
+        return {
+            'entries': entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            **{f"entries_{generator}": count for generator, count in by_generator.items()}
+        }
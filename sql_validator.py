@@ -0,0 +1,272 @@
+"""
+SQL validator for generated and custom queries
+Parses a statement with sqlglot and accepts it only if it is a single read-only
+query over the allow-listed tables and columns. It appends a LIMIT when the
+outer query has none and rejects statements whose estimated cost (scanned
+tables, unconstrained joins, missing date filters) is too high. Verdicts are
+cached by a hash of the whitespace/case-normalized SQL, so a repeated query
+skips parsing
+"""
+import hashlib
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Set
+
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import ParseError
+
+# Columns a query may read, per table (users.email is deliberately left out)
+ALLOWED_COLUMNS: Dict[str, Set[str]] = {
+    'expenses': {'id', 'user_id', 'category_id', 'expense_detail', 'amount', 'currency', 'original_amount',
+                 'original_currency', 'expense_date', 'paid_by', 'timestamp', 'notes'},
+    'categories': {'id', 'name', 'description', 'created_at'},
+    'budgets': {'id', 'category_id', 'amount', 'currency', 'month', 'year', 'created_at'},
+    'users': {'id', 'telegram_id', 'name', 'created_at'},
+    'currency_rates': {'id', 'base_currency', 'target_currency', 'rate', 'updated_at'},
+}
+
+# Tables with columns outside the allow-list: SELECT * / t.* would expose them
+RESTRICTED_STAR_TABLES = {'users'}
+
+# Relative cost of scanning each table; a date filter on expense_date divides the expenses scan
+TABLE_COST = {'expenses': 100, 'budgets': 10, 'categories': 1, 'users': 1, 'currency_rates': 1}
+DATE_FILTER_DISCOUNT = 10
+
+# Statements above this estimated cost are rejected
+DEFAULT_MAX_COST = 1000
+
+# LIMIT appended to queries that have none
+DEFAULT_LIMIT = 200
+
+# Cached verdicts (least recently used are evicted first)
+DEFAULT_CACHE_SIZE = 512
+
+# Nodes that write, lock or reach outside a plain SELECT
+FORBIDDEN_NODES = (exp.Insert, exp.Update, exp.Delete, exp.Merge, exp.Create, exp.Drop, exp.Alter,
+                   exp.Command, exp.Into, exp.Lock, exp.Set, exp.Transaction, exp.Commit, exp.Rollback)
+
+# Function names (unknown to sqlglot) that read server state or files, sleep or run SQL
+FORBIDDEN_FUNCTIONS = re.compile(r'^(pg_|lo_|dblink|set_config|current_setting|query_to_xml|txid_|copy)', re.I)
+
+_LITERAL = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")")
+
+def normalize_sql(sql: str) -> str:
+    """Collapse whitespace, lowercase outside quotes and drop trailing semicolons"""
+    parts = _LITERAL.split(str(sql or '').strip().rstrip(';').strip())
+    return ''.join(part if i % 2 else ' '.join(part.lower().split()) for i, part in enumerate(parts))
+
+class SqlValidator:
+    """
+    validate(sql) returns a verdict dict: allowed, sql (the statement to run, with
+    the injected LIMIT), reason, cost, tables and limit_added
+    """
+    def __init__(self, max_cost: Optional[int] = None, default_limit: Optional[int] = None,
+                 cache_size: Optional[int] = None):
+        self.max_cost = int(os.getenv('SQL_MAX_COST', DEFAULT_MAX_COST)) if max_cost is None else max_cost
+        self.default_limit = int(os.getenv('SQL_DEFAULT_LIMIT', DEFAULT_LIMIT)) if default_limit is None else default_limit
+        self.cache_size = int(os.getenv('SQL_VERDICT_CACHE_SIZE', DEFAULT_CACHE_SIZE)) if cache_size is None else cache_size
+        self._verdicts: 'OrderedDict[str, Dict]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+        self.parse_seconds = 0.0
+
+    def validate(self, sql: str) -> Dict:
+        key = hashlib.sha1(normalize_sql(sql).encode()).hexdigest()
+        verdict = self._verdicts.get(key)
+        if verdict is not None:
+            self._verdicts.move_to_end(key)
+            self.hits += 1
+            return verdict
+
+        self.misses += 1
+        started = time.perf_counter()
+        verdict = self._analyze(sql)
+        self.parse_seconds += time.perf_counter() - started
+        if not verdict['allowed']:
+            self.rejected += 1
+        self._verdicts[key] = verdict
+        while len(self._verdicts) > self.cache_size:
+            self._verdicts.popitem(last=False)
+        return verdict
+
+    def _analyze(self, sql: str) -> Dict:
+        text = str(sql or '').strip().rstrip(';').strip()
+        if not text:
+            return self._reject('empty statement')
+        try:
+            statements = [statement for statement in sqlglot.parse(text, read='postgres') if statement is not None]
+        except ParseError as e:
+            return self._reject(f"unparseable SQL: {str(e).splitlines()[0]}")
+        if len(statements) != 1:
+            return self._reject('exactly one statement is allowed')
+        tree = statements[0]
+        if not isinstance(tree, exp.Query):
+            return self._reject(f"only SELECT is allowed, got {tree.key.upper()}")
+
+        forbidden = tree.find(*FORBIDDEN_NODES)
+        if forbidden is not None:
+            return self._reject(f"{forbidden.key.upper()} is not allowed in a query")
+        for function in tree.find_all(exp.Anonymous):
+            if FORBIDDEN_FUNCTIONS.match(function.name):
+                return self._reject(f"function {function.name} is not allowed")
+
+        # Tables: allow-listed ones plus the query's own CTEs; aliases resolve to either
+        ctes = {cte.alias_or_name.lower() for cte in tree.find_all(exp.CTE)}
+        tables, aliases = [], {}
+        for table in tree.find_all(exp.Table):
+            name = table.name.lower()
+            if table.db and table.db.lower() != 'public':
+                return self._reject(f"schema {table.db} is not allowed")
+            if name not in ALLOWED_COLUMNS and name not in ctes:
+                return self._reject(f"table {name} is not allowed")
+            if name in ALLOWED_COLUMNS:
+                tables.append(name)
+            aliases[table.alias_or_name.lower()] = name
+
+        reason = self._check_columns(tree, aliases)
+        if reason:
+            return self._reject(reason)
+
+        cost = self._estimate_cost(tree, tables)
+        if cost > self.max_cost:
+            return self._reject(f"estimated cost {cost} exceeds {self.max_cost}", cost)
+
+        limit_added = tree.args.get('limit') is None and tree.args.get('fetch') is None
+        if limit_added:
+            text = f"{text}\nLIMIT {self.default_limit}"
+        return {'allowed': True, 'sql': text, 'reason': None, 'cost': cost,
+                'tables': sorted(set(tables)), 'limit_added': limit_added}
+
+    def _check_columns(self, tree: exp.Expression, aliases: Dict[str, str]) -> Optional[str]:
+        for select in tree.find_all(exp.Select):
+            for projection in select.expressions:
+                star = isinstance(projection, exp.Star) or (isinstance(projection, exp.Column)
+                                                            and isinstance(projection.this, exp.Star))
+                if not star:
+                    continue
+                qualifier = projection.table.lower() if isinstance(projection, exp.Column) else ''
+                scope = {aliases.get(qualifier)} if qualifier else {aliases.get(source.alias_or_name.lower())
+                                                                    for source in select.find_all(exp.Table)}
+                if scope & RESTRICTED_STAR_TABLES:
+                    return f"SELECT * over {', '.join(sorted(scope & RESTRICTED_STAR_TABLES))} is not allowed; name the columns"
+
+        # Columns a CTE exposes: its column list, else its body's output names. The
+        # body's own columns are checked in its scope like any other SELECT
+        ctes: Dict[str, Optional[Set[str]]] = {}
+        for cte in tree.find_all(exp.CTE):
+            table_alias = cte.args.get('alias')
+            names = {column.name.lower() for column in table_alias.columns} if table_alias is not None else set()
+            ctes[cte.alias_or_name.lower()] = names or self._output_columns(cte.this, ctes)
+
+        for column in tree.find_all(exp.Column):
+            if isinstance(column.this, exp.Star):
+                continue
+            reason = self._resolve_column(column, tree, ctes)
+            if reason:
+                return reason
+        return None
+
+    def _resolve_column(self, column: exp.Column, tree: exp.Expression,
+                        ctes: Dict[str, Optional[Set[str]]]) -> Optional[str]:
+        """None if the column is readable in its scope (or an enclosing one), else the reason"""
+        name, qualifier = column.name.lower(), column.table.lower()
+        scope = column.find_ancestor(exp.Select)
+        if scope is None:
+            # ORDER BY of a UNION: only the result's columns
+            outputs = self._output_columns(tree, ctes)
+            return None if outputs is None or name in outputs else f"column {name} is not allowed"
+
+        # Output aliases name the result: ORDER BY / GROUP BY / HAVING may use them,
+        # the projection and WHERE that compute it may not
+        clause = column.find_ancestor(exp.Order, exp.Group, exp.Having, exp.Select)
+        if not qualifier and clause is not scope and name in {e.alias.lower() for e in scope.expressions
+                                                              if isinstance(e, exp.Alias)}:
+            return None
+
+        while scope is not None:
+            sources = self._sources(scope, ctes)
+            if qualifier in sources:
+                table, columns = sources[qualifier]
+                return None if columns is None or name in columns else f"column {table}.{name} is not allowed"
+            if not qualifier and any(columns is None or name in columns for _, columns in sources.values()):
+                return None
+            # Subqueries in expressions may read the enclosing query's tables; CTE and
+            # FROM/JOIN bodies may not (their outputs are what the outer query reads)
+            boundary = scope.find_ancestor(exp.CTE, exp.From, exp.Join, exp.Select)
+            scope = boundary if isinstance(boundary, exp.Select) else None
+        return f"unknown table reference {qualifier}" if qualifier else f"column {name} is not allowed"
+
+    def _sources(self, select: exp.Select, ctes: Dict[str, Optional[Set[str]]]) -> Dict[str, tuple]:
+        """alias -> (table name, readable columns or None when unknown) for a SELECT's FROM and JOINs"""
+        from_ = select.args.get('from_') or select.args.get('from')
+        items = ([from_.this] if from_ is not None else []) + [join.this for join in select.args.get('joins') or []]
+        sources = {}
+        for item in items:
+            if isinstance(item, exp.Table):
+                name = item.name.lower()
+                columns = ctes[name] if name in ctes else ALLOWED_COLUMNS.get(name, set())
+                sources[item.alias_or_name.lower()] = (name, columns)
+            elif isinstance(item, exp.Subquery):
+                sources[item.alias_or_name.lower()] = (item.alias_or_name.lower(), self._output_columns(item.this, ctes))
+        return sources
+
+    def _output_columns(self, query: exp.Expression, ctes: Dict[str, Optional[Set[str]]]) -> Optional[Set[str]]:
+        """Names a query's result exposes; None when one is unnamed (e.g. SUM(amount) without AS)"""
+        while isinstance(query, (exp.SetOperation, exp.Subquery)):
+            query = query.this
+        if not isinstance(query, exp.Select):
+            return None
+        names: Set[str] = set()
+        for projection in query.expressions:
+            if isinstance(projection, exp.Star) or (isinstance(projection, exp.Column)
+                                                    and isinstance(projection.this, exp.Star)):
+                qualifier = projection.table.lower() if isinstance(projection, exp.Column) else ''
+                for alias, (_, columns) in self._sources(query, ctes).items():
+                    if qualifier and alias != qualifier:
+                        continue
+                    if columns is None:
+                        return None
+                    names |= columns
+            elif projection.output_name:
+                names.add(projection.output_name.lower())
+            else:
+                return None
+        return names
+
+    def _estimate_cost(self, tree: exp.Expression, tables) -> int:
+        date_filtered = any(
+            isinstance(node, (exp.GT, exp.GTE, exp.LT, exp.LTE, exp.EQ, exp.Between))
+            and any(column.name.lower() == 'expense_date' for column in node.find_all(exp.Column))
+            for where in tree.find_all(exp.Where) for node in where.walk()
+        )
+        cost = 0
+        for name in tables:
+            weight = TABLE_COST.get(name, 1)
+            if name == 'expenses' and date_filtered:
+                weight = max(1, weight // DATE_FILTER_DISCOUNT)
+            cost += weight
+
+        # A join without ON/USING is a cross product: multiply by the joined table's size
+        for join in tree.find_all(exp.Join):
+            if join.args.get('on') is None and not join.args.get('using'):
+                joined = join.this.name.lower() if isinstance(join.this, exp.Table) else ''
+                cost *= TABLE_COST.get(joined, 10)
+        return cost
+
+    def _reject(self, reason: str, cost: int = 0) -> Dict:
+        return {'allowed': False, 'sql': None, 'reason': reason, 'cost': cost, 'tables': [], 'limit_added': False}
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            'cached_verdicts': len(self._verdicts),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'rejected': self.rejected,
+            'avg_parse_ms': self.parse_seconds / self.misses * 1000 if self.misses else 0.0
+        }
@@ -0,0 +1,79 @@
+"""
+Staged startup for hybrid_bot
+The 'core' stage (database, classifier, parser, currency, conversation memory)
+is built before the bot accepts updates. The LangGraph agent - langchain,
+langgraph and their OpenAI clients, most of the import time - loads afterwards
+in the background. Readiness tracks the stages so handlers can send early
+messages to the cheap paths and let the rest wait for the agent
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Seconds a message that needs the agent waits for it while the bot is starting
+DEFAULT_AGENT_WAIT = 20.0
+
+STAGES = ('starting', 'core', 'ready', 'failed')
+
+class Readiness:
+    """Startup stage of the bot plus the time each stage took to reach"""
+    def __init__(self, agent_wait: Optional[float] = None):
+        self.agent_wait = float(os.getenv('STARTUP_AGENT_WAIT', DEFAULT_AGENT_WAIT)) if agent_wait is None else agent_wait
+        self.stage = 'starting'
+        self.error: Optional[BaseException] = None
+        self.started_at = time.monotonic()
+        self.timings: Dict[str, float] = {}
+        self._settled: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def is_ready(self) -> bool:
+        return self.stage == 'ready'
+
+    def mark(self, stage: str):
+        self.stage = stage
+        self.timings[stage] = time.monotonic() - self.started_at
+        logger.info(f"🚦 Startup stage '{stage}' after {self.timings[stage] * 1000:.0f} ms")
+
+    def _event(self) -> asyncio.Event:
+        if self._settled is None:
+            self._settled = asyncio.Event()
+        return self._settled
+
+    def load_in_background(self, loader: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        """Run the last stage as a task; 'ready' once it returns, 'failed' if it raises"""
+        settled = self._event()
+
+        async def run():
+            try:
+                await loader()
+                self.mark('ready')
+            except Exception as e:
+                self.error = e
+                self.mark('failed')
+                logger.error(f"Agent failed to load, only the direct expense path is available: {e}", exc_info=True)
+            finally:
+                settled.set()
+
+        self._task = asyncio.ensure_future(run())
+        return self._task
+
+    async def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """Wait (up to STARTUP_AGENT_WAIT seconds) for the agent; True when it's available"""
+        if self.stage not in ('ready', 'failed'):
+            try:
+                await asyncio.wait_for(self._event().wait(), self.agent_wait if timeout is None else timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.is_ready
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'stage': self.stage,
+            'timings_ms': {stage: round(seconds * 1000) for stage, seconds in self.timings.items()},
+            'error': str(self.error) if self.error else None
+        }
@@ -0,0 +1,219 @@
+"""
+Streaming Telegram replies for hybrid_bot
+Sends a typing indicator at once, posts a placeholder as soon as the agent starts
+working, and edits it with tool progress and the streamed answer - throttled to
+Telegram's message edit limits - before swapping in the final reply
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Any, List, Optional
+
+from telegram.constants import ChatAction
+from telegram.error import BadRequest, RetryAfter
+
+logger = logging.getLogger(__name__)
+
+# Minimum seconds between edits of one message (Telegram allows about one per
+# second in private chats and 20 messages per minute in groups)
+DEFAULT_EDIT_INTERVAL = 1.0
+DEFAULT_GROUP_EDIT_INTERVAL = 3.0
+
+# Telegram shows a chat action for 5 seconds; refresh it a little sooner
+TYPING_REFRESH = 4.0
+
+# Longest text Telegram accepts in one message
+TELEGRAM_MAX_MESSAGE = 4096
+
+PLACEHOLDER = "🤖 Working on it…"
+
+# Progress line shown while an agent tool runs
+TOOL_LABELS = {
+    'parse_expense': 'Reading the expense',
+    'classify_expense': 'Choosing a category',
+    'convert_currency': 'Converting currency',
+    'insert_expense': 'Saving the expense',
+    'sql_query': 'Querying your expenses',
+}
+
+def split_message(text: str, limit: int = TELEGRAM_MAX_MESSAGE) -> List[str]:
+    """Split text into Telegram-sized chunks, preferring line breaks"""
+    chunks = []
+    while len(text) > limit:
+        cut = text.rfind('\n', 0, limit)
+        if cut <= 0:
+            cut = limit
+        chunks.append(text[:cut])
+        text = text[cut:].lstrip('\n')
+    return chunks + [text] if text or not chunks else chunks
+
+def _seconds(value: Any) -> float:
+    return value.total_seconds() if hasattr(value, 'total_seconds') else float(value)
+
+class StreamingReply:
+    """
+    One streamed answer in a chat. Pass `on_progress` to FinAIAgent.process_message,
+    then call finish() with the final text
+    """
+    def __init__(self, bot, chat_id: int, is_group: bool = False, edit_interval: Optional[float] = None):
+        self.bot = bot
+        self.chat_id = chat_id
+        if edit_interval is None:
+            if is_group:
+                edit_interval = float(os.getenv('STREAM_GROUP_EDIT_INTERVAL', DEFAULT_GROUP_EDIT_INTERVAL))
+            else:
+                edit_interval = float(os.getenv('STREAM_EDIT_INTERVAL', DEFAULT_EDIT_INTERVAL))
+        self.edit_interval = edit_interval
+        self.message = None
+
+        self._tools: List[List] = []  # [name, done]
+        self._tokens = ''
+        self._shown = None
+        self._changed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._posting: Optional[asyncio.Future] = None
+        self._last_edit = 0.0
+
+        # Timing (monotonic seconds)
+        self.started_at = time.monotonic()
+        self.first_byte_at: Optional[float] = None
+        self.edits = 0
+
+    async def start(self):
+        """Show the typing indicator now and keep it alive until finish()"""
+        self.started_at = time.monotonic()
+        await self._typing()
+        self._task = asyncio.ensure_future(self._run())
+
+    def on_progress(self, kind: str, data: Any = None):
+        """FinAIAgent progress callback; only records state, the edit loop does the I/O"""
+        if kind == 'model_start':
+            # A new model step: text streamed by a step that then called tools is replaced
+            self._tokens = ''
+        elif kind == 'token':
+            self._tokens += data
+        elif kind == 'tool_start':
+            self._tools.append([data, False])
+        elif kind == 'tool_end':
+            for tool in self._tools:
+                if tool[0] == data and not tool[1]:
+                    tool[1] = True
+                    break
+        self._changed.set()
+
+    def render(self) -> str:
+        lines = [
+            f"{'✅' if done else '⏳'} {TOOL_LABELS.get(name, name)}{'' if done else '…'}"
+            for name, done in self._tools
+        ]
+        text = '\n'.join(lines + ([self._tokens.strip()] if self._tokens.strip() else []))
+        if not self._tokens.strip():
+            text = f"{PLACEHOLDER}\n{text}" if text else PLACEHOLDER
+        # While streaming, show the tail of an answer longer than one message
+        return text if len(text) <= TELEGRAM_MAX_MESSAGE else '…' + text[-(TELEGRAM_MAX_MESSAGE - 1):]
+
+    async def _typing(self):
+        try:
+            await self.bot.send_chat_action(self.chat_id, ChatAction.TYPING)
+        except Exception as e:
+            logger.debug(f"Typing indicator failed for chat {self.chat_id}: {e}")
+
+    async def _run(self):
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self._changed.wait(), timeout=TYPING_REFRESH)
+                except asyncio.TimeoutError:
+                    await self._typing()
+                    continue
+
+                if self.message is None:
+                    self._changed.clear()
+                    text = self.render()
+                    # Shielded so finish() can still pick the message up if it cancels us mid-send
+                    self._posting = asyncio.ensure_future(self.bot.send_message(self.chat_id, text))
+                    self.message = await asyncio.shield(self._posting)
+                    self.first_byte_at = time.monotonic()
+                    self._shown, self._last_edit = text, self.first_byte_at
+                    continue
+
+                delay = self._last_edit + self.edit_interval - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                self._changed.clear()
+                await self._edit(self.render())
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Streaming reply to chat {self.chat_id} stopped: {e}")
+
+    async def _edit(self, text: str, parse_mode: Optional[str] = None) -> bool:
+        if text == self._shown and parse_mode is None:
+            return True
+        try:
+            await self.bot.edit_message_text(
+                text, chat_id=self.chat_id, message_id=self.message.message_id, parse_mode=parse_mode
+            )
+        except RetryAfter as e:
+            # Flood control: wait it out, the next edit carries the latest text anyway
+            await asyncio.sleep(_seconds(e.retry_after))
+            return False
+        except BadRequest as e:
+            if 'not modified' not in str(e).lower():
+                raise
+        self._shown, self._last_edit = text, time.monotonic()
+        self.edits += 1
+        return True
+
+    async def _stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self.message is None and self._posting is not None:
+            try:
+                self.message = await self._posting
+                self.first_byte_at = self.first_byte_at or time.monotonic()
+            except Exception:
+                pass
+
+    async def finish(self, text: str, parse_mode: Optional[str] = None) -> bool:
+        """
+        Replace the placeholder with the final answer (extra chunks are sent as new
+        messages). Returns False when no placeholder was posted or it couldn't be
+        edited, so the caller should reply normally
+        """
+        await self._stop()
+        if self.message is None:
+            return False
+
+        chunks = split_message(text)
+        try:
+            try:
+                await self._final_edit(chunks[0], parse_mode)
+            except BadRequest:
+                if parse_mode is None:
+                    raise
+                # Unbalanced Markdown from the model: fall back to plain text
+                parse_mode = None
+                await self._final_edit(chunks[0], None)
+            for chunk in chunks[1:]:
+                await self.bot.send_message(self.chat_id, chunk, parse_mode=parse_mode)
+        except Exception as e:
+            logger.warning(f"Final streamed edit failed for chat {self.chat_id}: {e}")
+            return False
+
+        if self.first_byte_at is not None:
+            logger.info(
+                f"Streamed reply in chat {self.chat_id}: first byte {(self.first_byte_at - self.started_at) * 1000:.0f} ms, "
+                f"done {(time.monotonic() - self.started_at) * 1000:.0f} ms, {self.edits} edits"
+            )
+        return True
+
+    async def _final_edit(self, text: str, parse_mode: Optional[str]):
+        # The final edit must land: wait out flood control instead of dropping it
+        while not await self._edit(text, parse_mode):
+            pass
@@ -0,0 +1,169 @@
+"""
+Structured, non-blocking logging for FinAIssistant
+configure_logging() routes every record through a bounded queue: the event loop
+only enqueues, a listener thread formats and writes. Messages are capped at
+LOG_MAX_CHARS, LOG_FORMAT=json writes one JSON object per line with the
+record's extra fields, and records logged with extra={'sample_rate': r} are
+kept 1 in round(1/r) per call site. preview() renders large values (SQL text,
+result sets) lazily and within a fixed size
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import reprlib
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+
+# Longest message written (longer ones are cut and marked)
+DEFAULT_MAX_CHARS = 2000
+
+# Records buffered for the writer thread; beyond this new records are dropped and counted
+DEFAULT_QUEUE_SIZE = 10000
+
+# preview(): list items / characters rendered
+DEFAULT_PREVIEW_ITEMS = 3
+DEFAULT_PREVIEW_CHARS = 300
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# LogRecord attributes that aren't user fields (everything else came in through extra=)
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+class Preview:
+    """
+    Lazy, bounded str() of a value: nothing is rendered unless the record is
+    actually emitted, and then only the first items and at most `chars` characters
+    """
+    __slots__ = ('value', 'items', 'chars')
+
+    def __init__(self, value: Any, items: int = DEFAULT_PREVIEW_ITEMS, chars: int = DEFAULT_PREVIEW_CHARS):
+        self.value = value
+        self.items = items
+        self.chars = chars
+
+    def __str__(self) -> str:
+        value = self.value
+        if isinstance(value, str):
+            text = value if len(value) <= self.chars else f"{value[:self.chars]}… ({len(value)} chars)"
+            return ' '.join(text.split())
+        shortener = reprlib.Repr()
+        shortener.maxlist = shortener.maxtuple = shortener.maxdict = self.items
+        shortener.maxstring = shortener.maxother = 80
+        shortener.maxlevel = 3
+        text = shortener.repr(value)
+        if isinstance(value, (list, tuple)) and len(value) > self.items:
+            text += f" ({len(value)} items)"
+        return text if len(text) <= self.chars else f"{text[:self.chars]}…"
+
+    __repr__ = __str__
+
+def preview(value: Any, items: int = DEFAULT_PREVIEW_ITEMS, chars: int = DEFAULT_PREVIEW_CHARS) -> Preview:
+    return Preview(value, items, chars)
+
+class SamplingFilter(logging.Filter):
+    """Keeps 1 in round(1/sample_rate) of the records a call site logs with a sample_rate"""
+    def __init__(self):
+        super().__init__()
+        self._seen: Dict[tuple, int] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = getattr(record, 'sample_rate', None)
+        if rate is None or rate >= 1:
+            return True
+        if rate <= 0:
+            return False
+        every = max(1, round(1 / rate))
+        key = (record.pathname, record.lineno)
+        with self._lock:
+            seen = self._seen.get(key, 0)
+            self._seen[key] = seen + 1
+        if seen % every:
+            return False
+        record.sampled_1_in = every
+        return True
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    QueueHandler that caps the merged message and drops records (counting them)
+    instead of blocking when the writer thread falls behind
+    """
+    def __init__(self, log_queue: queue.Queue, max_chars: int = DEFAULT_MAX_CHARS):
+        super().__init__(log_queue)
+        self.max_chars = max_chars
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge args now (they may change before the listener runs) and cut the result
+        message = record.getMessage()
+        if len(message) > self.max_chars:
+            message = f"{message[:self.max_chars]}… [{len(message) - self.max_chars} chars truncated]"
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.message = record.msg = message
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg plus the record's extra fields"""
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            'ts': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith('_'):
+                payload[key] = value
+        if record.exc_text:
+            payload['exc'] = record.exc_text
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[BoundedQueueHandler] = None
+
+def configure_logging(level: Optional[str] = None, fmt: Optional[str] = None, stream=None) -> BoundedQueueHandler:
+    """
+    Route the root logger through the queue (LOG_LEVEL, default INFO; LOG_FORMAT
+    text or json; LOG_MAX_CHARS; LOG_QUEUE_SIZE). Safe to call again, e.g. in tests
+    """
+    global _listener, _queue_handler
+    level = level or os.getenv('LOG_LEVEL', 'INFO')
+    fmt = fmt or os.getenv('LOG_FORMAT', 'text')
+
+    writer = logging.StreamHandler(stream)
+    writer.setFormatter(JsonFormatter() if fmt == 'json' else logging.Formatter(TEXT_FORMAT))
+    log_queue = queue.Queue(maxsize=int(os.getenv('LOG_QUEUE_SIZE', DEFAULT_QUEUE_SIZE)))
+    handler = BoundedQueueHandler(log_queue, int(os.getenv('LOG_MAX_CHARS', DEFAULT_MAX_CHARS)))
+    handler.addFilter(SamplingFilter())
+
+    shutdown_logging()
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level.upper())
+    _listener = QueueListener(log_queue, writer, respect_handler_level=True)
+    _listener.start()
+    _queue_handler = handler
+    return handler
+
+def shutdown_logging():
+    """Flush the queue and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    if _queue_handler is not None and _queue_handler.dropped:
+        logging.getLogger(__name__).warning(f"{_queue_handler.dropped} log records were dropped (queue full)")
+
+atexit.register(shutdown_logging)
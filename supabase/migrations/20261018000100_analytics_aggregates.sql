@@ -0,0 +1,94 @@
+-- Server-side aggregation for the SqlQueryTool templates
+-- Called through PostgREST (client.rpc) so only aggregated rows leave the database.
+-- Date bounds are inclusive; NULL means "unbounded".
+
+create index if not exists expenses_expense_date_idx on public.expenses (expense_date);
+create index if not exists budgets_year_month_idx on public.budgets (year, month);
+
+-- week_total, month_total, today_total, yesterday_total, total_spent_period
+create or replace function public.expense_total(
+    p_start_date date default null,
+    p_end_date date default null
+)
+returns table (total numeric, count bigint)
+language sql
+stable
+as $$
+    select coalesce(sum(e.amount), 0), count(*)
+    from public.expenses e
+    where (p_start_date is null or e.expense_date >= p_start_date)
+      and (p_end_date is null or e.expense_date <= p_end_date)
+$$;
+
+-- month_by_category, today_by_category, yesterday_by_category,
+-- expenses_by_category, top_categories_period, custom_month_category_*
+create or replace function public.expense_totals_by_category(
+    p_start_date date default null,
+    p_end_date date default null,
+    p_limit integer default null
+)
+returns table (category text, total numeric, count bigint)
+language sql
+stable
+as $$
+    select c.name, sum(e.amount), count(*)
+    from public.expenses e
+    join public.categories c on c.id = e.category_id
+    where (p_start_date is null or e.expense_date >= p_start_date)
+      and (p_end_date is null or e.expense_date <= p_end_date)
+    group by c.id, c.name
+    order by sum(e.amount) desc
+    limit p_limit
+$$;
+
+-- total_budget
+create or replace function public.budget_total(
+    p_month integer,
+    p_year integer
+)
+returns table (total numeric)
+language sql
+stable
+as $$
+    select coalesce(sum(b.amount), 0)
+    from public.budgets b
+    where b.month = p_month
+      and b.year = p_year
+$$;
+
+-- budget_vs_spending (p_month/p_year set), custom_month_budget_* (NULL = static budget table)
+create or replace function public.budget_vs_spending(
+    p_start_date date,
+    p_end_date date,
+    p_month integer default null,
+    p_year integer default null
+)
+returns table (category_name text, budget numeric, spent numeric, remaining numeric, percent_used numeric)
+language sql
+stable
+as $$
+    with spending as (
+        select e.category_id, sum(e.amount) as spent_amount
+        from public.expenses e
+        where e.expense_date >= p_start_date
+          and e.expense_date <= p_end_date
+        group by e.category_id
+    )
+    select
+        c.name,
+        b.amount,
+        coalesce(s.spent_amount, 0),
+        b.amount - coalesce(s.spent_amount, 0),
+        case when b.amount > 0 then coalesce(s.spent_amount, 0) / b.amount * 100 else 0 end
+    from public.budgets b
+    join public.categories c on c.id = b.category_id
+    left join spending s on s.category_id = b.category_id
+    where (p_month is null or b.month = p_month)
+      and (p_year is null or b.year = p_year)
+    order by 5 desc
+$$;
+
+grant execute on function public.expense_total(date, date) to service_role;
+grant execute on function public.expense_totals_by_category(date, date, integer) to service_role;
+grant execute on function public.budget_total(integer, integer) to service_role;
+grant execute on function public.budget_vs_spending(date, date, integer, integer) to service_role;
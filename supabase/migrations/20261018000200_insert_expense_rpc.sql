@@ -0,0 +1,77 @@
+-- Single round-trip expense insert for the bot
+-- Resolves the Telegram user, their name (paid_by), the category (id or name) and the
+-- FX rate to MXN, then inserts - replacing the users/categories/currency_rates selects
+-- SupabaseClient.insert_expense used to make before the insert itself.
+
+create index if not exists currency_rates_pair_idx on public.currency_rates (base_currency, target_currency);
+
+create or replace function public.insert_expense_for_telegram(
+    p_telegram_id text,
+    p_category text,
+    p_expense_detail text,
+    p_amount numeric,
+    p_currency text default 'MXN',
+    p_expense_date date default null,
+    p_notes text default null
+)
+returns setof public.expenses
+language plpgsql
+as $$
+declare
+    v_user_id uuid;
+    v_user_name text;
+    v_category_id uuid;
+    v_rate numeric;
+    v_amount numeric := p_amount;
+    v_currency text := 'MXN';
+begin
+    select u.id, u.name into v_user_id, v_user_name
+    from public.users u
+    where u.telegram_id = p_telegram_id;
+    if not found then
+        raise exception 'User not found for Telegram ID: %', p_telegram_id using errcode = 'P0002';
+    end if;
+
+    -- Category by id first, then by case-insensitive name
+    select c.id into v_category_id
+    from public.categories c
+    where c.id::text = p_category or lower(c.name) = lower(p_category)
+    order by (c.id::text = p_category) desc
+    limit 1;
+    if v_category_id is null then
+        raise exception 'Category not found: %', p_category using errcode = 'P0002';
+    end if;
+
+    -- Same lookup order as get_currency_rate: direct pair, then the reverse pair
+    if upper(p_currency) <> 'MXN' then
+        select r.rate into v_rate
+        from public.currency_rates r
+        where r.base_currency = upper(p_currency) and r.target_currency = 'MXN';
+        if found then
+            v_amount := p_amount * v_rate;
+        else
+            select r.rate into v_rate
+            from public.currency_rates r
+            where r.base_currency = 'MXN' and r.target_currency = upper(p_currency);
+            if found then
+                v_amount := p_amount / v_rate;
+            else
+                v_currency := p_currency;
+            end if;
+        end if;
+    end if;
+
+    return query
+    insert into public.expenses (
+        user_id, category_id, expense_detail, amount, original_amount, original_currency,
+        currency, expense_date, paid_by, "timestamp", notes
+    )
+    values (
+        v_user_id, v_category_id, p_expense_detail, v_amount, p_amount, p_currency,
+        v_currency, coalesce(p_expense_date, current_date), coalesce(v_user_name, 'Unknown User'), now(), p_notes
+    )
+    returning *;
+end;
+$$;
+
+grant execute on function public.insert_expense_for_telegram(text, text, text, numeric, text, date, text) to service_role;
@@ -0,0 +1,17 @@
+-- Versioned, batched currency rate updates
+-- CurrencyConverter.update_currency_rates writes every pair of a feed in one upsert
+-- keyed by (base_currency, target_currency) and stamps the rows with the feed's
+-- updated_at, which the in-process rate matrix uses to pick the newer direction.
+
+alter table public.currency_rates add column if not exists updated_at timestamptz not null default now();
+
+-- Keep the most recently updated row of any duplicated pair
+delete from public.currency_rates r
+using public.currency_rates newer
+where r.base_currency = newer.base_currency
+  and r.target_currency = newer.target_currency
+  and (r.updated_at, r.id::text) < (newer.updated_at, newer.id::text);
+
+-- The upsert conflict target; supersedes the plain lookup index
+create unique index if not exists currency_rates_pair_key on public.currency_rates (base_currency, target_currency);
+drop index if exists public.currency_rates_pair_idx;
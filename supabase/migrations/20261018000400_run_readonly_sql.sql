@@ -0,0 +1,62 @@
+-- Guarded execution of generated SQL (SqlQueryTool dynamic_sql)
+-- The validated SELECT runs in Postgres and only its result rows come back,
+-- instead of SupabaseClient downloading every expense in a date range and
+-- emulating SUM/MAX/ORDER BY/LIMIT in Python.
+--
+-- Layers, each sufficient to stop writes on its own:
+--   * the function is SECURITY DEFINER owned by finai_readonly, a NOLOGIN role
+--     that can only SELECT the analytics tables
+--   * it is STABLE, so PostgREST calls it in a READ ONLY transaction
+--   * the statement is embedded as a subquery, where data-modifying CTEs and
+--     multiple statements are rejected by the parser
+-- statement_timeout in the SET clause is applied by PostgREST (12+) as a
+-- transaction setting before the call; p_max_rows caps what is returned.
+
+do $$
+begin
+    if not exists (select 1 from pg_roles where rolname = 'finai_readonly') then
+        create role finai_readonly nologin noinherit;
+    end if;
+end;
+$$;
+
+grant usage on schema public to finai_readonly;
+grant select on public.expenses, public.categories, public.users, public.budgets, public.currency_rates
+    to finai_readonly;
+
+create or replace function public.run_readonly_sql(
+    p_sql text,
+    p_max_rows integer default 1000
+)
+returns jsonb
+language plpgsql
+stable
+security definer
+set search_path = public, pg_temp
+set statement_timeout = '5s'
+as $$
+declare
+    v_sql text := regexp_replace(p_sql, '[\s;]+$', '');
+    v_rows jsonb;
+begin
+    if v_sql !~* '^\s*(select|with)\s' then
+        raise exception 'Only SELECT statements are allowed' using errcode = '42501';
+    end if;
+    if position(';' in v_sql) > 0 then
+        raise exception 'Only a single statement is allowed' using errcode = '42601';
+    end if;
+
+    execute format(
+        'select coalesce(jsonb_agg(to_jsonb(q)), ''[]''::jsonb) from (select * from (%s) s limit %s) q',
+        v_sql, least(greatest(coalesce(p_max_rows, 1000), 1), 5000)
+    ) into v_rows;
+    return v_rows;
+end;
+$$;
+
+-- A new owner needs CREATE on the schema at the time of the change only
+grant create on schema public to finai_readonly;
+alter function public.run_readonly_sql(text, integer) owner to finai_readonly;
+revoke create on schema public from finai_readonly;
+revoke execute on function public.run_readonly_sql(text, integer) from public, anon, authenticated;
+grant execute on function public.run_readonly_sql(text, integer) to service_role;
@@ -0,0 +1,69 @@
+-- insert_expense_for_telegram, corrected
+-- users.telegram_id is a bigint, so the text parameter failed every call with
+-- 42883 (operator does not exist: bigint = text). The function also resolved only
+-- direct and reverse FX rows; cross rates are triangulated by the client's rate
+-- matrix (currency.RateMatrix), so the client now passes the MXN amount it
+-- converted with that snapshot and the function no longer reads currency_rates.
+
+drop function if exists public.insert_expense_for_telegram(text, text, text, numeric, text, date, text);
+
+create or replace function public.insert_expense_for_telegram(
+    p_telegram_id bigint,
+    p_category text,
+    p_expense_detail text,
+    p_amount numeric,
+    p_currency text default 'MXN',
+    p_expense_date date default null,
+    p_notes text default null,
+    p_amount_mxn numeric default null
+)
+returns setof public.expenses
+language plpgsql
+as $$
+declare
+    v_user_id uuid;
+    v_user_name text;
+    v_category_id uuid;
+    v_amount numeric := p_amount;
+    v_currency text := 'MXN';
+begin
+    select u.id, u.name into v_user_id, v_user_name
+    from public.users u
+    where u.telegram_id = p_telegram_id;
+    if not found then
+        raise exception 'User not found for Telegram ID: %', p_telegram_id using errcode = 'P0002';
+    end if;
+
+    -- Category by id first, then by case-insensitive name
+    select c.id into v_category_id
+    from public.categories c
+    where c.id::text = p_category or lower(c.name) = lower(p_category)
+    order by (c.id::text = p_category) desc
+    limit 1;
+    if v_category_id is null then
+        raise exception 'Category not found: %', p_category using errcode = 'P0002';
+    end if;
+
+    -- No MXN amount for a foreign currency: no rate path, keep the original currency
+    if upper(p_currency) <> 'MXN' then
+        if p_amount_mxn is not null then
+            v_amount := p_amount_mxn;
+        else
+            v_currency := p_currency;
+        end if;
+    end if;
+
+    return query
+    insert into public.expenses (
+        user_id, category_id, expense_detail, amount, original_amount, original_currency,
+        currency, expense_date, paid_by, "timestamp", notes
+    )
+    values (
+        v_user_id, v_category_id, p_expense_detail, v_amount, p_amount, p_currency,
+        v_currency, coalesce(p_expense_date, current_date), coalesce(v_user_name, 'Unknown User'), now(), p_notes
+    )
+    returning *;
+end;
+$$;
+
+grant execute on function public.insert_expense_for_telegram(bigint, text, text, numeric, text, date, text, numeric) to service_role;
@@ -0,0 +1,35 @@
+-- run_readonly_sql, corrected
+-- The statement was embedded as "(%s) s limit n" on one line, so generated SQL
+-- ending in a "-- comment" commented out the closing parenthesis and the limit,
+-- and valid queries failed with a syntax error. The placeholder now ends its line.
+-- create or replace keeps the owner (finai_readonly) and the grants.
+
+create or replace function public.run_readonly_sql(
+    p_sql text,
+    p_max_rows integer default 1000
+)
+returns jsonb
+language plpgsql
+stable
+security definer
+set search_path = public, pg_temp
+set statement_timeout = '5s'
+as $$
+declare
+    v_sql text := regexp_replace(p_sql, '[\s;]+$', '');
+    v_rows jsonb;
+begin
+    if v_sql !~* '^\s*(select|with)\s' then
+        raise exception 'Only SELECT statements are allowed' using errcode = '42501';
+    end if;
+    if position(';' in v_sql) > 0 then
+        raise exception 'Only a single statement is allowed' using errcode = '42601';
+    end if;
+
+    execute format(
+        E'select coalesce(jsonb_agg(to_jsonb(q)), ''[]''::jsonb) from (select * from (%s\n) s limit %s) q',
+        v_sql, least(greatest(coalesce(p_max_rows, 1000), 1), 5000)
+    ) into v_rows;
+    return v_rows;
+end;
+$$;
@@ -0,0 +1,49 @@
+"""ChatUpdateProcessor: a flooding chat can't take the slots other chats need"""
+import asyncio
+from types import SimpleNamespace
+
+from concurrency import ChatUpdateProcessor
+
+
+def update(chat_id, update_id=0):
+    return SimpleNamespace(effective_chat=SimpleNamespace(id=chat_id), update_id=update_id)
+
+
+def test_updates_queued_on_a_busy_chat_hold_no_slots():
+    async def scenario():
+        processor = ChatUpdateProcessor(max_concurrent_updates=2, chat_queue_limit=10)
+        release = asyncio.Event()
+        served = []
+
+        async def handler(name, wait=True):
+            if wait:
+                await release.wait()
+            served.append(name)
+
+        # Two chats flood the bot: one update each runs, the rest queue on their chat
+        flood = [asyncio.ensure_future(processor.process_update(update(chat, i), handler(f"{chat}-{i}")))
+                 for chat in ('a', 'b') for i in range(8)]
+        await asyncio.sleep(0.01)
+
+        # A third chat still gets a slot as soon as one frees up, ahead of the floods' backlog
+        other = asyncio.ensure_future(processor.process_update(update('c'), handler('c', wait=False)))
+        release.set()
+        await asyncio.gather(*flood, other)
+        return served
+
+    served = asyncio.run(scenario())
+    assert served.index('c') <= 2
+
+
+def test_chat_queue_limit_counts_running_and_queued():
+    async def scenario():
+        processor = ChatUpdateProcessor(max_concurrent_updates=4, chat_queue_limit=3)
+        release = asyncio.Event()
+        tasks = [asyncio.ensure_future(processor.process_update(update('a', i), release.wait())) for i in range(5)]
+        await asyncio.sleep(0.01)
+        release.set()
+        await asyncio.gather(*tasks)
+        return processor.stats()
+
+    stats = asyncio.run(scenario())
+    assert (stats['processed'], stats['shed'], stats['max_chat_depth']) == (3, 2, 3)
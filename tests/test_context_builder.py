@@ -0,0 +1,59 @@
+"""The default context budget must leave room for history beside the real system prompt"""
+import os
+import re
+
+import pytest
+
+from context_builder import ContextBuilder, count_tokens
+
+BREAKDOWN = "📊 Spending by category for October 2026:\n\n" + "\n".join(
+    f"• {name}: ${amount:,.2f} MXN" for name, amount in [
+        ('Groceries', 8450.5), ('Restaurants', 5230.0), ('Gas', 3120.75), ('Home', 2890.0),
+        ('Subscriptions', 1540.0), ('Health', 1320.3), ('Clothing', 1200.0), ('Others', 380.0),
+    ]
+) + "\n\n💰 Total spent: $24,131.55 MXN"
+
+# A 60-row expense listing, about 800 tokens
+LISTING = "🧾 Expenses in October 2026:\n\n" + "\n".join(
+    f"{i}. 2026-10-{i % 28 + 1:02d} — Merchant {i} — ${120 + i * 37.5:,.2f} MXN" for i in range(1, 61)
+) + "\n\n💰 Total: $75,750.00 MXN"
+
+HISTORY = [
+    ("how much did we spend by category this month?", BREAKDOWN),
+    ("Costco 120", "✅ Expense saved!\n\n💳 Costco — $120.00 MXN\n🏷 Category: Groceries"),
+    ("and september?", BREAKDOWN.replace('October', 'September')),
+    ("list my expenses this month", LISTING),
+    ("and last month?", LISTING.replace('October', 'September')),
+]
+
+
+@pytest.fixture
+def builder(monkeypatch):
+    """ContextBuilder over FinAIAgent's system prompt with the default budget"""
+    monkeypatch.delenv('AGENT_CONTEXT_BUDGET', raising=False)
+    monkeypatch.delenv('AGENT_RECENT_TURNS', raising=False)
+    with open(os.path.join(os.path.dirname(__file__), '..', 'agent.py'), encoding='utf-8') as f:
+        source = f.read()
+    prompt = re.search(r'"""(You are FinAIssistant.*?)"""', source, re.DOTALL).group(1)
+    return ContextBuilder(prompt)
+
+
+def test_system_prompt_is_not_charged_against_the_budget(builder):
+    assert count_tokens(builder.system_prompt) > builder.budget / 2
+    kept, report = builder.build(HISTORY, "[SYSTEM: user_id=1]\nand budget vs spending?")
+    assert report['history_turns'] == len(HISTORY)
+    assert report['dropped'] == 0
+    # The two most recent replies go out verbatim
+    assert kept[-2:] == HISTORY[-2:]
+    assert report['tokens_after'] - report['system_tokens'] <= builder.budget
+
+
+def test_react_step_keeps_tool_outputs_that_fit(builder):
+    from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+    messages = [HumanMessage(content='[SYSTEM: user_id=1]\ncompare august, september and october')]
+    for i, month in enumerate(('August', 'September', 'October')):
+        messages.append(AIMessage(content='', tool_calls=[{'name': 'sql_query', 'args': {}, 'id': f'c{i}'}]))
+        messages.append(ToolMessage(content=LISTING.replace('October', month), tool_call_id=f'c{i}'))
+    assert builder.pre_model_hook({'messages': messages})['llm_input_messages'] == messages
+    assert builder.steps_compacted == 0
@@ -0,0 +1,80 @@
+"""Question-like "word amount" messages must reach the agent, not the direct insert"""
+import asyncio
+import json
+
+import pytest
+
+from direct_pipeline import DirectPipeline, looks_like_question
+from parser import ExpenseParser
+
+
+class StubDatabase:
+    def __init__(self):
+        self.inserts = []
+
+    async def get_categories(self):
+        return [{'id': 'c1', 'name': 'Restaurants'}]
+
+    async def insert_expense_for_telegram_user(self, **kwargs):
+        self.inserts.append(kwargs)
+        return kwargs
+
+
+class ConfidentClassifier:
+    """Classifies anything mentioning restaurants with high confidence"""
+    async def classify_expense(self, merchant, categories, explicit_category=None):
+        return {'category_id': 'c1', 'category_name': 'Restaurants', 'confidence': 0.95}
+
+
+def run(message):
+    db = StubDatabase()
+    pipeline = DirectPipeline(db, ConfidentClassifier(), ExpenseParser(), min_confidence=0.8)
+    return asyncio.run(pipeline.process(message, 1001, [])), db.inserts
+
+
+@pytest.mark.parametrize('message', [
+    'how much restaurants 500',
+    'budget restaurants 3000',
+    'total restaurants 200',
+    'cuanto restaurantes 300',
+    'show restaurants 100',
+])
+def test_question_like_word_amount_falls_through(message):
+    reply, inserts = run(message)
+    assert reply is None
+    assert inserts == []
+
+
+@pytest.mark.parametrize('message', ['how much restaurants 500', 'budget restaurants 3000'])
+def test_parser_leaves_question_like_word_amount_to_the_llm(message):
+    assert ExpenseParser().parse_expense_text_local(message) is None
+
+
+def test_plain_entry_is_still_saved_directly():
+    reply, inserts = run('restaurant 450')
+    assert reply is not None
+    assert inserts[0]['amount'] == 450
+
+
+@pytest.mark.parametrize('message', ['spending july 2025', 'groceries in 2024', 'gastos de 2025', 'julio 2025', '2025?'])
+def test_years_in_date_context_read_as_questions(message):
+    assert looks_like_question(message)
+
+
+@pytest.mark.parametrize('message', ['rent 2000', 'groceries 2050', 'renta 2000 mxn'])
+def test_amounts_in_the_year_range_are_expenses(message):
+    assert not looks_like_question(message)
+
+
+def test_rent_sized_entry_is_saved_directly():
+    reply, inserts = run('restaurant 2000')
+    assert reply is not None
+    assert inserts[0]['amount'] == 2000
+
+
+@pytest.mark.parametrize('message, amount', [('rent 2000', 2000), ('groceries 2050', 2050)])
+def test_parse_expense_tool_keeps_year_range_amounts(message, amount):
+    from agent import ParseExpenseTool
+
+    result = json.loads(ParseExpenseTool(parser=ExpenseParser())._run(message))
+    assert result['amount'] == amount
@@ -0,0 +1,96 @@
+"""Statement import: one date format per file and only money out imported by default"""
+import asyncio
+import io
+
+import pytest
+
+from currency import RateMatrix
+from importer import BulkImporter, _DESCRIPTOR_NOISE, read_csv
+
+
+class StubDatabase:
+    def __init__(self):
+        self.inserted = []
+
+    async def get_user_by_telegram_id(self, telegram_id):
+        return {'id': 'u1', 'name': 'Ana'}
+
+    async def get_categories(self):
+        return [{'id': 'c1', 'name': 'Others'}]
+
+    async def get_rate_matrix(self):
+        return RateMatrix([])
+
+    async def insert_expenses(self, rows):
+        self.inserted.extend(rows)
+        return len(rows)
+
+
+class StubClassifier:
+    def __init__(self):
+        self.seen = []
+
+    def normalize_text(self, text):
+        return text.lower()
+
+    async def classify_expense(self, merchant, categories):
+        self.seen.append(merchant)
+        return {'category_id': 'c1', 'confidence': 1.0}
+
+
+def rows(text, date_format=None):
+    return list(read_csv(io.StringIO(text), date_format))
+
+
+def run(text, **kwargs):
+    db, classifier = StubDatabase(), StubClassifier()
+    report = asyncio.run(BulkImporter(db, classifier, **kwargs).run(read_csv(io.StringIO(text)), 1001))
+    return report, db.inserted, classifier.seen
+
+
+def test_one_date_format_per_file():
+    statement = 'Date,Description,Amount\n03/04/2025,OXXO,-10\n13/04/2025,OXXO,-20\n'
+    assert [row.expense_date for row in rows(statement)] == ['2025-04-03', '2025-04-13']
+
+
+def test_ambiguous_day_month_order_needs_a_format():
+    statement = 'Date,Description,Amount\n03/04/2025,OXXO,-10\n05/06/2025,OXXO,-20\n'
+    with pytest.raises(ValueError, match='--date-format'):
+        rows(statement)
+    assert [row.expense_date for row in rows(statement, '%m/%d/%Y')] == ['2025-03-04', '2025-05-06']
+
+
+def test_same_reading_under_every_format_is_not_ambiguous():
+    assert rows('Date,Description,Amount\n05/05/2025,OXXO,-10\n')[0].expense_date == '2025-05-05'
+
+
+def test_refunds_and_payments_are_skipped_by_default():
+    report, inserted, _ = run('Date,Description,Amount\n2025-04-01,OXXO,-120.50\n'
+                              '2025-04-02,REFUND OXXO,120.50\n2025-04-03,CARD PAYMENT,5000\n')
+    assert [row['amount'] for row in inserted] == [120.5]
+    assert report.rows_skipped == 2
+
+
+def test_debit_columns_list_charges_as_positive():
+    _, inserted, _ = run('Fecha,Concepto,Cargo\n2025-04-01,OXXO,120.50\n')
+    assert [row['amount'] for row in inserted] == [120.5]
+
+
+def test_all_keeps_credits():
+    _, inserted, _ = run('Date,Description,Amount\n2025-04-01,OXXO,-120.50\n2025-04-02,REFUND OXXO,120.50\n',
+                         negative_is_expense=None)
+    assert len(inserted) == 2
+
+
+def test_dry_run_inserts_nothing():
+    report, inserted, _ = run('Date,Description,Amount\n2025-04-01,OXXO,-120.50\n', dry_run=True)
+    assert (report.rows_prepared, report.rows_inserted, inserted) == (1, 0, [])
+
+
+@pytest.mark.parametrize('descriptor, cleaned', [
+    ('7ELEVEN 1234', '7ELEVEN'),
+    ('COSTCO WHOLESALE #452', 'COSTCO WHOLESALE'),
+    ('AMZN MKTP US*2K4LM1AB2', 'AMZN MKTP US'),
+])
+def test_descriptor_noise(descriptor, cleaned):
+    assert ' '.join(_DESCRIPTOR_NOISE.sub(' ', descriptor).split()) == cleaned
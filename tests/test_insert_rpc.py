@@ -0,0 +1,90 @@
+"""insert_expense_for_telegram_user: RPC arguments, cross rates and error handling"""
+import asyncio
+import time
+
+import pytest
+from postgrest.exceptions import APIError
+
+from currency import RateMatrix
+from database import SupabaseClient
+
+
+class StubRequest:
+    def __init__(self, outcome):
+        self.outcome = outcome
+
+    def execute(self):
+        if isinstance(self.outcome, Exception):
+            raise self.outcome
+        return type('Result', (), {'data': self.outcome})()
+
+
+class StubClient:
+    """Records rpc calls and answers each with the queued outcome"""
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+
+    def rpc(self, function, args):
+        self.calls.append((function, args))
+        return StubRequest(self.outcomes.pop(0))
+
+
+@pytest.fixture
+def db(monkeypatch):
+    monkeypatch.setenv('SUPABASE_URL', 'http://localhost:54321')
+    monkeypatch.setenv('SUPABASE_SERVICE_ROLE_KEY', 'test.test.test')
+    client = SupabaseClient(max_workers=0)
+    # USD -> MXN is only reachable through CAD
+    client._rate_matrix = RateMatrix([
+        {'base_currency': 'CAD', 'target_currency': 'MXN', 'rate': 13.3},
+        {'base_currency': 'USD', 'target_currency': 'CAD', 'rate': 1.37},
+    ])
+    client._rates_loaded_at = time.monotonic()
+    return client
+
+
+def insert(db, client, currency='MXN'):
+    db.client = client
+    return asyncio.run(db.insert_expense_for_telegram_user(
+        telegram_id=1001, category='c1', merchant='Costco', amount=100.0, currency=currency
+    ))
+
+
+def test_passes_bigint_telegram_id_and_mxn_amount(db):
+    client = StubClient([{'id': 'e1'}])
+    assert insert(db, client) == {'id': 'e1'}
+    args = client.calls[0][1]
+    assert args['p_telegram_id'] == 1001
+    assert args['p_amount_mxn'] == 100.0
+
+
+def test_cross_rate_is_converted_with_the_rate_matrix(db):
+    client = StubClient([{'id': 'e1'}])
+    insert(db, client, 'USD')
+    assert client.calls[0][1]['p_amount_mxn'] == pytest.approx(100.0 * 1.37 * 13.3)
+
+
+def test_unknown_currency_sends_no_mxn_amount(db):
+    client = StubClient([{'id': 'e1'}])
+    insert(db, client, 'JPY')
+    assert client.calls[0][1]['p_amount_mxn'] is None
+
+
+def test_42883_inside_the_function_body_is_an_error_not_a_missing_rpc(db):
+    client = StubClient(APIError({'message': 'operator does not exist: bigint = text', 'code': '42883',
+                                  'hint': None, 'details': None}))
+    with pytest.raises(Exception, match='operator does not exist'):
+        insert(db, client)
+    assert 'insert_expense_for_telegram' not in db._missing_rpcs
+
+
+@pytest.mark.parametrize('error', [
+    {'message': 'Could not find the function public.insert_expense_for_telegram in the schema cache',
+     'code': 'PGRST202'},
+    {'message': 'function public.insert_expense_for_telegram(p_telegram_id => bigint) does not exist',
+     'code': '42883'},
+])
+def test_undeployed_function_is_remembered(db, error):
+    assert db._remember_missing_rpc('insert_expense_for_telegram', APIError(dict(error, hint=None, details=None)))
+    assert 'insert_expense_for_telegram' in db._missing_rpcs
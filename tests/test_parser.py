@@ -0,0 +1,15 @@
+"""The local grammar must agree with bench_parser's corpus: same fields, same texts left to the LLM"""
+import pytest
+
+from benchmarks.bench_parser import CORPUS
+from parser import ExpenseParser
+
+
+@pytest.fixture(scope='module')
+def expense_parser():
+    return ExpenseParser()
+
+
+@pytest.mark.parametrize('text, expected', CORPUS, ids=[text for text, _ in CORPUS])
+def test_corpus(expense_parser, text, expected):
+    assert expense_parser._parse_local(text) == expected
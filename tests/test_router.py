@@ -0,0 +1,40 @@
+"""TemplateRouter: fixed templates only for questions they answer exactly"""
+import pytest
+
+from router import TemplateRouter
+
+TEMPLATES = ['week_total', 'month_total', 'today_total', 'yesterday_total', 'month_by_category',
+             'today_by_category', 'yesterday_by_category', 'total_budget', 'budget_vs_spending', 'recent_expenses']
+
+
+@pytest.fixture
+def router():
+    return TemplateRouter(TEMPLATES)
+
+
+@pytest.mark.parametrize('question, template', [
+    ('how much did we spend this month', 'month_total'),
+    ('cuanto gastamos esta semana', 'week_total'),
+    ('how much did I spend yesterday', 'yesterday_total'),
+    ('gastos por categoria este mes', 'month_by_category'),
+    ('budget vs spending', 'budget_vs_spending'),
+    ('how much money do we have left this month', 'budget_vs_spending'),
+    ('how much is remaining this month', 'budget_vs_spending'),
+    ('cuanto me queda este mes', 'budget_vs_spending'),
+])
+def test_routes(router, question, template):
+    assert router.route(question)['template_name'] == template
+
+
+@pytest.mark.parametrize('question', [
+    'how many expenses this month',
+    'cuantos gastos este mes',
+    'how much did Maria spend this month',
+    'how much has Carlos spent this week',
+    'how much did we spend this month excluding rent',
+    'how much did we spend this month except groceries',
+    'cuanto gastamos sin contar renta este mes',
+    'cuanto gastamos este mes menos la renta',
+])
+def test_defers_to_the_consultant(router, question):
+    assert router.route(question) is None
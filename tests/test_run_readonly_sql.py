@@ -0,0 +1,107 @@
+"""
+run_readonly_sql against a real Postgres: writes are rejected, the statement
+timeout and row cap apply. Needs TEST_DATABASE_URL (a superuser on a throwaway
+database) and psycopg; everything runs in one transaction that is rolled back
+"""
+import os
+
+import pytest
+
+DATABASE_URL = os.getenv('TEST_DATABASE_URL')
+
+pytestmark = pytest.mark.skipif(not DATABASE_URL, reason='TEST_DATABASE_URL not set')
+
+psycopg = pytest.importorskip('psycopg')
+from psycopg import errors  # noqa: E402
+
+MIGRATIONS = [os.path.join(os.path.dirname(__file__), '..', 'supabase', 'migrations', name)
+              for name in ('20261018000400_run_readonly_sql.sql', '20261019000200_run_readonly_sql_comments.sql')]
+
+# Stand-ins for what a Supabase project already has
+SUPABASE_SCHEMA = """
+do $$
+begin
+    if not exists (select 1 from pg_roles where rolname = 'anon') then create role anon nologin; end if;
+    if not exists (select 1 from pg_roles where rolname = 'authenticated') then create role authenticated nologin; end if;
+    if not exists (select 1 from pg_roles where rolname = 'service_role') then create role service_role nologin; end if;
+end;
+$$;
+create table if not exists public.users (id uuid primary key default gen_random_uuid(), telegram_id bigint, name text, email text);
+create table if not exists public.categories (id uuid primary key default gen_random_uuid(), name text);
+create table if not exists public.expenses (id uuid primary key default gen_random_uuid(), category_id uuid,
+    expense_detail text, amount numeric, expense_date date default current_date);
+create table if not exists public.budgets (id uuid primary key default gen_random_uuid(), category_id uuid, amount numeric);
+create table if not exists public.currency_rates (id uuid primary key default gen_random_uuid(),
+    base_currency text, target_currency text, rate numeric);
+insert into public.expenses (expense_detail, amount) select 'merchant ' || i, i from generate_series(1, 20) i;
+"""
+
+
+@pytest.fixture
+def conn():
+    connection = psycopg.connect(DATABASE_URL)
+    try:
+        connection.execute(SUPABASE_SCHEMA)
+        for migration in MIGRATIONS:
+            with open(migration, encoding='utf-8') as f:
+                connection.execute(f.read())
+        yield connection
+    finally:
+        connection.rollback()
+        connection.close()
+
+
+def call(conn, sql, max_rows=1000):
+    """The call as PostgREST makes it, with the function's statement_timeout set locally first"""
+    with conn.transaction():
+        conn.execute(
+            "select set_config('statement_timeout', split_part(setting, '=', 2), true) "
+            "from pg_proc, unnest(proconfig) setting "
+            "where proname = 'run_readonly_sql' and setting like 'statement_timeout=%%'"
+        )
+        return conn.execute('select public.run_readonly_sql(%s, %s)', (sql, max_rows)).fetchone()[0]
+
+
+def expense_count(conn):
+    return conn.execute('select count(*) from public.expenses').fetchone()[0]
+
+
+def test_select_returns_rows(conn):
+    rows = call(conn, 'SELECT SUM(amount) AS total FROM expenses')
+    assert float(rows[0]['total']) >= 210
+
+
+def test_trailing_comment(conn):
+    rows = call(conn, 'SELECT SUM(amount) AS total FROM expenses -- spending this month')
+    assert float(rows[0]['total']) >= 210
+
+
+@pytest.mark.parametrize('sql', [
+    'DELETE FROM expenses',
+    'SELECT 1; DELETE FROM expenses',
+    'WITH gone AS (DELETE FROM expenses RETURNING *) SELECT count(*) FROM gone',
+    "SELECT * FROM expenses; UPDATE expenses SET amount = 0",
+])
+def test_writes_are_rejected(conn, sql):
+    before = expense_count(conn)
+    with pytest.raises(psycopg.Error):
+        call(conn, sql)
+    assert expense_count(conn) == before
+
+
+def test_runs_as_the_readonly_role(conn):
+    # finai_readonly can read the analytics tables only
+    with pytest.raises(errors.InsufficientPrivilege):
+        call(conn, 'SELECT rolname FROM pg_authid')
+    assert call(conn, 'SELECT current_user AS role')[0]['role'] == 'finai_readonly'
+
+
+def test_statement_timeout(conn):
+    with pytest.raises(errors.QueryCanceled):
+        call(conn, 'SELECT pg_sleep(30)')
+
+
+def test_row_cap(conn):
+    assert len(call(conn, 'SELECT i FROM generate_series(1, 50) i', max_rows=10)) == 10
+    # p_max_rows is clamped to 5000
+    assert len(call(conn, 'SELECT i FROM generate_series(1, 6000) i', max_rows=100000)) == 5000
@@ -0,0 +1,51 @@
+"""Generated SQL that pins today's dates must not be served on another day"""
+from datetime import date, timedelta
+
+import pytest
+
+import sql_cache
+from sql_cache import SqlCache
+
+
+class Tomorrow(date):
+    @classmethod
+    def today(cls):
+        return date.today() + timedelta(days=1)
+
+
+@pytest.fixture
+def cache():
+    cache = SqlCache(path=':memory:', enabled=True)
+    yield cache
+    cache.close()
+
+
+def served_tomorrow(cache, monkeypatch, question, sql):
+    cache.put(question, sql, 'vanna')
+    assert cache.get(question)['sql'] == sql
+    monkeypatch.setattr(sql_cache, 'date', Tomorrow)
+    return cache.get(question) is not None
+
+
+@pytest.mark.parametrize('question, sql', [
+    ('Total spent in the last 30 days', "SELECT SUM(amount) FROM expenses WHERE expense_date >= '2026-09-19'"),
+    ('How much did I spend in the past 3 months?',
+     "SELECT SUM(amount) FROM expenses WHERE expense_date >= DATE '2026-07-19'"),
+    ('¿Cuánto gasté en los últimos 7 días?', "SELECT SUM(amount) FROM expenses WHERE expense_date >= '2026-10-12'"),
+    ('Expenses since monday', "SELECT * FROM expenses WHERE expense_date >= '2026-10-12'"),
+    ('Spending this year', 'SELECT SUM(amount) FROM expenses WHERE EXTRACT(YEAR FROM expense_date) = 2026'),
+])
+def test_relative_dates_are_anchored_to_the_day(cache, monkeypatch, question, sql):
+    assert not served_tomorrow(cache, monkeypatch, question, sql)
+
+
+@pytest.mark.parametrize('question, sql', [
+    ('Spending per person in July 2025',
+     "SELECT paid_by, SUM(amount) FROM expenses WHERE expense_date >= '2025-07-01' "
+     "AND expense_date < '2025-08-01' GROUP BY paid_by"),
+    ('Average restaurant expense', "SELECT AVG(amount) FROM expenses WHERE expense_detail ILIKE '%restaurant%'"),
+    ('Total spent in the last 30 days',
+     "SELECT SUM(amount) FROM expenses WHERE expense_date >= CURRENT_DATE - INTERVAL '30 days'"),
+])
+def test_date_independent_sql_outlives_the_day(cache, monkeypatch, question, sql):
+    assert served_tomorrow(cache, monkeypatch, question, sql)
@@ -0,0 +1,30 @@
+"""Column allow-list: aliases and CTE column lists must not re-expose a column"""
+import pytest
+
+from sql_validator import SqlValidator
+
+
+@pytest.mark.parametrize('sql', [
+    "SELECT email AS email FROM users",
+    "WITH t(email) AS (SELECT email FROM users) SELECT email FROM t",
+    "SELECT email FROM (SELECT email FROM users) t",
+    "SELECT amount AS email FROM expenses WHERE email IS NOT NULL",
+])
+def test_restricted_columns_stay_rejected(sql):
+    verdict = SqlValidator(cache_size=0).validate(sql)
+    assert not verdict['allowed']
+    assert 'email' in verdict['reason']
+
+
+@pytest.mark.parametrize('sql', [
+    "SELECT SUM(amount) AS total FROM expenses ORDER BY total DESC",
+    "SELECT c.name AS category, SUM(e.amount) AS total FROM expenses e JOIN categories c ON c.id = e.category_id "
+    "GROUP BY category HAVING SUM(e.amount) > 100 ORDER BY total",
+    "WITH monthly AS (SELECT DATE_TRUNC('month', expense_date) AS month, SUM(amount) AS total FROM expenses "
+    "GROUP BY 1) SELECT month, total FROM monthly ORDER BY month",
+    "WITH t(spent) AS (SELECT amount FROM expenses) SELECT spent FROM t",
+    "SELECT s.total FROM (SELECT SUM(amount) AS total FROM expenses) s",
+    "SELECT e.amount FROM expenses e WHERE e.category_id IN (SELECT c.id FROM categories c WHERE c.id = e.category_id)",
+])
+def test_aliases_and_ctes_still_resolve(sql):
+    assert SqlValidator(cache_size=0).validate(sql)['allowed']
@@ -4,34 +4,120 @@ Provides RAG-based Text-to-SQL generation with database-specific training
 """
 
 import os
+import json
+import hashlib
 import logging
-from typing import Optional
-from vanna.openai.openai_chat import OpenAI_Chat
-from vanna.chromadb.chromadb_vector import ChromaDB_VectorStore
+import threading
+from functools import lru_cache
+from typing import Dict, Optional
 
 logger = logging.getLogger(__name__)
 
-class SupabaseVanna(ChromaDB_VectorStore, OpenAI_Chat):
+# ChromaDB persistence directory (kept across restarts so training is only embedded once)
+DEFAULT_PERSIST_DIR = 'vanna_chroma'
+MANIFEST_FILE = 'training_manifest.json'
+
+@lru_cache(maxsize=None)
+def supabase_vanna_class():
     """
-    Vanna AI customized for Supabase/PostgreSQL
-    Combines ChromaDB vector store with OpenAI for Text-to-SQL
+    SupabaseVanna, defined on first use: vanna and chromadb take about a second
+    to import, so they load with the store instead of with this module
     """
-    def __init__(self, config=None):
-        ChromaDB_VectorStore.__init__(self, config=config)
-        OpenAI_Chat.__init__(self, config=config)
+    from vanna.openai.openai_chat import OpenAI_Chat
+    from vanna.chromadb.chromadb_vector import ChromaDB_VectorStore
+
+    class SupabaseVanna(ChromaDB_VectorStore, OpenAI_Chat):
+        """
+        Vanna AI customized for Supabase/PostgreSQL
+        Combines ChromaDB vector store with OpenAI for Text-to-SQL
+        """
+        def __init__(self, config=None):
+            ChromaDB_VectorStore.__init__(self, config=config)
+            OpenAI_Chat.__init__(self, config=config)
+
+    return SupabaseVanna
 
 
 class VannaTrainer:
     """
     Handles training and SQL generation using Vanna AI
     """
-    def __init__(self, api_key: str, model: str = "gpt-4o-mini"):
-        self.vn = SupabaseVanna(config={
+    def __init__(self, api_key: str, model: str = "gpt-4o-mini", persist_dir: Optional[str] = None):
+        self.persist_dir = persist_dir or os.getenv('VANNA_CHROMA_PATH', DEFAULT_PERSIST_DIR)
+        os.makedirs(self.persist_dir, exist_ok=True)
+        # The Vanna client (and its ChromaDB store) is opened on first use, i.e. in
+        # the training thread when training runs in the background
+        self._config = {
             'api_key': api_key,
-            'model': model
-        })
+            'model': model,
+            'path': self.persist_dir
+        }
+        self._vn = None
+        self._vn_lock = threading.Lock()
         self._is_trained = False
-        logger.info("🤖 Vanna AI initialized with model: %s", model)
+        self._training_thread: Optional[threading.Thread] = None
+        
+        # Manifest of already-embedded items: {content_hash: {'id': training_id, 'kind': ...}}
+        self.manifest_path = os.path.join(self.persist_dir, MANIFEST_FILE)
+        self._manifest: Dict[str, Dict] = self._load_manifest()
+        self._seen = set()
+        self.embedded_items = 0
+        self.skipped_items = 0
+        logger.info("🤖 Vanna AI initialized with model: %s (store: %s)", model, self.persist_dir)
+    
+    @property
+    def vn(self):
+        """The Vanna client, created (importing vanna and opening the store) on first access"""
+        with self._vn_lock:
+            if self._vn is None:
+                self._vn = supabase_vanna_class()(config=self._config)
+        return self._vn
+    
+    def _load_manifest(self) -> Dict[str, Dict]:
+        """Load the training manifest, starting fresh if it's missing or unreadable"""
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Ignoring unreadable Vanna manifest {self.manifest_path}: {e}")
+            return {}
+    
+    def _save_manifest(self):
+        """Atomically persist the training manifest"""
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self._manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+    
+    def _train(self, **item) -> str:
+        """
+        Embed one training item (ddl=, documentation= or question=/sql=)
+        Items whose content hash is already in the manifest are skipped
+        """
+        key = hashlib.sha256(json.dumps(item, sort_keys=True).encode('utf-8')).hexdigest()
+        self._seen.add(key)
+        
+        if key in self._manifest:
+            self.skipped_items += 1
+            return self._manifest[key]['id']
+        
+        training_id = self.vn.train(**item)
+        kind = 'sql' if 'sql' in item else next(iter(item))
+        self._manifest[key] = {'id': training_id, 'kind': kind}
+        self.embedded_items += 1
+        return training_id
+    
+    def _prune_stale(self):
+        """Remove items that were trained before but are no longer part of the training set"""
+        for key in [k for k in self._manifest if k not in self._seen]:
+            training_id = self._manifest.pop(key)['id']
+            try:
+                self.vn.remove_training_data(training_id)
+                logger.info(f"🧹 Removed stale Vanna training item {training_id}")
+            except Exception as e:
+                logger.warning(f"⚠️ Could not remove stale Vanna training item {training_id}: {e}")
     
     def train_schema(self):
         """
@@ -41,7 +127,7 @@ class VannaTrainer:
         logger.info("📚 Training Vanna on database schema...")
         
         # Train on expenses table DDL
-        self.vn.train(ddl="""
+        self._train(ddl="""
             CREATE TABLE expenses (
                 id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
                 user_id UUID NOT NULL REFERENCES users(id),
@@ -59,7 +145,7 @@ class VannaTrainer:
         """)
         
         # Train on budgets table DDL
-        self.vn.train(ddl="""
+        self._train(ddl="""
             CREATE TABLE budgets (
                 id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
                 category_id UUID NOT NULL REFERENCES categories(id),
@@ -72,7 +158,7 @@ class VannaTrainer:
         """)
         
         # Train on categories table DDL
-        self.vn.train(ddl="""
+        self._train(ddl="""
             CREATE TABLE categories (
                 id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
                 name TEXT NOT NULL UNIQUE,
@@ -82,7 +168,7 @@ class VannaTrainer:
         """)
         
         # Train on users table DDL
-        self.vn.train(ddl="""
+        self._train(ddl="""
             CREATE TABLE users (
                 id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
                 telegram_id BIGINT UNIQUE NOT NULL,
@@ -93,7 +179,7 @@ class VannaTrainer:
         """)
         
         # Train on currency_rates table DDL
-        self.vn.train(ddl="""
+        self._train(ddl="""
             CREATE TABLE currency_rates (
                 id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
                 base_currency VARCHAR(3) NOT NULL,
@@ -111,7 +197,7 @@ class VannaTrainer:
         """
         logger.info("📖 Training Vanna on documentation...")
         
-        self.vn.train(documentation="""
+        self._train(documentation="""
         FinAIssistant Business Rules:
         - Default currency is MXN (Mexican Peso)
         - All amounts are stored in MXN in the 'amount' field
@@ -125,7 +211,7 @@ class VannaTrainer:
         - Always use COALESCE() for NULL handling in aggregations
         """)
         
-        self.vn.train(documentation="""
+        self._train(documentation="""
         Common Query Patterns:
         - For "this month": WHERE DATE_TRUNC('month', expense_date) = DATE_TRUNC('month', CURRENT_DATE)
         - For current month budget: WHERE month = EXTRACT(MONTH FROM CURRENT_DATE) AND year = EXTRACT(YEAR FROM CURRENT_DATE)
@@ -144,7 +230,7 @@ class VannaTrainer:
         logger.info("💡 Training Vanna on example queries...")
         
         # Total spending this month
-        self.vn.train(
+        self._train(
             question="What is my total spending this month?",
             sql="""
                 SELECT COALESCE(SUM(amount), 0) as total
@@ -154,7 +240,7 @@ class VannaTrainer:
         )
         
         # Total budget this month
-        self.vn.train(
+        self._train(
             question="What is my total budget for this month?",
             sql="""
                 SELECT COALESCE(SUM(amount), 0) as total
@@ -165,7 +251,7 @@ class VannaTrainer:
         )
         
         # Spending by category this month
-        self.vn.train(
+        self._train(
             question="Show me spending by category this month",
             sql="""
                 SELECT 
@@ -181,7 +267,7 @@ class VannaTrainer:
         )
         
         # Budget vs spending
-        self.vn.train(
+        self._train(
             question="How am I doing against my budget this month?",
             sql="""
                 WITH current_budgets AS (
@@ -214,7 +300,7 @@ class VannaTrainer:
         )
         
         # Recent expenses
-        self.vn.train(
+        self._train(
             question="Show me my recent expenses",
             sql="""
                 SELECT 
@@ -232,7 +318,7 @@ class VannaTrainer:
         )
         
         # Top spending categories this week
-        self.vn.train(
+        self._train(
             question="What are my top spending categories this week?",
             sql="""
                 SELECT 
@@ -249,7 +335,7 @@ class VannaTrainer:
         )
         
         # Budget by category (without spending comparison)
-        self.vn.train(
+        self._train(
             question="Show me the budget by category",
             sql="""
                 SELECT 
@@ -264,7 +350,7 @@ class VannaTrainer:
         )
         
         # Budget by category in Spanish
-        self.vn.train(
+        self._train(
             question="Cuál es el presupuesto por categoría para este mes",
             sql="""
                 SELECT 
@@ -283,17 +369,47 @@ class VannaTrainer:
     def train_all(self):
         """
         Complete training workflow
+        Only new or changed items are embedded; items dropped from the training
+        set are removed from the store
         """
         try:
+            self._seen = set()
+            self.embedded_items = 0
+            self.skipped_items = 0
             self.train_schema()
             self.train_documentation()
             self.train_examples()
+            self._prune_stale()
+            self._save_manifest()
             self._is_trained = True
-            logger.info("🎉 Vanna training completed successfully!")
+            logger.info(
+                f"🎉 Vanna training completed successfully! "
+                f"({self.embedded_items} embedded, {self.skipped_items} unchanged)"
+            )
         except Exception as e:
             logger.error(f"❌ Error during Vanna training: {e}", exc_info=True)
             raise
     
+    def start_background_training(self) -> threading.Thread:
+        """
+        Run train_all in a daemon thread so callers can serve requests immediately
+        Use is_trained() to check when Vanna is ready
+        """
+        if self._training_thread and self._training_thread.is_alive():
+            return self._training_thread
+        
+        def run():
+            try:
+                self.train_all()
+            except Exception:
+                # Already logged by train_all; Vanna stays disabled and callers fall back
+                pass
+        
+        self._training_thread = threading.Thread(target=run, name='vanna-training', daemon=True)
+        self._training_thread.start()
+        logger.info("📚 Vanna training started in the background")
+        return self._training_thread
+    
     def generate_sql(self, question: str) -> str:
         """
         Generate SQL query from natural language question
@@ -0,0 +1,200 @@
+"""
+Webhook entry point for hybrid_bot
+A minimal ASGI app (no framework) that Telegram POSTs updates to: the secret
+token header is checked, the update is queued on the python-telegram-bot
+Application and the request is answered at once. GET /healthz reports readiness.
+GET /metrics serves the instrumentation registry in the Prometheus text format.
+On shutdown new updates are refused with 503 (Telegram redelivers them to the
+next instance) while in-flight ones drain
+
+Usage: WEBHOOK_URL=https://<host> python hybrid_bot.py   (served with uvicorn on $PORT)
+"""
+import asyncio
+import hmac
+import json
+import logging
+import os
+import secrets
+import time
+from typing import Awaitable, Callable, Optional
+
+from telegram import Update
+
+from instrumentation import metrics
+
+logger = logging.getLogger(__name__)
+
+# Path Telegram posts updates to (relative to WEBHOOK_URL)
+DEFAULT_WEBHOOK_PATH = '/telegram'
+
+# Seconds in-flight updates get to finish on shutdown
+DEFAULT_DRAIN_TIMEOUT = 25.0
+
+# Largest update body accepted (Telegram updates are a few KB)
+MAX_BODY_BYTES = 1024 * 1024
+
+SECRET_HEADER = b'x-telegram-bot-api-secret-token'
+
+class WebhookApp:
+    """
+    ASGI application serving a python-telegram-bot Application over webhooks
+    Args:
+        on_startup / on_shutdown: awaited before the Application starts and after
+            it stops (component setup and teardown)
+    """
+    def __init__(
+        self,
+        application,
+        webhook_url: Optional[str] = None,
+        secret_token: Optional[str] = None,
+        path: Optional[str] = None,
+        drain_timeout: Optional[float] = None,
+        on_startup: Optional[Callable[[], Awaitable[None]]] = None,
+        on_shutdown: Optional[Callable[[], Awaitable[None]]] = None
+    ):
+        self.application = application
+        self.webhook_url = (webhook_url or os.getenv('WEBHOOK_URL', '')).rstrip('/')
+        # Telegram allows A-Z, a-z, 0-9, _ and - (1-256 chars); a random one is used when unset
+        self.secret_token = secret_token or os.getenv('WEBHOOK_SECRET') or secrets.token_urlsafe(32)
+        self.path = path or os.getenv('WEBHOOK_PATH', DEFAULT_WEBHOOK_PATH)
+        self.drain_timeout = float(os.getenv('WEBHOOK_DRAIN_TIMEOUT', DEFAULT_DRAIN_TIMEOUT)) if drain_timeout is None else drain_timeout
+        # Optional bearer token required on GET /metrics
+        self.metrics_token = os.getenv('METRICS_TOKEN', '')
+        self.on_startup = on_startup
+        self.on_shutdown = on_shutdown
+        self.ready = False
+        self.draining = False
+        self.started_at = time.monotonic()
+
+        # Stats
+        self.received = 0
+        self.rejected = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] != 'http':
+            return
+
+        method, path = scope['method'], scope['path']
+        if path == '/healthz' and method in ('GET', 'HEAD'):
+            status = 200 if self.ready and not self.draining else 503
+            return await self._respond(send, status, {
+                'status': 'ok' if status == 200 else ('draining' if self.draining else 'starting'),
+                'uptime_s': round(time.monotonic() - self.started_at, 1),
+                'queued_updates': self.application.update_queue.qsize(),
+                'received': self.received
+            })
+        headers = dict(scope.get('headers') or [])
+        if path == '/metrics' and method == 'GET':
+            expected = f"Bearer {self.metrics_token}".encode()
+            if self.metrics_token and not hmac.compare_digest(headers.get(b'authorization', b''), expected):
+                return await self._respond(send, 403, {'error': 'forbidden'})
+            return await self._send(send, 200, metrics.render_prometheus().encode(),
+                                    b'text/plain; version=0.0.4; charset=utf-8')
+        if path != self.path:
+            return await self._respond(send, 404, {'error': 'not found'})
+        if method != 'POST':
+            return await self._respond(send, 405, {'error': 'method not allowed'})
+
+        if not hmac.compare_digest(headers.get(SECRET_HEADER, b''), self.secret_token.encode()):
+            self.rejected += 1
+            return await self._respond(send, 403, {'error': 'forbidden'})
+        if self.draining or not self.ready:
+            # Telegram retries non-2xx deliveries, so nothing is lost
+            return await self._respond(send, 503, {'error': 'unavailable'})
+
+        body = await self._read_body(receive)
+        if body is None:
+            return await self._respond(send, 413, {'error': 'payload too large'})
+        try:
+            update = Update.de_json(json.loads(body), self.application.bot)
+        except (ValueError, TypeError, KeyError) as e:
+            logger.warning(f"Rejected malformed webhook update: {e}")
+            return await self._respond(send, 400, {'error': 'bad update'})
+
+        await self.application.update_queue.put(update)
+        self.received += 1
+        await self._respond(send, 200, {'ok': True})
+
+    async def _read_body(self, receive) -> Optional[bytes]:
+        chunks, size = [], 0
+        while True:
+            message = await receive()
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if size > MAX_BODY_BYTES:
+                return None
+            chunks.append(chunk)
+            if not message.get('more_body'):
+                return b''.join(chunks)
+
+    async def _respond(self, send, status: int, payload: dict):
+        await self._send(send, status, json.dumps(payload).encode(), b'application/json')
+
+    async def _send(self, send, status: int, body: bytes, content_type: bytes):
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', content_type), (b'content-length', str(len(body)).encode())]
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await self.startup()
+                except Exception as e:
+                    logger.error(f"Webhook startup failed: {e}", exc_info=True)
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def startup(self):
+        if self.on_startup:
+            await self.on_startup()
+        await self.application.initialize()
+        await self.application.start()
+        if self.webhook_url:
+            await self.application.bot.set_webhook(
+                url=f"{self.webhook_url}{self.path}",
+                secret_token=self.secret_token,
+                allowed_updates=Update.ALL_TYPES
+            )
+        self.ready = True
+        logger.info(f"🌐 Webhook ready at {self.webhook_url}{self.path}")
+
+    async def shutdown(self):
+        """Refuse new updates, let queued and running ones finish, then stop"""
+        self.draining = True
+        started = time.monotonic()
+        try:
+            # Application.stop() processes what is already queued and waits for running handlers
+            await asyncio.wait_for(self.application.stop(), timeout=self.drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Drain timed out after {self.drain_timeout:.0f}s with "
+                           f"{self.application.update_queue.qsize()} updates queued")
+        logger.info(f"Webhook drained in {time.monotonic() - started:.1f}s")
+        await self.application.shutdown()
+        if self.on_shutdown:
+            await self.on_shutdown()
+
+async def serve(app: WebhookApp, host: str = '0.0.0.0', port: Optional[int] = None):
+    """Run the webhook app under uvicorn (SIGTERM/SIGINT trigger the graceful drain)"""
+    import uvicorn
+
+    config = uvicorn.Config(
+        app,
+        host=host,
+        port=port or int(os.getenv('PORT', 8080)),
+        lifespan='on',
+        log_level=os.getenv('WEBHOOK_LOG_LEVEL', 'warning'),
+        timeout_graceful_shutdown=int(app.drain_timeout) + 5
+    )
+    await uvicorn.Server(config).serve()